@@ -0,0 +1,408 @@
+##########################################################################
+# Populse_db - Copyright (C) IRMaGe/CEA, 2018
+# Distributed under the terms of the CeCILL-B license, as published by
+# the CEA-CNRS-INRIA. Refer to the LICENSE file or to
+# http://www.cecill.info/licences/Licence_CeCILL-B_V1-en.html
+# for details.
+##########################################################################
+
+"""
+Benchmarks of populse_db, the results are reported in docs/source/benchmarks.rst
+
+The following command launches all the benchmarks:
+
+    python -m populse_db.benchmark
+"""
+
+from __future__ import print_function
+
+import ast
+import datetime
+import operator
+import os
+import re
+import shutil
+import tempfile
+import time
+
+try:
+    import lark
+except ImportError:
+    lark = None
+
+from populse_db.database import Database
+from populse_db.filter import filter_parser, FilterToQuery, FilterToPythonQuery
+from populse_db.list_codec import list_codecs
+
+
+def generate_documents(count):
+    """
+    Generates documents looking like the ones of a neuroimaging study
+
+    :param count: Number of documents
+
+    :return: Generator of documents
+    """
+
+    acquisition = datetime.datetime(2018, 5, 23, 12, 41, 33)
+    for i in range(count):
+        yield {
+            'index': '/scan_%06d.nii' % i,
+            'PatientName': 'patient_%d' % (i % 100),
+            'SequenceName': ('T1', 'T2', 'FLAIR', 'BOLD')[i % 4],
+            'BandWidth': 50000.0 + i % 7,
+            'EchoTime': i % 50,
+            'AcquisitionDate': acquisition + datetime.timedelta(minutes=i),
+            'Dataset dimensions': [256, 256, 124 + i % 3],
+            'Tags': ['study', 'session_%d' % (i % 10)],
+        }
+
+
+def timed(function, *args, **kwargs):
+    """
+    Calls a function and measures its duration
+
+    :return: The duration of the call in seconds
+    """
+
+    start = time.time()
+    function(*args, **kwargs)
+    return time.time() - start
+
+
+def benchmark_add_documents(count=5000, list_tables=True):
+    """
+    Compares the throughput of add_document and add_documents
+
+    :param count: Number of documents added
+
+    :param list_tables: Bool to know if list tables are used
+
+    :return: Dictionary giving the number of documents added per second with each method
+    """
+
+    results = {}
+    temp_folder = tempfile.mkdtemp()
+    try:
+        for method in ('add_document', 'add_documents'):
+            path = os.path.join(temp_folder, '%s.db' % method)
+            database = Database('sqlite:///' + path, list_tables=list_tables)
+            with database as session:
+                session.add_collection('scans')
+                if method == 'add_document':
+                    def add():
+                        for document in generate_documents(count):
+                            session.add_document('scans', document, flush=False)
+                        session.session.flush()
+                else:
+                    def add():
+                        session.add_documents('scans', generate_documents(count))
+                duration = timed(add)
+            results[method] = count / duration
+    finally:
+        shutil.rmtree(temp_folder)
+    return results
+
+
+def benchmark_add_fields(count=400):
+    """
+    Compares the duration of the creation of fields in an empty collection,
+    with add_field called for each field and with add_fields
+
+    :param count: Number of fields created
+
+    :return: Dictionary giving the number of fields created per second with each method
+    """
+
+    results = {}
+    temp_folder = tempfile.mkdtemp()
+    try:
+        for method in ('add_field', 'add_fields'):
+            path = os.path.join(temp_folder, '%s.db' % method)
+            database = Database('sqlite:///' + path)
+            with database as session:
+                session.add_collection('scans')
+                fields = [['scans', 'tag_%03d' % i, ('string', 'float', 'list_int')[i % 3], None]
+                          for i in range(count)]
+                if method == 'add_field':
+                    def add():
+                        for field in fields:
+                            session.add_field(*field)
+                else:
+                    def add():
+                        session.add_fields(fields)
+                duration = timed(add)
+            results[method] = count / duration
+    finally:
+        shutil.rmtree(temp_folder)
+    return results
+
+
+benchmark_filters = (
+    '{PatientName} == "patient_1"',
+    '({PatientName} == "patient_1" or {PatientName} == "patient_2") and '
+    '{EchoTime} > 10 and not {SequenceName} in ["T1", "T2"] and '
+    '{AcquisitionDate} >= 2018-05-23T12:41:33',
+)
+
+
+# The grammar of the filters parsed by the former versions of populse_db,
+# with the default (dynamic Earley) parser of lark-parser. It is only
+# supported by lark-parser < 0.7 (pip install populse_db[benchmark]).
+earley_filter_grammar = '''
+?start : filter
+
+?filter : "ALL"i                         -> all
+        | conditions
+        | negation
+        | "(" filter ")"
+        | filter BOOLEAN_OPERATOR filter -> conditions
+
+?conditions : condition (BOOLEAN_OPERATOR condition)*
+
+
+negation : "NOT"i condition
+         | "NOT"i "(" filter ")"
+
+BOOLEAN_OPERATOR : "AND"i
+                 | "OR"i
+
+CONDITION_OPERATOR : "=="i
+                   | "!="i
+                   | "<="i
+                   | ">="i
+                   | ">"i
+                   | "<"i
+                   | "IN"i
+                   | "ILIKE"i
+                   | "LIKE"i
+
+condition : operand CONDITION_OPERATOR operand
+
+?operand : literal
+         | field_name
+
+field_name.1 : FIELD_NAME
+             | quoted_field_name
+
+quoted_field_name.1 : QUOTED_FIELD_NAME
+
+
+
+?literal.2 : KEYWORD_LITERAL -> keyword_literal
+         | ESCAPED_STRING   -> string
+         | SIGNED_NUMBER    -> number
+         | DATE             -> date
+         | TIME             -> time
+         | DATETIME         -> datetime
+         | list
+
+
+DATE : INT "-" INT "-" INT
+TIME : INT ":" INT (":" INT ("." INT)?)?
+DATETIME : DATE "T" TIME
+
+KEYWORD_LITERAL.2 : "NULL"i
+                  | "TRUE"i
+                  | "FALSE"i
+
+FIELD_NAME.1 : ("_"|LETTER) ("_"|LETTER|DIGIT)*
+QUOTED_FIELD_NAME.1 : "{" /[^}]/* "}"
+
+list : "[" [literal ("," literal)*] "]"
+
+%import common.INT
+%import common.ESCAPED_STRING
+%import common.SIGNED_NUMBER
+%import common.LETTER
+%import common.DIGIT
+
+%import common.WS
+%ignore WS
+'''
+
+
+def benchmark_filter_parsing(count=1000):
+    """
+    Compares the number of filters parsed per second by the stand-alone
+    LALR parser and by the former Earley parser of populse_db. The Earley
+    parser is skipped if it cannot be built with the installed version of
+    lark-parser.
+
+    :param count: Number of times each filter is parsed
+
+    :return: Dictionary whose keys are (parser, filter) and values the number of filters parsed per second
+    """
+
+    results = {}
+    parsers = [('lalr', filter_parser())]
+    if lark is None:
+        print('The Earley parser is not benchmarked: lark-parser is not installed')
+    else:
+        try:
+            parsers.append(('earley', lark.Lark(earley_filter_grammar)))
+        except Exception as e:
+            print('The Earley parser is not benchmarked with lark-parser %s: %s' % (lark.__version__, e))
+    for parser_name, parser in parsers:
+        for filter in benchmark_filters:
+            def parse():
+                for i in range(count):
+                    parser.parse(filter)
+            results[(parser_name, filter)] = count / timed(parse)
+    return results
+
+
+def like(value, like_pattern):
+    return bool(re.match(FilterToPythonQuery.like_to_re(like_pattern), value, flags=re.DOTALL))
+
+
+def ilike(value, like_pattern):
+    return bool(re.match(FilterToPythonQuery.like_to_re(like_pattern), value, flags=re.DOTALL | re.IGNORECASE))
+
+
+class LambdaFilterToPythonQuery(FilterToQuery):
+    """
+    The former implementation of FilterToPythonQuery, combining nested
+    lambda functions (with the fixes of the field names and of the LIKE
+    operators, so that it can check all the benchmark filters)
+    """
+
+    python_operators = {
+        '==': operator.eq,
+        '!=': operator.ne,
+        '<': operator.lt,
+        '<=': operator.le,
+        '>': operator.gt,
+        '>=': operator.ge,
+        'and': operator.and_,
+        'or': operator.or_,
+        'like': like,
+        'ilike': ilike,
+    }
+
+    def build_condition_all(self):
+        return lambda x: True
+
+    def build_condition_literal_in_list_field(self, value, list_field):
+        return (lambda x, lf=list_field.field_name, v=value:
+                x[lf] is not None and v in x[lf])
+
+    def build_condition_field_in_list_field(self, field, list_field):
+        return (lambda x, lf=list_field.field_name, f=field.field_name:
+                x[lf] is not None and x[f] in x[lf])
+
+    def build_condition_field_in_list(self, field, list_value):
+        return (lambda x, values=list_value, f=field.field_name:
+                x[f] in values)
+
+    def build_condition_field_op_field(self, left_field, operator_str, right_field):
+        operator = self.python_operators[operator_str]
+        return (lambda x, ln=left_field.field_name, rn=right_field.field_name, o=operator:
+                x[ln] is not None and x[rn] is not None and o(x[ln], x[rn]))
+
+    def build_condition_field_op_value(self, field, operator_str, value):
+        operator = self.python_operators[operator_str]
+        if value is None:
+            return lambda x, f=field.field_name, o=operator: o(x[f], None)
+        else:
+            return (lambda x, f=field.field_name, v=value, o=operator:
+                    x[f] is not None and o(x[f], v))
+
+    def build_condition_value_op_field(self, value, operator_str, field):
+        operator = self.python_operators[operator_str]
+        if value is None:
+            return lambda x, f=field.field_name, o=operator: o(None, x[f])
+        else:
+            return (lambda x, f=field.field_name, v=value, o=operator:
+                    x[f] is not None and o(v, x[f], ))
+
+    def build_condition_negation(self, condition):
+        return lambda x, f=condition: not f(x)
+
+    def build_condition_combine_conditions(self, left_condition, operator_str, right_condition):
+        operator = self.python_operators[operator_str]
+        return lambda x, f1=left_condition, f2=right_condition, o=operator: o(f1(x), f2(x))
+
+
+def benchmark_python_filters(count=200000):
+    """
+    Compares the number of documents per second checked by the Python
+    functions generated for the filters (used when a filter cannot be
+    converted into SQL) and by the former nested lambda functions
+
+    :param count: Number of documents checked with each filter
+
+    :return: Dictionary whose keys are (implementation, filter) and values the number of documents checked per second
+    """
+
+    results = {}
+    documents = list(generate_documents(count))
+    database = Database('sqlite://')
+    with database as session:
+        session.add_collection('scans')
+        session.add_document('scans', dict(documents[0]))
+        filters = benchmark_filters + ('{PatientName} LIKE "patient_1%" and "session_3" IN {Tags}',)
+        implementations = (('lambdas', LambdaFilterToPythonQuery),
+                           ('generated', FilterToPythonQuery))
+        for implementation, transformer_class in implementations:
+            for filter in filters:
+                python_filter = transformer_class(session, 'scans').transform(filter_parser().parse(filter))
+
+                def check():
+                    for document in documents:
+                        python_filter(document)
+                results[(implementation, filter)] = count / timed(check)
+    return results
+
+
+def benchmark_list_codecs(count=1000, length=1000):
+    """
+    Measures the number of list_float values decoded per second with each
+    list codec, and with ast.literal_eval (the former decoding)
+
+    :param count: Number of lists decoded
+
+    :param length: Number of items of the lists
+
+    :return: Dictionary giving the number of lists decoded per second with each codec
+    """
+
+    results = {}
+    value = [i * 0.001 for i in range(length)]
+    for name, codec_class in list_codecs.items():
+        codec = codec_class()
+        encoded = codec.encode('list_float', value)
+
+        def decode():
+            for i in range(count):
+                codec.decode('list_float', encoded)
+        results[name] = count / timed(decode)
+
+    encoded = repr(value)
+
+    def literal_eval():
+        for i in range(count):
+            ast.literal_eval(encoded)
+    results['literal_eval'] = count / timed(literal_eval)
+    return results
+
+
+if __name__ == '__main__':
+    results = benchmark_add_fields()
+    for method, throughput in sorted(results.items()):
+        print('%s: %d fields/s' % (method, throughput))
+
+    results = benchmark_list_codecs()
+    for codec, throughput in sorted(results.items()):
+        print('%s: %d lists of 1000 floats decoded/s' % (codec, throughput))
+    results = benchmark_filter_parsing()
+    for (parser, filter), throughput in sorted(results.items()):
+        print('%s parser (%d characters): %d filters/s' % (parser, len(filter), throughput))
+    results = benchmark_python_filters()
+    for (implementation, filter), throughput in sorted(results.items()):
+        print('Python filter with %s (%d characters): %d documents/s' % (implementation, len(filter), throughput))
+
+    for list_tables in (True, False):
+        results = benchmark_add_documents(list_tables=list_tables)
+        for method, throughput in sorted(results.items()):
+            print('%s (list_tables=%s): %d documents/s' % (method, list_tables, throughput))
@@ -0,0 +1,145 @@
+##########################################################################
+# Populse_db - Copyright (C) IRMaGe/CEA, 2018
+# Distributed under the terms of the CeCILL-B license, as published by
+# the CEA-CNRS-INRIA. Refer to the LICENSE file or to
+# http://www.cecill.info/licences/Licence_CeCILL-B_V1-en.html
+# for details.
+##########################################################################
+
+import collections
+import threading
+
+
+class LRUCache(object):
+    """
+    Thread safe dictionary of bounded size, the least recently used
+    entries are discarded when it is full
+
+    attributes:
+        - max_size: Maximum number of entries (0 disables the cache)
+        - hits: Number of successful lookups
+        - misses: Number of failed lookups
+
+    methods:
+        - get: Gives the value of a key
+        - set: Sets the value of a key
+        - pop: Removes a key
+        - values: Gives the values of all the entries
+        - clear: Removes all the entries
+        - info: Gives the statistics of the cache
+
+    The cache can also be used as a dictionary (cache[key] = value,
+    cache[key], key in cache), without updating the statistics when a key
+    is read.
+    """
+
+    def __init__(self, max_size):
+        """
+        Creates an empty cache
+
+        :param max_size: Maximum number of entries (int)
+        """
+
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.__entries = collections.OrderedDict()
+        self.__lock = threading.RLock()
+
+    def __len__(self):
+        return len(self.__entries)
+
+    def __contains__(self, key):
+        return key in self.__entries
+
+    def __getitem__(self, key):
+        with self.__lock:
+            value = self.__entries.pop(key)
+            self.__entries[key] = value
+            return value
+
+    def __setitem__(self, key, value):
+        self.set(key, value)
+
+    def get(self, key, default=None):
+        """
+        Gives the value of a key and marks it as the most recently used
+
+        :param key: Key to look for
+
+        :param default: Value returned if the key is not in the cache => None by default
+
+        :return: The value of the key if it is in the cache, default otherwise
+        """
+
+        with self.__lock:
+            try:
+                value = self.__entries.pop(key)
+            except KeyError:
+                self.misses += 1
+                return default
+            self.__entries[key] = value
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        """
+        Sets the value of a key, the least recently used entry is
+        discarded if the cache is full
+
+        :param key: Key to set
+
+        :param value: Value of the key
+        """
+
+        if self.max_size <= 0:
+            return
+        with self.__lock:
+            self.__entries.pop(key, None)
+            self.__entries[key] = value
+            while len(self.__entries) > self.max_size:
+                self.__entries.popitem(last=False)
+
+    def pop(self, key, default=None):
+        """
+        Removes a key from the cache
+
+        :param key: Key to remove
+
+        :param default: Value returned if the key is not in the cache => None by default
+
+        :return: The value of the key if it was in the cache, default otherwise
+        """
+
+        with self.__lock:
+            return self.__entries.pop(key, default)
+
+    def values(self):
+        """
+        Gives the values of all the entries, without changing their order
+
+        :return: List of the values
+        """
+
+        with self.__lock:
+            return list(self.__entries.values())
+
+    def clear(self):
+        """
+        Removes all the entries of the cache
+        """
+
+        with self.__lock:
+            self.__entries.clear()
+
+    def info(self):
+        """
+        Gives the statistics of the cache
+
+        :return: Dictionary with the keys hits, misses, size and max_size
+        """
+
+        return {'hits': self.hits,
+                'misses': self.misses,
+                'size': len(self.__entries),
+                'max_size': self.max_size}
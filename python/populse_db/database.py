@@ -6,26 +6,31 @@
 # for details.
 ##########################################################################
 
-import ast
-import copy
+import collections
 import json
 import hashlib
+import itertools
 import os
 import re
+import threading
 import types
 from datetime import date, time, datetime
 
-import dateutil.parser
 import six
 from sqlalchemy import (create_engine, Column, MetaData, Table, sql,
                         String, Integer, Float, Boolean, Date, DateTime,
-                        Time, Enum, event)
+                        Time, Enum, Index, event)
 from sqlalchemy.ext.automap import automap_base
+from sqlalchemy.ext.compiler import compiles
 from sqlalchemy.orm import sessionmaker, scoped_session, mapper
-from sqlalchemy.schema import CreateTable, DropTable
+from sqlalchemy.schema import CreateTable, DropTable, CreateIndex, DropIndex
+from sqlalchemy.sql.base import Executable
+from sqlalchemy.sql.elements import ClauseElement, conv
 from sqlalchemy.exc import ArgumentError
 
 import populse_db
+from populse_db.cache import LRUCache
+from populse_db.list_codec import get_list_codec
 
 # Field types
 FIELD_TYPE_STRING = "string"
@@ -84,20 +89,33 @@ class Database:
 
     attributes:
         - string_engine: String engine of the database
-        - caches: Bool to know if the caches must be used
+        - caches: Caches policy (False, True or 'lru')
+        - max_documents: Maximum number of documents cached per collection with the 'lru' caches
+        - shared_cache_size: Maximum number of documents rows in the cache shared by the sessions
         - list_tables: Bool to know if list tables must be used
         - query_type: Default query implementation for applying the filters
+        - list_codec: ListCodec instance used to store the list values
+        - json_lists: Bool to know if the list fields are queried in SQL with the JSON functions
+          of the database (list tables not used and lists stored as JSON arrays)
         - engine: SQLAlchemy database engine
+        - metadata: Database metadata, shared by all the sessions, it only
+          contains the committed schema modifications
+        - table_classes: Classes mapped on the collection and field tables
+        - schema_version: Counter incremented on each schema modification
 
     methods:
         - __enter__: Creates or gets a DatabaseSession instance
         - __exit__: Releases the latest created DatabaseSession
         - clear: Clears the database
+        - collection_version: Gives the schema version of a collection
+        - column_name: Gives the table/column name of a collection or field name
+        - column_to_name: Gives the collection or field name of a table/column name
 
     """
 
     def __init__(self, string_engine, caches=False, list_tables=True,
-                 query_type='mixed'):
+                 query_type='mixed', filter_cache_size=128, list_codec='json',
+                 max_documents=10000, shared_cache_size=0):
         """Initialization of the database
 
         :param string_engine: Database engine
@@ -119,16 +137,40 @@ class Database:
 
                               See sqlalchemy documentation for more precisions about the engine: http://docs.sqlalchemy.org/en/latest/core/engines.html
 
-        :param caches: Bool to know if the caches (the rows of the database are stored in dictionaries) must be used (Put True if you count on having a lot of data) => False by default
+        :param caches: Caches policy, the rows of the database are stored in dictionaries (Put True or 'lru' if you count on having a lot of data) => False by default
+
+                       - False: No caches
+                       - True: All the documents are loaded when a session is created
+                       - 'lru': The documents are loaded when they are used, the least recently used documents are discarded from the caches (see max_documents)
+
+                       The collections and fields are always all cached if caches is not False
 
         :param list_tables: Bool to know if tables must be created to store list values (Put True to have a pure SQL version of IN operator in filters) => True by default
 
+                            Without list tables, the IN operator on list fields is converted into SQL with the JSON functions of the database (PostgreSQL, SQLite >= 3.38) if the list_codec stores the lists as JSON arrays ('json' codec), the list values must then have been written with this codec (see DatabaseSession.encode_list_fields to migrate a database)
+
         :param query_type: Type of query to use for the filters ('sql', 'python', 'mixed', or 'guess') => 'mixed' by default
 
+        :param filter_cache_size: Maximum number of compiled filters kept in the cache (0 to disable the cache) => 128 by default
+
+        :param max_documents: Maximum number of documents cached per collection, with the 'lru' caches => 10000 by default
+
+        :param shared_cache_size: Maximum number of committed documents rows kept in a cache shared by all the sessions of this Database instance, to get documents by their name without querying the database (0 to disable the cache) => 0 by default
+
+                                  The cache is updated when the sessions commit their modifications, it must not be used if the database is modified by other Database instances or processes
+
+        :param list_codec: Encoding of the list values in the collection tables ('json', 'repr', 'packed', or a populse_db.list_codec.ListCodec instance) => 'json' by default
+
+                           The lists are read whatever the codec used to write them, but the filters comparing a list field to a list value need the values encoded with the codec of the database (see DatabaseSession.encode_list_fields to migrate a database)
+
         :raise ValueError: - If string_engine is invalid
                            - If caches is invalid
+                           - If max_documents is invalid
                            - If list_tables is invalid
                            - If query_type is invalid
+                           - If filter_cache_size is invalid
+                           - If shared_cache_size is invalid
+                           - If list_codec is invalid
                            - If the schema is not coherent with the API (the database is not a populse_db database)
         """
 
@@ -136,10 +178,14 @@ class Database:
         if not isinstance(string_engine, six.string_types):
             raise ValueError(
                 "Wrong string_engine, it must be of type {0}, but string_engine of type {1} given".format(str, type(string_engine)))
-        if not isinstance(caches, bool):
+        if not isinstance(caches, bool) and caches != 'lru':
             raise ValueError(
-                "Wrong caches, it must be of type {0}, but caches of type {1} given".format(bool, type(caches)))
+                "Wrong caches, it must be of type {0} or 'lru', but caches of type {1} given".format(bool, type(caches)))
         self.caches = caches
+        if not isinstance(max_documents, int) or isinstance(max_documents, bool) or max_documents <= 0:
+            raise ValueError(
+                "Wrong max_documents, it must be a strictly positive integer, but {0} given".format(max_documents))
+        self.max_documents = max_documents
         if not isinstance(list_tables, bool):
             raise ValueError("Wrong list_tables, it must be of type {0}, but list_tables of type {1} given".format(bool,
                                                                                                                    type(
@@ -150,6 +196,20 @@ class Database:
         if query_type not in query_list:
             raise ValueError("Wrong query_type, it must be in {0}, but {1} given".format(query_list, query_type))
         self.query_type = query_type
+        if not isinstance(filter_cache_size, int) or isinstance(filter_cache_size, bool) or filter_cache_size < 0:
+            raise ValueError(
+                "Wrong filter_cache_size, it must be a positive integer, but {0} given".format(filter_cache_size))
+        self._filter_cache = LRUCache(filter_cache_size)
+        if not isinstance(shared_cache_size, int) or isinstance(shared_cache_size, bool) or shared_cache_size < 0:
+            raise ValueError(
+                "Wrong shared_cache_size, it must be a positive integer, but {0} given".format(shared_cache_size))
+        self.shared_cache_size = shared_cache_size
+        self._shared_rows = LRUCache(shared_cache_size)
+        # Incremented each time shared rows are invalidated, a row read
+        # before an invalidation is not put in the cache after it
+        self.__shared_rows_generation = 0
+        self.__shared_rows_lock = threading.Lock()
+        self.list_codec = get_list_codec(list_codec)
 
         # SQLite database: It is created if it does not exist
         if string_engine.startswith('sqlite'):
@@ -163,6 +223,7 @@ class Database:
         self.engine = self.__create_empty_schema(self.string_engine)
         if self.engine is None:
             raise ValueError('The database schema is not coherent with the API')
+        self.json_lists = not list_tables and self.list_codec.json_arrays and self._supports_json_lists()
 
         if string_engine.startswith('sqlite'):
             @event.listens_for(self.engine, "connect")
@@ -191,6 +252,286 @@ class Database:
         self.__scoped_session = scoped_session(sessionmaker(
             bind=self.engine, autocommit=False, autoflush=False))
 
+        # The schema is reflected once and shared by all the sessions. The
+        # sessions modify a copy of it, whose modified tables are put in the
+        # shared schema when the transaction is committed.
+        self._schema_lock = threading.RLock()
+        self.schema_version = 0
+        self.__base_version = 0
+        self.__collection_versions = {}
+        self.metadata = MetaData()
+        self.metadata.reflect(self.engine)
+        self.__map_tables()
+
+        # The column names of the collections and fields are computed once
+        # and shared by all the sessions
+        self.__column_names = {}
+        self.__names = {}
+        self.__load_column_names()
+
+    def __map_tables(self):
+        """
+        Maps the classes of the collection and field tables, the document
+        tables are used without mapping
+        """
+
+        self.base = automap_base(metadata=self.metadata)
+        self.table_classes = {}
+        for table_name in (COLLECTION_TABLE, FIELD_TABLE):
+            table = self.metadata.tables[table_name]
+            table_dict = {'__tablename__': table_name, '__table__': table}
+            table_class = type(str(table_name), (self.base,), table_dict)
+            mapper(table_class, table)
+            self.table_classes[table_name] = table_class
+
+    def __load_column_names(self):
+        """
+        Fills the maps between the names and the column names with the
+        collections and fields of the database
+        """
+
+        collection_table = self.metadata.tables[COLLECTION_TABLE]
+        field_table = self.metadata.tables[FIELD_TABLE]
+        with self.engine.connect() as connection:
+            for row in connection.execute(sql.select([collection_table.c.collection_name])):
+                self.column_name(row[0])
+            for row in connection.execute(sql.select([field_table.c.field_name]).distinct()):
+                self.column_name(row[0])
+
+    def column_name(self, name):
+        """
+        Gives the valid and unique table/column name of a collection or a
+        field name, it is the md5 hash of the name computed once
+
+        :param name: Name (str)
+
+        :return: Valid and unique (hashed) table/column name
+        """
+
+        column_name = self.__column_names.get(name)
+        if column_name is None:
+            column_name = hashlib.md5(name.encode('utf-8')).hexdigest()
+            self.__column_names[name] = column_name
+            self.__names[column_name] = name
+        return column_name
+
+    def column_to_name(self, column_name):
+        """
+        Gives the collection or field name of a table/column name
+
+        :param column_name: Table/column name (str)
+
+        :return: The name, or None if the column name is not known
+        """
+
+        return self.__names.get(column_name)
+
+    def collection_version(self, collection):
+        """
+        Gives the schema version of a collection, it changes each time the
+        fields of the collection are modified
+
+        :param collection: Collection name (str)
+
+        :return: The schema version of the collection
+        """
+
+        return self.__collection_versions.get(collection, self.__base_version)
+
+    def _new_schema_version(self):
+        """
+        :return: A new schema version, greater than all the versions already given
+        """
+
+        with self._schema_lock:
+            self.schema_version += 1
+            return self.schema_version
+
+    def _copy_schema(self):
+        """
+        Copies the shared metadata, for a session modifying the schema
+        before the modifications are committed
+
+        :return: The copy of the shared metadata (MetaData)
+        """
+
+        with self._schema_lock:
+            metadata = MetaData()
+            for table in self.metadata.tables.values():
+                table.tometadata(metadata)
+            return metadata
+
+    def _publish_schema(self, metadata, collections):
+        """
+        Puts in the shared metadata the tables of collections whose schema
+        has been modified by a committed transaction, and changes their
+        schema version
+
+        :param metadata: Metadata modified by the transaction (see _copy_schema)
+
+        :param collections: Iterable of the modified collections names
+        """
+
+        with self._schema_lock:
+            for collection in collections:
+                table_name = self.column_name(collection)
+                for table in self._collection_tables(self.metadata, table_name):
+                    self.metadata.remove(table)
+                for table in self._collection_tables(metadata, table_name):
+                    table.tometadata(self.metadata)
+                # The queries built with the tables of the transaction
+                # cannot be combined with the shared tables
+                self.__collection_versions[collection] = self._new_schema_version()
+
+    @staticmethod
+    def _collection_tables(metadata, table_name):
+        """
+        Gives the table of a collection and its list tables
+
+        :param metadata: Metadata containing the tables
+
+        :param table_name: Table name of the collection (str)
+
+        :return: List of the Table objects
+        """
+
+        list_tables_prefix = 'list_%s_' % table_name
+        return [table for table in metadata.tables.values()
+                if table.name == table_name or table.name.startswith(list_tables_prefix)]
+
+    def _reflect_table(self, table_name, bind, metadata=None):
+        """
+        Reflects again a table in the shared metadata, for instance when it has
+        been modified outside of this Database instance
+
+        :param table_name: Name of the table (str)
+
+        :param bind: Connection to use for the reflection, it must not have
+                     uncommitted schema modifications if the table is reflected in the shared metadata
+
+        :param metadata: Metadata where the table is reflected, None for the shared metadata => None by default
+
+        :return: The Table object, or None if the table does not exist
+        """
+
+        if metadata is None:
+            metadata = self.metadata
+        with self._schema_lock:
+            table = metadata.tables.get(table_name)
+            if table is not None:
+                metadata.remove(table)
+            if not bind.dialect.has_table(bind, table_name):
+                return None
+            return Table(table_name, metadata, autoload=True, autoload_with=bind)
+
+    def _get_shared_row(self, collection, document):
+        """
+        Gives a committed document row from the cache shared by the sessions
+
+        :param collection: Document collection (str)
+
+        :param document: Document name (str)
+
+        :return: Tuple (copy of the row or None, generation), the generation must be given to _set_shared_row
+        """
+
+        with self.__shared_rows_lock:
+            generation = self.__shared_rows_generation
+        row = self._shared_rows.get((collection, self.collection_version(collection), document))
+        if row is not None:
+            row = dict(row)
+        return row, generation
+
+    def _set_shared_row(self, collection, document, row, generation):
+        """
+        Puts a committed document row in the cache shared by the sessions,
+        unless rows have been invalidated since the generation was given by
+        _get_shared_row
+
+        :param collection: Document collection (str)
+
+        :param document: Document name (str)
+
+        :param row: Dictionary of the column values
+
+        :param generation: Generation given by _get_shared_row
+        """
+
+        with self.__shared_rows_lock:
+            if generation == self.__shared_rows_generation:
+                self._shared_rows.set((collection, self.collection_version(collection), document), dict(row))
+
+    def _invalidate_shared_rows(self, documents):
+        """
+        Removes documents rows from the cache shared by the sessions, this
+        is called when the modifications of these documents are committed
+
+        :param documents: Iterable of (collection, document)
+        """
+
+        with self.__shared_rows_lock:
+            self.__shared_rows_generation += 1
+            for collection, document in documents:
+                self._shared_rows.pop((collection, self.collection_version(collection), document))
+
+    def _supports_drop_column(self):
+        """
+        :return: True if the database supports ALTER TABLE ... DROP COLUMN (PostgreSQL, SQLite >= 3.35)
+        """
+
+        dialect = self.engine.dialect
+        if dialect.name == 'postgresql':
+            return True
+        if dialect.name == 'sqlite':
+            return dialect.dbapi.sqlite_version_info >= (3, 35, 0)
+        return False
+
+    def _supports_json_lists(self):
+        """
+        :return: True if the database can query the list values stored as JSON arrays (PostgreSQL, SQLite >= 3.38)
+        """
+
+        dialect = self.engine.dialect
+        if dialect.name == 'postgresql':
+            return True
+        if dialect.name == 'sqlite':
+            # The JSON functions are built in since SQLite 3.38
+            return dialect.dbapi.sqlite_version_info >= (3, 38, 0)
+        return False
+
+    def _reload_schema(self):
+        """
+        Synchronizes the shared metadata with the database schema, after the
+        database is cleared for instance. Only the tables that changed are
+        replaced.
+        """
+
+        with self._schema_lock:
+            metadata = MetaData()
+            metadata.reflect(self.engine)
+            for table_name, table in list(self.metadata.tables.items()):
+                if table_name in (FIELD_TABLE, COLLECTION_TABLE):
+                    continue
+                new_table = metadata.tables.get(table_name)
+                if (new_table is None or set(new_table.c.keys()) != set(table.c.keys())
+                        or self.__indexed_columns(new_table) != self.__indexed_columns(table)):
+                    self.metadata.remove(table)
+            for table_name, table in metadata.tables.items():
+                if table_name not in self.metadata.tables:
+                    table.tometadata(self.metadata)
+            # All the collections are considered as modified
+            self.schema_version += 1
+            self.__base_version = self.schema_version
+            self.__collection_versions.clear()
+
+    @staticmethod
+    def __indexed_columns(table):
+        """
+        :return: The set of the tuples of the columns names of the table indexes
+        """
+
+        return set(tuple(column.name for column in index.columns) for index in table.indexes)
+
     @staticmethod
     def __create_empty_schema(string_engine):
         """
@@ -290,7 +631,10 @@ class Database:
             # the session according to the presence of an exception
             if exc_type is None:
                 current_session.commit()
+                current_session._populse_db_session._transaction_committed()
             else:
+                # The schema modifications of the session are discarded
+                # with it
                 current_session.rollback()
             # Delete the database session
             del current_session._populse_db_session
@@ -310,6 +654,8 @@ class Database:
                     self.engine.execute(table.delete())
                 else:
                     self.engine.execute(DropTable(table))
+            self._reload_schema()
+            self._shared_rows.clear()
             return True
         else:
             return False
@@ -322,9 +668,10 @@ class DatabaseSession:
     attributes:
         - database: Database instance
         - session: Session related to the database
-        - table_classes: List of all table classes, generated automatically
-        - base: Database base
-        - metadata: Database metadata
+        - table_classes: Classes mapped on the collection and field tables (shared by the sessions)
+        - base: Database base (shared by the sessions)
+        - metadata: Database metadata (shared by the sessions), or its copy
+          modified by the current transaction
 
     methods:
         - add_collection: Adds a collection
@@ -337,44 +684,49 @@ class DatabaseSession:
         - remove_field: Removes a field from a collection
         - get_field: Gives all fields rows given a collection
         - get_fields_names: Gives all fields names given a collection
+        - get_schema: Gives the schema snapshot of a collection
+        - create_index: Creates an index on fields of a collection
+        - drop_index: Drops the index on fields of a collection
+        - get_indexes: Gives the indexes of a collection
+        - encode_list_fields: Rewrites the list values with the list codec
+          of the database
         - name_to_valid_column_name: Gives the valid table/column name corresponding
           to the name
+        - valid_column_name_to_name: Gives the name corresponding to a valid
+          table/column name
         - get_value: Gives the value of <collection, document, field>
         - set_value: Sets the value of <collection, document, field>
         - set_values: Sets several values of <collection, document, field>
+        - set_values_many: Sets values of several documents of a collection
+        - set_field_for_documents: Sets the value of a field for the documents
+          matching a filter
         - remove_value: Removes the value of <collection, document, field>
         - add_value: Adds a value to <collection, document, field>
         - get_document: Gives the document row given a document name and a collection
         - get_documents: Gives all document rows given a collection
         - get_documents_names: Gives all document names given a collection
         - add_document: Adds a document to a collection
+        - add_documents: Adds many documents to a collection
         - remove_document: Removes a document from a collection
+        - remove_documents: Removes several documents from a collection
         - save_modifications: Saves the pending modifications
         - unsave_modifications: Unsaves the pending modifications
         - has_unsaved_modifications: To know if there are unsaved
           modifications
         - filter_documents: Gives the list of documents matching the filter
+        - filter_to_columns: Gives the field values of the documents matching
+          the filter as NumPy arrays
+        - explain_filter: Describes how a filter is applied
+        - filter_cache_info: Gives the statistics of the cache of compiled filters
+        - count_documents: Counts the documents matching a filter
+        - distinct_values: Gives the distinct values of a field in the
+          documents matching a filter
+        - aggregate: Computes metrics on groups of the documents matching
+          a filter
+        - shared_cache_info: Gives the statistics of the cache of documents
+          shared by the sessions
     """
 
-    # Some types (e.g. time, date and datetime) cannot be
-    # serialized/deserialized into string with repr/ast.literal_eval.
-    # This is a problem for storing the corresponding list_columns in
-    # database. For the list types with this problem, we record in the
-    # following dictionaries the functions that must be used to serialize
-    # (in _list_item_to_string) and deserialize (in _string_to_list_item)
-    # the list items.
-    _list_item_to_string = {
-        FIELD_TYPE_LIST_DATE: lambda x: x.isoformat(),
-        FIELD_TYPE_LIST_DATETIME: lambda x: x.isoformat(),
-        FIELD_TYPE_LIST_TIME: lambda x: x.isoformat()
-    }
-
-    _string_to_list_item = {
-        FIELD_TYPE_LIST_DATE: lambda x: dateutil.parser.parse(x).date(),
-        FIELD_TYPE_LIST_DATETIME: lambda x: dateutil.parser.parse(x),
-        FIELD_TYPE_LIST_TIME: lambda x: dateutil.parser.parse(x).time(),
-    }
-
     def __init__(self, database, session):
         """
         Creates a session API of the Database instance
@@ -387,13 +739,19 @@ class DatabaseSession:
         self.database = database
         self.session = session
 
-        # Database opened
-        self.metadata = MetaData()
-        self.metadata.reflect(self.database.engine)
-
         self.__unsaved_modifications = False
 
-        self.__update_table_classes()
+        # Schema snapshots of the collections (see get_schema())
+        self.__schemas = {}
+
+        # Documents and collections modified in the current transaction
+        self.__dirty_documents = {}
+        self.__dirty_collections = set()
+
+        # Copy of the shared metadata modified by the current transaction,
+        # and schema versions of the collections it modified
+        self.__metadata = None
+        self.__schema_versions = {}
 
         if self.__caches:
             self.__fill_caches()
@@ -403,25 +761,39 @@ class DatabaseSession:
     def __caches(self):
         return self.database.caches
 
+    @property
+    def __lru_caches(self):
+        return self.database.caches == 'lru'
+
     @property
     def list_tables(self):
         return self.database.list_tables
 
+    @property
+    def json_lists(self):
+        return self.database.json_lists
+
+    @property
+    def __list_codec(self):
+        return self.database.list_codec
+
     @property
     def query_type(self):
         return self.database.query_type
 
-    def __update_table_classes(self):
-        """
-        Redefines the model after an update of the schema
-        """
+    @property
+    def metadata(self):
+        if self.__metadata is not None:
+            return self.__metadata
+        return self.database.metadata
 
-        self.table_classes = {}
-        self.base = automap_base(metadata=self.metadata)
-        self.base.prepare(engine=self.database.engine)
-        for table in self.metadata.tables.keys():
-            self.table_classes[table] = getattr(
-                self.base.classes, table)
+    @property
+    def table_classes(self):
+        return self.database.table_classes
+
+    @property
+    def base(self):
+        return self.database.base
 
     """ CACHES """
 
@@ -431,8 +803,28 @@ class DatabaseSession:
         """
 
         self.__documents = {}
+
+        self.__fill_schema_caches()
+
+        # Documents
+        for collection in self.__collections:
+            self.__refresh_cache_documents(collection)
+
+    def __new_documents_cache(self):
+        """
+        :return: An empty cache of the documents of a collection (dictionary, or LRUCache with the 'lru' caches)
+        """
+
+        if self.__lru_caches:
+            return LRUCache(self.database.max_documents)
+        return {}
+
+    def __fill_schema_caches(self):
+        """
+        Fills the caches of the collections and fields rows
+        """
+
         self.__fields = {}
-        self.__names = {}
         self.__collections = {}
 
         # Collections
@@ -448,28 +840,149 @@ class DatabaseSession:
             for field_row in fields_rows:
                 self.__fields[collection][field_row.field_name] = field_row
 
-        # Documents
-        for collection in self.__collections:
-            documents_rows = self.session.query(self.table_classes[self.name_to_valid_column_name(collection)]).all()
-            self.__documents[collection] = {}
-            for document_row in documents_rows:
-                self.__documents[collection][
-                    getattr(document_row,
-                            self.name_to_valid_column_name(self.__collections[collection].primary_key))] = document_row
-
     def __refresh_cache_documents(self, collection):
         """
-        Refreshes the document cache after a field added or removed
+        Reloads all the documents of a collection in the cache, with the
+        'lru' caches the documents are only discarded from the cache
 
         :param collection: Collection to refresh (str, must be existing)
         """
 
-        self.__documents[collection].clear()
-        documents_rows = self.session.query(self.table_classes[self.name_to_valid_column_name(collection)]).all()
-        self.__documents[collection] = {}
-        for document_row in documents_rows:
-            self.__documents[collection][getattr(document_row, self.name_to_valid_column_name(
-                self.__collections[collection].primary_key))] = document_row
+        self.__documents[collection] = self.__new_documents_cache()
+        if self.__lru_caches:
+            return
+        schema = self.get_schema(collection)
+        pk_column = schema.columns[schema.primary_key]
+        for document_row in self.session.execute(self.__select_documents(schema)):
+            self.__documents[collection][document_row[pk_column]] = dict(document_row.items())
+
+    def __reload_cache_documents(self, collection, documents):
+        """
+        Reloads some documents of a collection in the cache, the documents
+        that do not exist anymore are removed from the cache. With the
+        'lru' caches the documents are only discarded from the cache.
+
+        :param collection: Documents collection (str, must be existing)
+
+        :param documents: Iterable of documents names
+        """
+
+        schema = self.get_schema(collection)
+        pk_column = schema.columns[schema.primary_key]
+        cached_documents = self.__documents[collection]
+        table = self.__collection_table(collection)
+        for ids in self.__chunks(list(documents), self._max_in_parameters):
+            for document in ids:
+                cached_documents.pop(document, None)
+            if self.__lru_caches:
+                continue
+            select = self.__select_documents(schema, table.c[pk_column].in_(ids))
+            for document_row in self.session.execute(select):
+                cached_documents[document_row[pk_column]] = dict(document_row.items())
+
+    def __touch_documents(self, collection, documents):
+        """
+        Records the documents modified in the current transaction, only
+        these documents are reloaded in the cache if it is rolled back, and
+        they are removed from the cache shared by the sessions if it is
+        committed
+
+        :param collection: Documents collection (str)
+
+        :param documents: Iterable of documents names
+        """
+
+        schema = self.get_schema(collection)
+        python_type = self.__collection_table(collection).c[schema.columns[schema.primary_key]].type.python_type
+        self.__dirty_documents.setdefault(collection, set()).update(python_type(document) for document in documents)
+
+    def __rollback_caches(self):
+        """
+        Restores the caches after a rollback of the session: the
+        collections whose fields have been modified are reloaded, only
+        the modified documents are reloaded in the other collections
+        """
+
+        dirty_documents = self.__dirty_documents
+        dirty_collections = self.__dirty_collections
+        self.__dirty_documents = {}
+        self.__dirty_collections = set()
+
+        self.__fill_schema_caches()
+        for collection in list(self.__documents):
+            if collection not in self.__collections:
+                del self.__documents[collection]
+        for collection in self.__collections:
+            if collection in dirty_collections or collection not in self.__documents:
+                self.__refresh_cache_documents(collection)
+            elif collection in dirty_documents:
+                self.__reload_cache_documents(collection, dirty_documents[collection])
+
+    def __modify_schema(self):
+        """
+        Gives the metadata to modify in the current transaction, the shared
+        metadata is copied on the first schema modification
+
+        :return: The metadata of the session (MetaData)
+        """
+
+        if self.__metadata is None:
+            self.__metadata = self.database._copy_schema()
+        return self.__metadata
+
+    def __invalidate_schema(self, collection):
+        """
+        Discards the schema snapshot of a collection after a change of its
+        fields, its new schema is only visible in the session until the
+        transaction is committed
+
+        :param collection: Collection whose schema changed (str)
+        """
+
+        self.__schema_versions[collection] = self.database._new_schema_version()
+        self.__dirty_collections.add(collection)
+        self.__schemas.pop(collection, None)
+
+    def __collection_version(self, collection):
+        """
+        Gives the schema version of a collection in the current transaction
+
+        :param collection: Collection name (str)
+
+        :return: The schema version of the collection (see Database.collection_version)
+        """
+
+        version = self.__schema_versions.get(collection)
+        if version is None:
+            return self.database.collection_version(collection)
+        return version
+
+    def __collection_table(self, collection):
+        """
+        Gives the table of a collection from the metadata of the session, the
+        table is reflected if it has been created outside of this Database instance
+
+        :param collection: Collection name (str, must be existing)
+
+        :return: The Table object of the collection
+        """
+
+        table_name = self.name_to_valid_column_name(collection)
+        table = self.metadata.tables.get(table_name)
+        if table is None:
+            table = self.database._reflect_table(table_name, self.session.connection(), self.__metadata)
+        return table
+
+    def __remove_table_from_metadata(self, table_name):
+        """
+        Removes a table from the metadata of the session if it is there
+
+        :param table_name: Name of the table (str)
+        """
+
+        table = self.metadata.tables.get(table_name)
+        if table is not None:
+            self.metadata.remove(table)
 
     """ COLLECTIONS """
 
@@ -506,16 +1019,12 @@ class DatabaseSession:
         # Creating the collection document table
         pk_name = self.name_to_valid_column_name(primary_key)
         table_name = self.name_to_valid_column_name(name)
-        collection_table = Table(table_name, self.metadata, Column(pk_name, String, primary_key=True))
+        metadata = self.__modify_schema()
+        self.__remove_table_from_metadata(table_name)
+        collection_table = Table(table_name, metadata, Column(pk_name, String, primary_key=True))
         collection_query = CreateTable(collection_table)
         self.session.execute(collection_query)
 
-        # Creating the class associated
-        collection_dict = {'__tablename__': table_name, '__table__': collection_table}
-        collection_class = type(table_name, (self.base,), collection_dict)
-        mapper(collection_class, collection_table)
-        self.table_classes[table_name] = collection_class
-
         # Adding the primary_key of the collection as field
         primary_key_field = self.table_classes[FIELD_TABLE](field_name=primary_key, collection_name=name,
                                                             type=FIELD_TYPE_STRING,
@@ -523,8 +1032,9 @@ class DatabaseSession:
                                                                 name))
         self.session.add(primary_key_field)
 
+        self.__invalidate_schema(name)
         if self.__caches:
-            self.__documents[name] = {}
+            self.__documents[name] = self.__new_documents_cache()
             self.__fields[name] = {}
             self.__fields[name][primary_key] = primary_key_field
             self.__collections[name] = collection_row
@@ -551,23 +1061,20 @@ class DatabaseSession:
         self.session.query(self.table_classes[FIELD_TABLE]).filter(
             self.table_classes[FIELD_TABLE].collection_name == name).delete()
 
-        # Removing the collection document table + metadata associated
-        collection_query = DropTable(self.table_classes[self.name_to_valid_column_name(name)].__table__)
-        self.session.execute(collection_query)
-        self.metadata.remove(self.table_classes[self.name_to_valid_column_name(name)].__table__)
-
-        # Removing the class associated
-        self.table_classes.pop(name, None)
+        # Removing the collection document table and its list tables + metadata associated
+        metadata = self.__modify_schema()
+        for table in self.database._collection_tables(metadata, self.name_to_valid_column_name(name)):
+            self.session.execute(DropTable(table))
+            metadata.remove(table)
 
         if self.__caches:
             self.__documents.pop(name, None)
             self.__fields.pop(name, None)
             self.__collections.pop(name, None)
 
-        self.session.flush()
+        self.__invalidate_schema(name)
 
-        # Base updated to remove the document table of the collection
-        self.__update_table_classes()
+        self.session.flush()
 
     def get_collection(self, name):
         """
@@ -616,33 +1123,36 @@ class DatabaseSession:
         """
         Adds the list of fields
 
+        The fields of a collection are created all at once: if the
+        collection is empty its table is created again with all the
+        columns, otherwise the columns are added by ALTER TABLE (a single
+        one with PostgreSQL).
+
         :param fields: List of fields: [collection, name, type, description]
-        """
 
-        collections = []
+        :raise ValueError: - If fields is invalid
+                           - If a field is invalid (see add_field)
+        """
 
         if not isinstance(fields, list):
             raise ValueError(
                 "The fields must be of type {0}, but fields of type {1} given".format(list, type(fields)))
 
+        collections_fields = collections.OrderedDict()
         for field in fields:
-
-            # Adding each field
             if not isinstance(field, list) or len(field) != 4:
                 raise ValueError("Invalid field, it must be a list of four elements: [collection, name, type, description]")
-            self.add_field(field[0], field[1], field[2], field[3], False)
-            if field[0] not in collections:
-                collections.append(field[0])
+            collections_fields.setdefault(field[0], []).append((field[1], field[2], field[3], False))
 
-        # Updating the table classes
-        self.session.flush()
+        # All the fields are checked before any table is modified
+        for collection, collection_fields in collections_fields.items():
+            self.__check_collection_fields(collection, collection_fields)
 
-        # Classes reloaded in order to add the new column attribute
-        self.__update_table_classes()
+        # Adding the fields of each collection
+        for collection, collection_fields in collections_fields.items():
+            self.__add_collection_fields(collection, collection_fields)
 
-        if self.__caches:
-            for collection in collections:
-                self.__refresh_cache_documents(collection)
+        self.session.flush()
 
     def add_field(self, collection, name, field_type, description=None,
                   index=False, flush=True):
@@ -670,95 +1180,149 @@ class DatabaseSession:
                            - If the field description is invalid
         """
 
-        # Checks
+        fields = [(name, field_type, description, index)]
+        self.__check_collection_fields(collection, fields)
+        self.__add_collection_fields(collection, fields)
+
+        if flush:
+            self.session.flush()
+
+    def __check_collection_fields(self, collection, fields):
+        """
+        Checks the fields to add to a collection
+
+        :param collection: Fields collection (str, must be existing)
+
+        :param fields: List of (name, type, description, index), see add_field
+
+        :raise ValueError: If a field is invalid (see add_field)
+        """
+
         collection_row = self.get_collection(collection)
         if collection_row is None:
             raise ValueError("The collection {0} does not exist".format(collection))
-        field_row = self.get_field(collection, name)
-        if field_row is not None:
-            raise ValueError("A field with the name {0} already exists in the collection {1}".format(name, collection))
-        if not isinstance(name, str):
-            raise ValueError(
-                "The field name must be of type {0}, but field name of type {1} given".format(str, type(name)))
-        if not field_type in ALL_TYPES:
-            raise ValueError("The field type must be in {0}, but {1} given".format(ALL_TYPES, field_type))
-        if not isinstance(description, str) and description is not None:
-            raise ValueError(
-                "The field description must be of type {0} or None, but field description of type {1} given".format(str,
-                                                                                                                    type(
-                                                                                                                        description)))
+        names = set()
+        for name, field_type, description, index in fields:
+            if name in names or self.get_field(collection, name) is not None:
+                raise ValueError(
+                    "A field with the name {0} already exists in the collection {1}".format(name, collection))
+            names.add(name)
+            if not isinstance(name, str):
+                raise ValueError(
+                    "The field name must be of type {0}, but field name of type {1} given".format(str, type(name)))
+            if not field_type in ALL_TYPES:
+                raise ValueError("The field type must be in {0}, but {1} given".format(ALL_TYPES, field_type))
+            if not isinstance(description, str) and description is not None:
+                raise ValueError(
+                    "The field description must be of type {0} or None, but field description of type {1} given".format(
+                        str, type(description)))
 
-        # Adding the field in the field table
-        field_row = self.table_classes[FIELD_TABLE](field_name=name, collection_name=collection, type=field_type,
-                                                    description=description)
+    def __add_collection_fields(self, collection, fields):
+        """
+        Adds fields to a collection with one pass of DDL statements
 
-        if self.__caches:
-            self.__fields[collection][name] = field_row
+        :param collection: Fields collection (str, must be existing)
+
+        :param fields: List of (name, type, description, index), already checked by __check_collection_fields
+        """
 
-        self.session.add(field_row)
+        # Adding the fields in the field table
+        field_rows = [self.table_classes[FIELD_TABLE](field_name=name, collection_name=collection, type=field_type,
+                                                      description=description)
+                      for name, field_type, description, index in fields]
+        self.session.add_all(field_rows)
+        if self.__caches:
+            for field_row in field_rows:
+                self.__fields[collection][field_row.field_name] = field_row
 
         # Fields creation
-        if field_type in LIST_TYPES:
-            if self.list_tables:
-                table = 'list_%s_%s' % (self.name_to_valid_column_name(collection), self.name_to_valid_column_name(name))
-                list_table = Table(table, self.metadata, Column('document_id', String, primary_key=True),
-                                   Column('i', Integer, primary_key=True),
-                                   Column('value', TYPE_TO_COLUMN[field_type[5:]]))
-                list_query = CreateTable(list_table)
-                self.session.execute(list_query)
-
-                # Creating the class associated
-                collection_dict = {'__tablename__': table, '__table__': list_table}
-                collection_class = type(table, (self.base,), collection_dict)
-                mapper(collection_class, list_table)
-                self.table_classes[table] = collection_class
-            # String columns if it list type, as the str representation of the lists will be stored
-            field_type = String
+        table_name = self.name_to_valid_column_name(collection)
+        columns = []
+        list_tables = []
+        metadata = self.__modify_schema()
+        for name, field_type, description, index in fields:
+            if field_type in LIST_TYPES:
+                if self.list_tables:
+                    list_table_name = 'list_%s_%s' % (table_name, self.name_to_valid_column_name(name))
+                    self.__remove_table_from_metadata(list_table_name)
+                    list_tables.append(Table(list_table_name, metadata,
+                                             Column('document_id', String, primary_key=True),
+                                             Column('i', Integer, primary_key=True),
+                                             Column('value', TYPE_TO_COLUMN[field_type[5:]], index=True)))
+                # String columns if it list type, as the str representation of the lists will be stored
+                column_type = String
+            else:
+                column_type = self.__field_type_to_column_type(field_type)
+            columns.append(Column(self.name_to_valid_column_name(name), column_type, index=index))
+        for list_table in list_tables:
+            self.session.execute(CreateTable(list_table))
+            # Index used by the IN operator of the filters
+            for index in list_table.indexes:
+                self.session.execute(CreateIndex(index))
+
+        table = self.__collection_table(collection)
+        pk_column = list(table.primary_key.columns.values())[0]
+        recreate = (len(columns) > 1 and
+                    self.session.execute(sql.select([pk_column]).limit(1)).first() is None)
+        if recreate:
+            # The collection is empty: its table is created again with
+            # all the columns, instead of being altered once per column
+            self.session.execute(DropTable(table))
+            for column in columns:
+                table.append_column(column)
+            self.session.execute(CreateTable(table))
+            indexes = table.indexes
         else:
-            field_type = self.__field_type_to_column_type(field_type)
-
-        column = Column(self.name_to_valid_column_name(name), field_type, index=index)
-        column_str_type = column.type.compile(self.database.engine.dialect)
-        column_name = column.compile(dialect=self.database.engine.dialect)
-
-        # Column created in document table, and in initial table if initial values are used
-
-        document_query = str('ALTER TABLE "%s" ADD COLUMN %s %s' %
-                             (self.name_to_valid_column_name(collection), column_name, column_str_type))
-        self.session.execute(document_query)
-        self.table_classes[self.name_to_valid_column_name(collection)].__table__.append_column(column)
-        
-        # Redefinition of the table classes
-        if flush:
-            self.session.flush()
-
-            # Classes reloaded in order to add the new column attribute
-            self.__update_table_classes()
+            dialect = self.database.engine.dialect
+            add_columns = ['ADD COLUMN %s %s' % (column.compile(dialect=dialect),
+                                                 column.type.compile(dialect))
+                           for column in columns]
+            if dialect.name == 'postgresql':
+                alter_queries = ['ALTER TABLE "%s" %s' % (table_name, ', '.join(add_columns))]
+            else:
+                alter_queries = ['ALTER TABLE "%s" %s' % (table_name, add_column) for add_column in add_columns]
+            for alter_query in alter_queries:
+                self.session.execute(str(alter_query))
+            existing_indexes = set(table.indexes)
+            for column in columns:
+                table.append_column(column)
+            indexes = table.indexes - existing_indexes
+        for index in indexes:
+            self.session.execute(CreateIndex(index))
 
-            if self.__caches:
-                self.__refresh_cache_documents(collection)
+        if self.__caches:
+            # The new columns are NULL in all the documents
+            new_columns = [column.name for column in columns]
+            for document_row in self.__documents[collection].values():
+                for column_name in new_columns:
+                    document_row[column_name] = None
 
+        self.__invalidate_schema(collection)
         self.__unsaved_modifications = True
 
     def name_to_valid_column_name(self, name):
         """
         Transforms the name into a valid and unique table/column name, by hashing it with md5
 
+        The names are hashed once, whatever the caches policy (see Database.column_name)
+
         :param name: Name (str)
 
         :return: Valid and unique (hashed) table/column name
         """
 
-        if self.__caches:
-            try:
-                return self.__names[name]
-            except KeyError:
-                valid_name = hashlib.md5(name.encode('utf-8')).hexdigest()
-                self.__names[name] = valid_name
-                return valid_name
-        else:
-            valid_name = hashlib.md5(name.encode('utf-8')).hexdigest()
-            return valid_name
+        return self.database.column_name(name)
+
+    def valid_column_name_to_name(self, column_name):
+        """
+        Gives the name corresponding to a valid table/column name (see name_to_valid_column_name)
+
+        :param column_name: Table/column name (str)
+
+        :return: The collection or field name, or None if the column name is not known
+        """
+
+        return self.database.column_to_name(column_name)
 
     def remove_field(self, collection, field):
         """
@@ -793,70 +1357,59 @@ class DatabaseSession:
             else:
                 field_rows.append(field_row)
 
-        field_names = []
-        if isinstance(field, list):
-            for field_elem in field:
-                field_names.append(self.name_to_valid_column_name(field_elem))
+        removed_columns = set(self.name_to_valid_column_name(field_row.field_name) for field_row in field_rows)
+        table_name = self.name_to_valid_column_name(collection)
+
+        # Fields removed from collection document table
+        metadata = self.__modify_schema()
+        old_document_table = self.__collection_table(collection)
+        removed_indexes = [index for index in old_document_table.indexes
+                           if any(column.name in removed_columns for column in index.columns)]
+        remaining_indexes = [index for index in old_document_table.indexes if index not in removed_indexes]
+        metadata.remove(old_document_table)
+
+        # Table of the session metadata, without the columns
+        new_document_table = Table(table_name, metadata,
+                                   *[Column(column.name, column.type, primary_key=column.primary_key)
+                                     for column in old_document_table.columns
+                                     if column.name not in removed_columns])
+        new_indexes = [Index(index.name, *[new_document_table.c[column.name] for column in index.columns],
+                             unique=index.unique)
+                       for index in remaining_indexes]
+
+        dialect = self.database.engine.dialect
+        if self.database._supports_drop_column():
+            for index in removed_indexes:
+                self.session.execute(DropIndex(index))
+            drop_columns = ['DROP COLUMN "%s"' % column for column in sorted(removed_columns)]
+            if dialect.name == 'postgresql':
+                alter_queries = ['ALTER TABLE "%s" %s' % (table_name, ', '.join(drop_columns))]
+            else:
+                alter_queries = ['ALTER TABLE "%s" %s' % (table_name, drop_column)
+                                 for drop_column in drop_columns]
+            for alter_query in alter_queries:
+                self.session.execute(str(alter_query))
         else:
-            field_names.append(self.name_to_valid_column_name(field))
-
-        # Field removed from collection document table
-        old_document_table = Table(self.name_to_valid_column_name(collection), self.metadata)
-        select = sql.select(
-            [c for c in old_document_table.c if c.name not in str(field_names)])
-
-        remaining_columns = [copy.copy(c) for c in old_document_table.columns
-                             if c.name not in str(field_names)]
-
-        # Creation of backup table, not containing the column
-        document_backup_table = Table(self.name_to_valid_column_name(collection) + "_backup", self.metadata)
-
-        for column in old_document_table.columns:
-            if column.name not in str(field_names):
-                document_backup_table.append_column(column.copy())
-
-        self.session.execute(CreateTable(document_backup_table))
-
-        insert = sql.insert(document_backup_table).from_select(
-            [c.name for c in remaining_columns], select)
-        self.session.execute(insert)
-
-        # Removing the original table
-        self.metadata.remove(old_document_table)
-        self.session.execute(DropTable(old_document_table))
-
-        # Recreating the table without the column
-        new_document_table = Table(self.name_to_valid_column_name(collection), self.metadata)
-        for column in document_backup_table.columns:
-            new_document_table.append_column(column.copy())
-
-        self.session.execute(CreateTable(new_document_table))
-
-        select = sql.select(
-            [c for c in document_backup_table.c if c.name not in str(field_names)])
-        insert = sql.insert(new_document_table).from_select(
-            [c.name for c in remaining_columns], select)
-        self.session.execute(insert)
-
-        # Removing the backup table
-        self.metadata.remove(document_backup_table)
-        self.session.execute(DropTable(document_backup_table))
+            # The rows are copied once in a new table, renamed as the
+            # original table
+            copy_table = new_document_table.tometadata(MetaData(), name=table_name + "_new")
+            self.session.execute(CreateTable(copy_table))
+            select = sql.select([old_document_table.c[column.name] for column in copy_table.columns])
+            self.session.execute(sql.insert(copy_table).from_select(
+                [column.name for column in copy_table.columns], select))
+            self.session.execute(DropTable(old_document_table))
+            self.session.execute(str('ALTER TABLE "%s" RENAME TO "%s"' % (copy_table.name, table_name)))
+            for index in new_indexes:
+                self.session.execute(CreateIndex(index))
 
         if self.list_tables:
-            if isinstance(field, list):
-                for field_elem in field:
-                    if self.get_field(collection, field_elem).type in LIST_TYPES:
-                        table = 'list_%s_%s' % (self.name_to_valid_column_name(collection), self.name_to_valid_column_name(field_elem))
-                        collection_query = DropTable(self.table_classes[table].__table__)
-                        self.session.execute(collection_query)
-                        self.metadata.remove(self.table_classes[table].__table__)
-
-            else:
-                if self.get_field(collection, field).type in LIST_TYPES:
-                    table = 'list_%s_%s' % (self.name_to_valid_column_name(collection), self.name_to_valid_column_name(field))
-                    collection_query = DropTable(self.table_classes[table].__table__)
-                    self.session.execute(collection_query)
-                    self.metadata.remove(self.table_classes[table].__table__)
+            for field_row in field_rows:
+                if field_row.type in LIST_TYPES:
+                    table = 'list_%s_%s' % (table_name, self.name_to_valid_column_name(field_row.field_name))
+                    list_table = metadata.tables.get(table)
+                    if list_table is not None:
+                        self.session.execute(DropTable(list_table))
+                        metadata.remove(list_table)
 
         # Removing field rows from field table
         for field_row in field_rows:
@@ -864,16 +1417,14 @@ class DatabaseSession:
 
         self.session.flush()
 
-        # Classes reloaded in order to remove the columns attributes
-        self.__update_table_classes()
+        self.__invalidate_schema(collection)
 
         if self.__caches:
-            self.__refresh_cache_documents(collection)
-            if isinstance(field, list):
-                for field_elem in field:
-                    self.__fields[collection].pop(field_elem, None)
-            else:
-                self.__fields[collection].pop(field, None)
+            for field_row in field_rows:
+                self.__fields[collection].pop(field_row.field_name, None)
+            for document_row in self.__documents[collection].values():
+                for column_name in removed_columns:
+                    document_row.pop(column_name, None)
 
         self.__unsaved_modifications = True
 
@@ -930,6 +1481,210 @@ class DatabaseSession:
             self.table_classes[FIELD_TABLE].collection_name == collection).all()
         return fields
 
+    def get_schema(self, collection):
+        """
+        Gives the schema snapshot of a collection
+
+        The snapshot is built once and kept until the fields of the
+        collection are modified (add_field, add_fields, remove_field or
+        remove_collection), it must not be modified.
+
+        :param collection: Collection name (str, must be existing)
+
+        :return: The CollectionSchema of the collection if it exists, None otherwise
+        """
+
+        schema = self.__schemas.get(collection)
+        if schema is None or schema.version != self.__collection_version(collection):
+            collection_row = self.get_collection(collection)
+            if collection_row is None:
+                return None
+            if self.__caches:
+                field_rows = self.__fields[collection].values()
+            else:
+                field_rows = self.get_fields(collection)
+            fields = [(field_row.field_name, field_row.type) for field_row in field_rows]
+            schema = CollectionSchema(collection, collection_row.primary_key, fields,
+                                      self.name_to_valid_column_name,
+                                      self.__collection_version(collection),
+                                      self.__list_codec)
+            table = self.__collection_table(collection)
+            if table is not None and not all(column in table.c for column in schema.columns.values()):
+                # The collection has been modified outside of this Database instance
+                self.database._reflect_table(schema.table_name, self.session.connection(), self.__metadata)
+            self.__schemas[collection] = schema
+        return schema
+
+    def create_index(self, collection, fields):
+        """
+        Creates an index on fields of a collection
+
+        For a list field, the values of its list table (used by the IN
+        operator of the filters) are indexed too if they are not already.
+
+        :param collection: Fields collection (str, must be existing)
+
+        :param fields: Field name (str, must be existing), or list of fields for a composite index (list of str, must all be existing)
+
+        :raise ValueError: - If the collection does not exist
+                           - If a field does not exist
+                           - If the index already exists
+        """
+
+        fields, columns = self.__index_columns(collection, fields)
+        metadata = self.__modify_schema()
+        table = self.__collection_table(collection)
+        if self.__find_index(table, columns) is not None:
+            raise ValueError(
+                "An index on the fields {0} already exists in the collection {1}".format(fields, collection))
+        if len(columns) == 1:
+            # Named as the indexes created by add_field
+            index = Index(None, table.c[columns[0]])
+        else:
+            index = Index(conv('ix_%s_%s' % (table.name, '_'.join(columns))),
+                          *[table.c[column] for column in columns])
+        self.session.execute(CreateIndex(index))
+        if len(fields) == 1 and self.list_tables:
+            list_table = metadata.tables.get(self.get_schema(collection).list_tables.get(fields[0]))
+            if list_table is not None and self.__find_index(list_table, ['value']) is None:
+                self.session.execute(CreateIndex(Index(None, list_table.c.value)))
+
+        self.__invalidate_schema(collection)
+        self.__unsaved_modifications = True
+
+    def drop_index(self, collection, fields):
+        """
+        Drops the index on fields of a collection (created by add_field or create_index)
+
+        :param collection: Fields collection (str, must be existing)
+
+        :param fields: Field name (str, must be existing), or list of fields of a composite index (list of str, must all be existing)
+
+        :raise ValueError: - If the collection does not exist
+                           - If a field does not exist
+                           - If there is no index on the fields
+        """
+
+        fields, columns = self.__index_columns(collection, fields)
+        self.__modify_schema()
+        table = self.__collection_table(collection)
+        index = self.__find_index(table, columns)
+        if index is None:
+            raise ValueError(
+                "There is no index on the fields {0} in the collection {1}".format(fields, collection))
+        self.session.execute(DropIndex(index))
+        table.indexes.discard(index)
+
+        self.__invalidate_schema(collection)
+        self.__unsaved_modifications = True
+
+    def get_indexes(self, collection):
+        """
+        Gives the indexes of a collection
+
+        :param collection: Fields collection (str, must be existing)
+
+        :return: List of the indexes, an index is given by the tuple of its fields names
+
+        :raise ValueError: If the collection does not exist
+        """
+
+        if self.get_collection(collection) is None:
+            raise ValueError("The collection {0} does not exist".format(collection))
+        table = self.__collection_table(collection)
+        return sorted(tuple(self.valid_column_name_to_name(column.name) for column in index.columns)
+                      for index in table.indexes)
+
+    def __index_columns(self, collection, fields):
+        """
+        Checks the fields of an index
+
+        :param collection: Fields collection (str, must be existing)
+
+        :param fields: Field name (str), or list of fields names
+
+        :return: Tuple (list of the fields names, list of their column names)
+
+        :raise ValueError: - If the collection does not exist
+                           - If a field does not exist
+        """
+
+        if self.get_collection(collection) is None:
+            raise ValueError("The collection {0} does not exist".format(collection))
+        if isinstance(fields, str):
+            fields = [fields]
+        if not isinstance(fields, (list, tuple)) or not fields:
+            raise ValueError("The fields must be a field name or a non empty list of fields names, "
+                             "but {0} given".format(fields))
+        for field in fields:
+            if self.get_field(collection, field) is None:
+                raise ValueError(
+                    "The field with the name {0} does not exist in the collection {1}".format(field, collection))
+        return list(fields), [self.name_to_valid_column_name(field) for field in fields]
+
+    @staticmethod
+    def __find_index(table, columns):
+        """
+        :return: The index of a table on exactly the given columns (in this order), None if there is none
+        """
+
+        for index in table.indexes:
+            if [column.name for column in index.columns] == columns:
+                return index
+        return None
+
+    def encode_list_fields(self, collection=None):
+        """
+        Rewrites the list values with the list codec of the database
+
+        This is used to migrate a database whose lists have been stored with
+        another codec (for instance the repr encoding of the former versions
+        of populse_db), the values of the list tables are not modified.
+
+        :param collection: Collection to migrate (str, must be existing), None to migrate all the collections => None by default
+
+        :return: The number of list values rewritten
+
+        :raise ValueError: If the collection does not exist
+        """
+
+        if collection is None:
+            collections = self.get_collections_names()
+        elif self.get_collection(collection) is None:
+            raise ValueError("The collection {0} does not exist".format(collection))
+        else:
+            collections = [collection]
+
+        count = 0
+        for collection in collections:
+            schema = self.get_schema(collection)
+            list_fields = [field for field in schema.fields if schema.types[field].startswith('list_')]
+            if not list_fields:
+                continue
+            table = self.__collection_table(collection)
+            pk_column = table.c[schema.columns[schema.primary_key]]
+            updates = {}
+            for field in list_fields:
+                column = table.c[schema.columns[field]]
+                field_type = schema.types[field]
+                rows = self.session.execute(sql.select([pk_column, column]).where(column.isnot(None)))
+                for document_id, value in rows:
+                    encoded = self.__list_codec.encode(field_type, self.__list_codec.decode(field_type, value))
+                    if encoded != value:
+                        updates.setdefault(column.name, []).append({'_document_id': document_id,
+                                                                    '_value': encoded})
+            for column_name, parameters in updates.items():
+                update = table.update().where(pk_column == sql.bindparam('_document_id')).values(
+                    {column_name: sql.bindparam('_value')})
+                self.session.execute(update, parameters)
+                self.__touch_documents(collection, [parameter['_document_id'] for parameter in parameters])
+                count += len(parameters)
+            if updates:
+                self.__unsaved_modifications = True
+                if self.__caches:
+                    self.__refresh_cache_documents(collection)
+        return count
+
     """ VALUES """
 
     def get_value(self, collection, document, field):
@@ -994,13 +1749,13 @@ class DatabaseSession:
         new_column = self.__python_to_column(field_row.type, new_value)
 
         if field != collection_row.primary_key:
-            setattr(document_row, column_name, new_column)
+            self.__update_document_row(collection, document_row, {column_name: new_column})
         else:
             raise ValueError("Impossible to set the primary_key value of a document")
 
         if self.list_tables and isinstance(new_value, list):
             primary_key = self.get_collection(collection).primary_key
-            document_id = getattr(document_row, self.name_to_valid_column_name(primary_key))
+            document_id = document_row[self.name_to_valid_column_name(primary_key)]
             table_name = 'list_%s_%s' % (self.name_to_valid_column_name(collection), column_name)
 
             table = self.metadata.tables[table_name]
@@ -1069,8 +1824,7 @@ class DatabaseSession:
                 raise ValueError("Impossible to set the primary_key value of a document")
 
         # Updating all values
-        for column in database_values:
-            setattr(document_row, column, database_values[column])
+        self.__update_document_row(collection, document_row, database_values)
 
         # Updating list tables values
         for field in values:
@@ -1100,6 +1854,226 @@ class DatabaseSession:
 
         self.__unsaved_modifications = True
 
+    def set_values_many(self, collection, values, flush=True):
+        """
+        Sets values of several documents of a collection, the documents
+        setting the same fields are updated by a single executemany UPDATE
+
+        :param collection: Documents collection (str, must be existing)
+
+        :param values: Dict of the values of the documents (key=document name, value=dict of values (key=field, value=value))
+
+        :param flush: Bool to know if flush to do => True by default
+
+        :raise ValueError: - If the collection does not exist
+                           - If a field does not exist
+                           - If a document does not exist
+                           - If a value is invalid
+                           - If trying to set the primary_key
+        """
+
+        collection_row = self.get_collection(collection)
+        if collection_row is None:
+            raise ValueError("The collection {0} does not exist".format(collection))
+        if not isinstance(values, dict):
+            raise ValueError(
+                "The values must be of type {0}, but values of type {1} given".format(dict, type(values)))
+        schema = self.get_schema(collection)
+        for document, document_values in values.items():
+            if not isinstance(document_values, dict):
+                raise ValueError("The values must be of type {0}, but values of type {1} given".format(
+                    dict, type(document_values)))
+            for field, value in document_values.items():
+                self.__check_new_value(collection_row, schema, field, value)
+        documents = list(values)
+        existing = set(self.__get_existing_documents_ids(collection, documents))
+        for document in documents:
+            if document not in existing:
+                raise ValueError(
+                    "The document with the name {0} does not exist in the collection {1}".format(document, collection))
+
+        # The documents are grouped by set of modified fields, each group is
+        # updated by one executemany UPDATE
+        groups = collections.OrderedDict()
+        list_values = {}
+        for document, document_values in values.items():
+            if not document_values:
+                continue
+            column_values = {}
+            for field, value in document_values.items():
+                field_type = schema.types[field]
+                column_values[schema.columns[field]] = self.__python_to_column(field_type, value)
+                if field_type.startswith('list_'):
+                    list_values.setdefault(field, []).append((document, value))
+            groups.setdefault(tuple(sorted(column_values)), []).append((document, column_values))
+
+        table = self.__collection_table(collection)
+        pk_column = table.c[schema.columns[schema.primary_key]]
+        for columns, group in groups.items():
+            update = table.update().where(pk_column == sql.bindparam('_document_id')).values(
+                dict((column, sql.bindparam('_' + column)) for column in columns))
+            parameters = []
+            for document, column_values in group:
+                parameter = dict(('_' + column, value) for column, value in column_values.items())
+                parameter['_document_id'] = document
+                parameters.append(parameter)
+            self.session.execute(update, parameters)
+            self.__update_cached_rows(collection, group)
+
+        for field, field_values in list_values.items():
+            self.__rewrite_list_table(schema, field, field_values)
+
+        self.__touch_documents(collection, (document for document in documents if values[document]))
+
+        if flush:
+            self.session.flush()
+
+        if list_values or groups:
+            self.__unsaved_modifications = True
+
+    def set_field_for_documents(self, collection, field, value, filter=None, flush=True):
+        """
+        Sets the same value of a field for all the documents selected by a filter
+
+        If the filter is entirely converted into SQL, the documents are
+        updated by a single UPDATE ... WHERE statement.
+
+        :param collection: Documents collection (str, must be existing)
+
+        :param field: Field name (str, must be existing)
+
+        :param value: New value
+
+        :param filter: Filter selecting the documents to update (str, see filter_documents), None to update all the documents => None by default
+
+        :param flush: Bool to know if flush to do => True by default
+
+        :return: The number of documents updated
+
+        :raise ValueError: - If the collection does not exist
+                           - If the field does not exist
+                           - If the value is invalid
+                           - If trying to set the primary_key
+        """
+
+        collection_row = self.get_collection(collection)
+        if collection_row is None:
+            raise ValueError("The collection {0} does not exist".format(collection))
+        schema = self.get_schema(collection)
+        self.__check_new_value(collection_row, schema, field, value)
+
+        table = self.__collection_table(collection)
+        pk_column = table.c[schema.columns[schema.primary_key]]
+        column = schema.columns[field]
+        field_type = schema.types[field]
+        column_value = self.__python_to_column(field_type, value)
+
+        # The documents identifiers are needed to rewrite the list tables
+        # and to maintain the caches
+        sql_condition, python_filter = self.__split_filter_query(collection, filter)
+        if python_filter is None:
+            select = sql.select([pk_column])
+            update = table.update().values({column: column_value})
+            if sql_condition is not None:
+                select = select.where(sql_condition)
+                update = update.where(sql_condition)
+            documents = [row[0] for row in self.session.execute(select)]
+            if documents:
+                self.session.execute(update)
+        else:
+            documents = [document[schema.primary_key]
+                         for document in self.filter_documents(collection, filter, fields=[])]
+            update = table.update().values({column: column_value})
+            for ids in self.__chunks(documents, self._max_in_parameters):
+                self.session.execute(update.where(pk_column.in_(ids)))
+
+        self.__update_cached_rows(collection, ((document, {column: column_value}) for document in documents))
+        if field_type.startswith('list_'):
+            self.__rewrite_list_table(schema, field, [(document, value) for document in documents])
+        self.__touch_documents(collection, documents)
+
+        if flush:
+            self.session.flush()
+
+        if documents:
+            self.__unsaved_modifications = True
+        return len(documents)
+
+    def __check_new_value(self, collection_row, schema, field, value):
+        """
+        Checks that a value can be given to a field of the documents of a collection
+
+        :param collection_row: Collection row
+
+        :param schema: CollectionSchema of the collection
+
+        :param field: Field name
+
+        :param value: New value
+
+        :raise ValueError: - If the field does not exist
+                           - If the value is invalid
+                           - If trying to set the primary_key
+        """
+
+        field_type = schema.types.get(field)
+        if field_type is None:
+            raise ValueError("The field with the name {0} does not exist in the collection {1}".format(
+                field, collection_row.collection_name))
+        if field == collection_row.primary_key:
+            raise ValueError("Impossible to set the primary_key value of a document")
+        if not self.__check_type_value(value, field_type):
+            raise ValueError("The value {0} is invalid for the type {1}".format(value, field_type))
+
+    def __update_cached_rows(self, collection, column_values):
+        """
+        Updates the rows of the cached documents after an UPDATE
+
+        :param collection: Documents collection (str, must be existing)
+
+        :param column_values: Iterable of (document name, dictionary of the new column values)
+        """
+
+        if not self.__caches:
+            return
+        cached_documents = self.__documents[collection]
+        for document, values in column_values:
+            document_row = cached_documents.get(document)
+            if document_row is not None:
+                document_row.update(values)
+
+    def __rewrite_list_table(self, schema, field, values):
+        """
+        Replaces the items of the list table of a field for several
+        documents, the old items are deleted by chunks and the new ones
+        are inserted by a single executemany INSERT
+
+        :param schema: CollectionSchema of the collection
+
+        :param field: List field name
+
+        :param values: List of (document name, new list value or None)
+        """
+
+        if not self.list_tables:
+            return
+        table = self.metadata.tables.get(schema.list_tables[field])
+        if table is None:
+            return
+        item_type = schema.types[field][5:]
+        documents = [document for document, value in values]
+        for ids in self.__chunks(documents, self._max_in_parameters):
+            self.session.execute(table.delete(table.c.document_id.in_(ids)))
+        parameters = []
+        for document, value in values:
+            if value is None:
+                continue
+            for index, item in enumerate(value):
+                parameters.append({'document_id': document, 'i': index,
+                                   'value': self.__python_to_column(item_type, item)})
+        if parameters:
+            self.session.execute(table.insert(), parameters)
+
     def remove_value(self, collection, document, field, flush=True):
         """
         Removes the value <collection, document, field> if it exists
@@ -1132,12 +2106,11 @@ class DatabaseSession:
 
         sql_column_name = self.name_to_valid_column_name(field)
         collection_name = self.name_to_valid_column_name(collection)
-        old_value = getattr(document_row, sql_column_name)
-        setattr(document_row, sql_column_name, None)
+        self.__update_document_row(collection, document_row, {sql_column_name: None})
 
         if self.list_tables and field_row.type.startswith('list_'):
             primary_key = self.get_collection(collection).primary_key
-            document_id = getattr(document_row, self.name_to_valid_column_name(primary_key))
+            document_id = document_row[self.name_to_valid_column_name(primary_key)]
             table_name = 'list_%s_%s' % (collection_name, sql_column_name)
             table = self.metadata.tables[table_name]
             sql = table.delete(table.c.document_id == document_id)
@@ -1185,8 +2158,7 @@ class DatabaseSession:
                 raise ValueError("The value {0} is invalid for the type {1}".format(value, field_row.type))
 
         field_name = self.name_to_valid_column_name(field)
-        database_value = getattr(
-            document_row, field_name)
+        database_value = document_row[field_name]
         collection_name = self.name_to_valid_column_name(collection)
 
         # We add the value only if it does not already exist
@@ -1194,12 +2166,10 @@ class DatabaseSession:
             if value is not None:
                 current_value = self.__python_to_column(
                     field_row.type, value)
-                setattr(
-                    document_row, field_name,
-                    current_value)
+                self.__update_document_row(collection, document_row, {field_name: current_value})
                 if self.list_tables and isinstance(value, list):
                     primary_key = self.get_collection(collection).primary_key
-                    document_id = getattr(document_row, self.name_to_valid_column_name(primary_key))
+                    document_id = document_row[self.name_to_valid_column_name(primary_key)]
                     table = 'list_%s_%s' % (collection_name, field_name)
                     sql = self.metadata.tables[table].insert()
                     sql_params = []
@@ -1221,34 +2191,98 @@ class DatabaseSession:
 
     """ DOCUMENTS """
 
-    def __get_document_row(self, collection, document):
+    def __get_document_row(self, collection, document, decoders=None):
         """
-        Gives the SQLAchemy row of a document, given a collection and a
-        document identifier.
+        Gives the row of a document, given a collection and a
+        document identifier. The row gives the column values by column
+        name, it is a dictionary if the caches are used or a SQLAlchemy
+        row otherwise.
 
         :param collection: Document collection (str, must be existing)
 
         :param document: Document name (str, must be existing)
 
+        :param decoders: Decoders of the fields to select if the document is not taken from the caches (see CollectionSchema.projection), None for all the fields => None by default
+
         :return: The document row if the document exists, None otherwise
         """
 
         collection_row = self.get_collection(collection)
         if collection_row is None:
             return None
+        schema = self.get_schema(collection)
+        column = self.__collection_table(collection).c[schema.columns[schema.primary_key]]
+        # The caches are indexed by the value of the primary key, so that
+        # equivalent identifiers (such as 1 and '1') share the same entries
+        document = column.type.python_type(document)
         if self.__caches:
-            return self.__documents[collection].get(document)
-        else:
-            primary_key = collection_row.primary_key
-            column = getattr(self.table_classes[self.name_to_valid_column_name(collection)],
-                             self.name_to_valid_column_name(primary_key))
-            value = column.type.python_type(document)
-            query = self.session.query(self.table_classes[self.name_to_valid_column_name(collection)]).filter(
-                column == value)
-            document_row = query.first()
-            return document_row
-    
-    def get_document(self, collection, document):
+            document_row = self.__documents[collection].get(document)
+            if document_row is not None or not self.__lru_caches:
+                return document_row
+            decoders = None
+
+        # The rows modified in the current transaction are not shared
+        shared = (self.database.shared_cache_size > 0 and collection not in self.__dirty_collections
+                  and document not in self.__dirty_documents.get(collection, ()))
+        document_row = None
+        if shared:
+            document_row, generation = self.database._get_shared_row(collection, document)
+            decoders = None
+        if document_row is None:
+            document_row = self.session.execute(self.__select_documents(schema, column == document, decoders)).first()
+            if document_row is None:
+                return None
+            if shared or self.__caches:
+                document_row = dict(document_row.items())
+            if shared:
+                self.database._set_shared_row(collection, document, document_row, generation)
+        if self.__caches:
+            self.__documents[collection][document] = document_row
+        return document_row
+
+    def __select_documents(self, schema, condition=None, decoders=None):
+        """
+        Builds the query selecting the documents of a collection. Only the
+        columns of the fields known by the schema snapshot are selected.
+
+        :param schema: CollectionSchema of the collection
+
+        :param condition: SQLAlchemy condition selecting the documents (None to select all documents)
+
+        :param decoders: Decoders of the fields to select (see CollectionSchema.projection), None for all the fields => None by default
+
+        :return: The SQLAlchemy select query
+        """
+
+        if decoders is None:
+            decoders = schema.decoders
+        table = self.__collection_table(schema.collection)
+        select = sql.select([table.c[column] for field, column, converter in decoders])
+        if condition is not None:
+            select = select.where(condition)
+        return select
+
+    def __update_document_row(self, collection, document_row, column_values):
+        """
+        Updates columns of a document row in the database (and in the caches if they are used)
+
+        :param collection: Document collection (str, must be existing)
+
+        :param document_row: Row of the document (given by __get_document_row)
+
+        :param column_values: Dictionary of the new column values (key=column name, value=column value)
+        """
+
+        schema = self.get_schema(collection)
+        pk_column = schema.columns[schema.primary_key]
+        document_id = document_row[pk_column]
+        table = self.__collection_table(collection)
+        self.session.execute(table.update().where(table.c[pk_column] == document_id).values(column_values))
+        self.__touch_documents(collection, [document_id])
+        if self.__caches:
+            document_row.update(column_values)
+
+    def get_document(self, collection, document, fields=None):
         """
         Gives a Document instance given a collection and a document identifier
 
@@ -1256,12 +2290,18 @@ class DatabaseSession:
 
         :param document: Document name (str, must be existing)
 
+        :param fields: List of the fields to get (the primary key is always included), None for all the fields => None by default
+
         :return: The document row if the document exists, None otherwise
+
+        :raise ValueError: If a field does not exist
         """
 
-        document_row = self.__get_document_row(collection, document)
+        schema = self.get_schema(collection)
+        decoders = None if schema is None else schema.projection(fields)
+        document_row = self.__get_document_row(collection, document, decoders)
         if document_row is not None:
-            document = Document(self, collection, document_row)
+            document = Document(self, collection, document_row, decoders)
         else:
             document = None
         return document
@@ -1279,29 +2319,83 @@ class DatabaseSession:
         if collection_row is None:
             return []
         else:
-            documents = self.session.query(getattr(self.table_classes[self.name_to_valid_column_name(collection)],
-                                                   self.name_to_valid_column_name(collection_row.primary_key))).all()
-            documents_list = [getattr(document, self.name_to_valid_column_name(collection_row.primary_key)) for document
-                              in documents]
+            pk_column = self.__collection_table(collection).c[
+                self.name_to_valid_column_name(collection_row.primary_key)]
+            documents_list = [document[0] for document in self.session.execute(sql.select([pk_column]))]
             return documents_list
 
-    def get_documents(self, collection):
+    def get_documents(self, collection, fields=None, ids=None):
         """
         Gives the list of all document rows, given a collection
 
         :param collection: Documents collection (str, must be existing)
 
+        :param fields: List of the fields to get (the primary key is always included), None for all the fields => None by default
+
+        :param ids: List of the names of the documents to get, None for all the documents => None by default
+
+                    The documents are selected by chunks (IN operator), the list returned gives the documents
+                    in the order of ids, with None for the documents not existing
+
         :return: List of all document rows of the collection if it exists, None otherwise
+
+        :raise ValueError: If a field does not exist
         """
 
         collection_row = self.get_collection(collection)
         if collection_row is None:
             return []
         else:
-            documents = self.session.query(self.table_classes[self.name_to_valid_column_name(collection)]).all()
-            documents_list = [Document(self, collection, document) for document in documents]
+            schema = self.get_schema(collection)
+            decoders = schema.projection(fields)
+            if ids is not None:
+                return self.__get_documents_by_ids(collection, list(ids), decoders)
+            documents = self.session.execute(self.__select_documents(schema, decoders=decoders))
+            documents_list = [Document(self, collection, document, decoders) for document in documents]
             return documents_list
 
+    def __get_documents_by_ids(self, collection, documents, decoders):
+        """
+        Gives documents given their names, the documents not in the caches
+        are selected by chunks
+
+        :param collection: Documents collection (str, must be existing)
+
+        :param documents: List of documents names
+
+        :param decoders: Decoders of the fields to get (see CollectionSchema.projection)
+
+        :return: List of the Document instances in the order of documents, None for the documents not existing
+        """
+
+        rows = {}
+        missing = collections.OrderedDict.fromkeys(documents)
+        if self.__caches:
+            cached_documents = self.__documents[collection]
+            for document in documents:
+                document_row = cached_documents.get(document)
+                if document_row is not None:
+                    rows[document] = document_row
+                    missing.pop(document, None)
+            if not self.__lru_caches:
+                missing.clear()
+        if missing:
+            schema = self.get_schema(collection)
+            # The rows put in the caches have all the columns
+            decoders_to_select = None if self.__caches else decoders
+            pk_column_name = schema.columns[schema.primary_key]
+            pk_column = self.__collection_table(collection).c[pk_column_name]
+            for ids in self.__chunks(list(missing), self._max_in_parameters):
+                select = self.__select_documents(schema, pk_column.in_(ids), decoders_to_select)
+                for document_row in self.session.execute(select):
+                    document = document_row[pk_column_name]
+                    if self.__caches:
+                        document_row = dict(document_row.items())
+                        cached_documents[document] = document_row
+                    rows[document] = document_row
+        return [Document(self, collection, rows[document], decoders) if document in rows else None
+                for document in documents]
+
     def remove_document(self, collection, document):
         """
         Removes a document in the collection
@@ -1317,63 +2411,117 @@ class DatabaseSession:
         collection_row = self.get_collection(collection)
         if collection_row is None:
             raise ValueError("The collection {0} does not exist".format(collection))
-        document_row = self.get_document(collection, document)
-        if document_row is None:
+        if not self.__get_existing_documents_ids(collection, [document]):
             raise ValueError(
                 "The document with the name {0} does not exist in the collection {1}".format(document, collection))
-        primary_key = collection_row.primary_key
-
-        self.session.query(self.table_classes[self.name_to_valid_column_name(collection)]).filter(
-            getattr(self.table_classes[self.name_to_valid_column_name(collection)],
-                    self.name_to_valid_column_name(primary_key)) == document).delete()
-
-        # Removing document from list tables
-        if self.list_tables:
-            for table in self.table_classes:
-                if "list" in table:
-                    self.session.query(self.table_classes[table]).filter(
-                        self.table_classes[table].document_id == document).delete()
 
-        if self.__caches:
-            self.__documents[collection].pop(document, None)
+        self.__delete_documents(collection, [document])
 
         self.session.flush()
         self.__unsaved_modifications = True
 
-    def add_document(self, collection, document, create_missing_fields=True, flush=True):
+    def remove_documents(self, collection, documents):
         """
-        Adds a document to a collection
+        Removes several documents of a collection
 
-        :param collection: Document collection (str, must be existing)
-
-        :param document: Dictionary of document values (dict), or document primary_key (str)
-
-                            - The primary_key must not be existing
+        :param collection: Documents collection (str, must be existing)
 
-        :param create_missing_fields: Boolean to know if the missing fields must be created
+        :param documents: List of documents names (the documents not existing are ignored), or filter selecting the documents to remove (str, see filter_documents)
 
-            - If True, fields that are in the document but not in the collection are created if the type can be guessed from the value in the document
-              (possible for all valid values except None and []).
-            
-        :param flush: Bool to know if flush to do, put False in the middle of filling the table => True by default
+        :return: The number of documents removed
 
-        :raise ValueError: - If the collection does not exist
-                           - If the document already exists
-                           - If document is invalid (invalid name or no primary_key)
+        :raise ValueError: If the collection does not exist
         """
 
-        # Checks
         collection_row = self.get_collection(collection)
         if collection_row is None:
             raise ValueError("The collection {0} does not exist".format(collection))
-        primary_key = self.get_collection(collection).primary_key
-        if not isinstance(document, dict) and not isinstance(document, str):
-            raise ValueError(
-                "The document must be of type {0} or {1}, but document of type {2} given".format(dict, str, document))
-        if isinstance(document, dict) and primary_key not in document:
-            raise ValueError(
-                "The primary_key {0} of the collection {1} is missing from the document dictionary".format(primary_key,
-                                                                                                           collection))
+
+        schema = self.get_schema(collection)
+        if isinstance(documents, six.string_types):
+            sql_condition, python_filter = self.__split_filter_query(collection, documents)
+            if python_filter is None:
+                pk_column = self.__collection_table(collection).c[schema.columns[schema.primary_key]]
+                select = sql.select([pk_column])
+                if sql_condition is not None:
+                    select = select.where(sql_condition)
+                documents = [row[0] for row in self.session.execute(select)]
+            else:
+                documents = [document[schema.primary_key]
+                             for document in self.filter_documents(collection, documents, fields=[])]
+        else:
+            documents = list(documents)
+
+        count = self.__delete_documents(collection, documents)
+
+        self.session.flush()
+        if count:
+            self.__unsaved_modifications = True
+        return count
+
+    def __delete_documents(self, collection, documents):
+        """
+        Deletes documents from a collection table and from its list tables
+
+        :param collection: Documents collection (str, must be existing)
+
+        :param documents: List of documents names
+
+        :return: The number of rows deleted from the collection table
+        """
+
+        schema = self.get_schema(collection)
+        table = self.__collection_table(collection)
+        pk_column = table.c[schema.columns[schema.primary_key]]
+        list_tables = []
+        if self.list_tables:
+            list_tables = [self.metadata.tables[table_name] for table_name in schema.list_tables.values()
+                           if table_name in self.metadata.tables]
+        count = 0
+        for ids in self.__chunks(documents, self._max_in_parameters):
+            count += self.session.execute(table.delete(pk_column.in_(ids))).rowcount
+            for list_table in list_tables:
+                self.session.execute(list_table.delete(list_table.c.document_id.in_(ids)))
+            self.__touch_documents(collection, ids)
+            if self.__caches:
+                for document in ids:
+                    self.__documents[collection].pop(document, None)
+        return count
+
+    def add_document(self, collection, document, create_missing_fields=True, flush=True):
+        """
+        Adds a document to a collection
+
+        :param collection: Document collection (str, must be existing)
+
+        :param document: Dictionary of document values (dict), or document primary_key (str)
+
+                            - The primary_key must not be existing
+
+        :param create_missing_fields: Boolean to know if the missing fields must be created
+
+            - If True, fields that are in the document but not in the collection are created if the type can be guessed from the value in the document
+              (possible for all valid values except None and []).
+            
+        :param flush: Bool to know if flush to do, put False in the middle of filling the table => True by default
+
+        :raise ValueError: - If the collection does not exist
+                           - If the document already exists
+                           - If document is invalid (invalid name or no primary_key)
+        """
+
+        # Checks
+        collection_row = self.get_collection(collection)
+        if collection_row is None:
+            raise ValueError("The collection {0} does not exist".format(collection))
+        primary_key = self.get_collection(collection).primary_key
+        if not isinstance(document, dict) and not isinstance(document, str):
+            raise ValueError(
+                "The document must be of type {0} or {1}, but document of type {2} given".format(dict, str, document))
+        if isinstance(document, dict) and primary_key not in document:
+            raise ValueError(
+                "The primary_key {0} of the collection {1} is missing from the document dictionary".format(primary_key,
+                                                                                                           collection))
         if isinstance(document, dict):
             document_row = self.get_document(collection, document[primary_key])
         else:
@@ -1388,10 +2536,11 @@ class DatabaseSession:
         document_id = document[primary_key]
         column_values = {self.name_to_valid_column_name(primary_key): document_id}
         lists = []
+        schema = self.get_schema(collection)
         for k, v in document.items():
             column_name = self.name_to_valid_column_name(k)
-            field = self.get_field(collection, k)
-            if field is None:
+            field_type = schema.types.get(k)
+            if field_type is None:
                 if not create_missing_fields:
                     raise ValueError('Collection {0} has no field {1}'.format(collection, k))
                 try:
@@ -1399,7 +2548,7 @@ class DatabaseSession:
                 except KeyError:
                     raise ValueError('Collection {0} has no field {1} and it cannot be created from a value of type {2}'.format(collection, k, type(v)))
                 self.add_field(collection, k, field_type)
-            field_type = self.get_field(collection, k).type
+                schema = self.get_schema(collection)
             column_value = self.__python_to_column(field_type, v)
             column_values[column_name] = column_value
             if self.list_tables and isinstance(v, list):
@@ -1419,10 +2568,12 @@ class DatabaseSession:
                 if sql_params:
                     self.session.execute(sql, params=sql_params)
 
-        document_row = self.table_classes[self.name_to_valid_column_name(collection)](**column_values)
-        self.session.add(document_row)
+        self.session.execute(self.__collection_table(collection).insert(), params=column_values)
 
+        self.__touch_documents(collection, [document_id])
         if self.__caches:
+            document_row = dict((column, None) for column in schema.columns.values())
+            document_row.update(column_values)
             self.__documents[collection][document_id] = document_row
 
         if flush:
@@ -1430,6 +2581,183 @@ class DatabaseSession:
 
         self.__unsaved_modifications = True
 
+    def add_documents(self, collection, documents, batch_size=1000, create_missing_fields=True):
+        """
+        Adds many documents to a collection
+
+        The documents are consumed batch by batch, therefore documents can be
+        a generator and the memory used does not depend on the number of
+        documents. Each batch is checked and then written with one insert in
+        the collection table and one insert per list table.
+
+        :param collection: Document collection (str, must be existing)
+
+        :param documents: Iterable of documents, each document being a dictionary of document values (dict),
+                          or a document primary_key (str)
+
+                            - The primary_keys must not be existing
+
+        :param batch_size: Number of documents written at once (int) => 1000 by default
+
+        :param create_missing_fields: Boolean to know if the missing fields must be created
+
+            - If True, fields that are in the documents but not in the collection are created if the type can be
+              guessed from one of the values of the batch (possible for all valid values except None and []).
+
+        :return: The number of documents added
+
+        :raise ValueError: - If the collection does not exist
+                           - If the batch size is invalid
+                           - If a document already exists
+                           - If a document is invalid (invalid name, no primary_key or invalid value)
+        """
+
+        # Checks
+        collection_row = self.get_collection(collection)
+        if collection_row is None:
+            raise ValueError("The collection {0} does not exist".format(collection))
+        if isinstance(batch_size, bool) or not isinstance(batch_size, six.integer_types) or batch_size <= 0:
+            raise ValueError("The batch size must be a positive integer, but {0} given".format(batch_size))
+
+        # Documents added with add_document(..., flush=False) must be visible
+        # when checking the existing primary keys
+        self.session.flush()
+
+        count = 0
+        documents = iter(documents)
+        while True:
+            batch = list(itertools.islice(documents, batch_size))
+            if not batch:
+                break
+            self.__add_documents_batch(collection, batch, create_missing_fields)
+            count += len(batch)
+
+        if count:
+            self.__unsaved_modifications = True
+        return count
+
+    def __add_documents_batch(self, collection, batch, create_missing_fields):
+        """
+        Adds a batch of documents to a collection (see add_documents)
+
+        :param collection: Document collection (str, must be existing)
+
+        :param batch: List of documents
+
+        :param create_missing_fields: Boolean to know if the missing fields must be created
+        """
+
+        primary_key = self.get_collection(collection).primary_key
+
+        # Documents normalization and primary keys checks
+        documents = []
+        documents_ids = set()
+        for document in batch:
+            if isinstance(document, six.string_types):
+                document = {primary_key: document}
+            elif not isinstance(document, dict):
+                raise ValueError(
+                    "The document must be of type {0} or {1}, but document of type {2} given".format(dict, str,
+                                                                                                  type(document)))
+            elif primary_key not in document:
+                raise ValueError(
+                    "The primary_key {0} of the collection {1} is missing from the document dictionary".format(
+                        primary_key, collection))
+            if document[primary_key] in documents_ids:
+                raise ValueError(
+                    "A document with the name {0} already exists in the collection {1}".format(
+                        document[primary_key], collection))
+            documents_ids.add(document[primary_key])
+            documents.append(document)
+        existing_documents = self.__get_existing_documents_ids(collection, list(documents_ids))
+        if existing_documents:
+            raise ValueError(
+                "A document with the name {0} already exists in the collection {1}".format(
+                    existing_documents[0], collection))
+
+        # Missing fields creation, all at once
+        schema = self.get_schema(collection)
+        missing_fields = {}
+        for document in documents:
+            for k, v in document.items():
+                if k not in schema.types and missing_fields.get(k) is None:
+                    if not create_missing_fields:
+                        raise ValueError('Collection {0} has no field {1}'.format(collection, k))
+                    try:
+                        missing_fields[k] = self.__python_value_type(v)
+                    except KeyError:
+                        # The type cannot be guessed from this value, another
+                        # document of the batch may give it
+                        missing_fields.setdefault(k, None)
+        if missing_fields:
+            for k, field_type in missing_fields.items():
+                if field_type is None:
+                    raise ValueError(
+                        'Collection {0} has no field {1} and its type cannot be guessed from the documents values'.format(
+                            collection, k))
+            self.add_fields([[collection, k, field_type, None] for k, field_type in missing_fields.items()])
+            schema = self.get_schema(collection)
+
+        # Values checks and conversion
+        columns = set()
+        rows = []
+        lists = {}
+        for document in documents:
+            document_id = document[primary_key]
+            row = {}
+            for k, v in document.items():
+                field_type = schema.types[k]
+                if not self.__check_type_value(v, field_type):
+                    raise ValueError("The value {0} is invalid for the type {1}".format(v, field_type))
+                column_name = schema.columns[k]
+                row[column_name] = self.__python_to_column(field_type, v)
+                columns.add(column_name)
+                if self.list_tables and isinstance(v, list):
+                    sql_params = lists.setdefault(column_name, [])
+                    for index, item in enumerate(v):
+                        sql_params.append({'document_id': document_id, 'i': index,
+                                           'value': self.__python_to_column(field_type[5:], item)})
+            rows.append(row)
+
+        # All the rows of an executemany must have the same columns
+        for row in rows:
+            for column_name in columns:
+                row.setdefault(column_name, None)
+
+        self.session.execute(self.__collection_table(collection).insert(), params=rows)
+        for column_name, sql_params in lists.items():
+            if sql_params:
+                table = self.metadata.tables['list_%s_%s' % (schema.table_name, column_name)]
+                self.session.execute(table.insert(), params=sql_params)
+
+        self.__touch_documents(collection, (row[schema.columns[primary_key]] for row in rows))
+        if self.__caches:
+            all_columns = schema.columns.values()
+            for row in rows:
+                document_row = dict((column, None) for column in all_columns)
+                document_row.update(row)
+                self.__documents[collection][row[schema.columns[primary_key]]] = document_row
+
+    def __get_existing_documents_ids(self, collection, documents_ids):
+        """
+        Gives the documents identifiers that already exist in a collection
+
+        :param collection: Document collection (str, must be existing)
+
+        :param documents_ids: List of documents identifiers
+
+        :return: List of the identifiers of documents_ids that exist in the collection
+        """
+
+        schema = self.get_schema(collection)
+        if self.__caches and not self.__lru_caches:
+            return [document_id for document_id in documents_ids if document_id in self.__documents[collection]]
+        pk_column = self.__collection_table(collection).c[schema.columns[schema.primary_key]]
+        existing = []
+        for ids in self.__chunks(documents_ids, self._max_in_parameters):
+            existing.extend(row[0] for row in self.session.execute(sql.select([pk_column], pk_column.in_(ids))))
+        return existing
+
     """ MODIFICATIONS """
 
     def save_modifications(self):
@@ -1438,6 +2766,25 @@ class DatabaseSession:
         """
         self.session.commit()
         self.__unsaved_modifications = False
+        self._transaction_committed()
+
+    def _transaction_committed(self):
+        """
+        Called after the commit of the session, the schema modifications
+        are put in the shared metadata and the rows of the modified
+        documents are removed from the cache shared by the sessions
+        """
+
+        if self.__metadata is not None:
+            self.database._publish_schema(self.__metadata, self.__schema_versions)
+            self.__metadata = None
+            self.__schema_versions = {}
+        if self.__dirty_documents:
+            self.database._invalidate_shared_rows((collection, document)
+                                                  for collection, documents in self.__dirty_documents.items()
+                                                  for document in documents)
+        self.__dirty_documents = {}
+        self.__dirty_collections = set()
 
     def unsave_modifications(self):
         """
@@ -1446,10 +2793,16 @@ class DatabaseSession:
 
         self.session.rollback()
         self.__unsaved_modifications = False
-        self.metadata = MetaData()
-        self.metadata.reflect(self.database.engine)
-        self.__update_table_classes()
-        self.__fill_caches()
+        # The shared metadata does not contain the rolled back schema
+        # modifications
+        self.__metadata = None
+        self.__schema_versions = {}
+        self.__schemas.clear()
+        if self.__caches:
+            self.__rollback_caches()
+        else:
+            self.__dirty_documents = {}
+            self.__dirty_collections = set()
 
     def has_unsaved_modifications(self):
         """
@@ -1477,14 +2830,81 @@ class DatabaseSession:
         :param collection: Filter collection (str, must be existing)
         """
 
+        return self.__compile_filter(collection, filter, query_type)[0]
+
+    def __compile_filter(self, collection, filter, query_type=None):
+        """
+        Gives the query built from a filter string, and the class of
+        populse_db.filter that built it, from the cache of compiled filters
+
+        :param collection: Filter collection (str, must be existing)
+
+        :param filter: Filter string
+
+        :param query_type: Type of query to build (see __filter_query), None for the default query_type => None by default
+
+        :return: Tuple (query, class of the transformer that built the query)
+        """
+
         if query_type is None:
             query_type = self.query_type
-        filter_to_query_class = populse_db.filter._filter_to_query_classes[query_type]
-        tree = populse_db.filter.filter_parser().parse(filter)
-        query = filter_to_query_class(self, collection).transform(tree)
-        return query
+        # The compiled query depends on the fields of the collection, it
+        # becomes unreachable as soon as they are modified
+        key = (collection, filter, query_type, self.__collection_version(collection))
+        compiled = self.database._filter_cache.get(key, self)
+        if compiled is self:
+            filter_to_query_class = populse_db.filter._filter_to_query_classes[query_type]
+            tree = populse_db.filter.filter_parser().parse(filter)
+            transformer = filter_to_query_class(self, collection)
+            query = transformer.transform(tree)
+            compiled = (query, getattr(transformer, 'transformer_class', filter_to_query_class))
+            self.database._filter_cache.set(key, compiled)
+        return compiled
 
-    def filter_documents(self, collection, filter_query):
+    def shared_cache_info(self):
+        """
+        Gives the statistics of the cache of documents rows shared by the
+        sessions of the database (see the shared_cache_size parameter of Database)
+
+        :return: Dictionary with the number of hits and misses of the cache, its size and its max_size
+        """
+
+        return self.database._shared_rows.info()
+
+    def filter_cache_info(self):
+        """
+        Gives the statistics of the cache of compiled filters, this cache
+        is shared by all the sessions of the database
+
+        :return: Dictionary with the number of hits and misses of the cache, its size and its max_size
+        """
+
+        return self.database._filter_cache.info()
+
+    def __split_filter_query(self, collection, filter_query):
+        """
+        Splits a filter query into its SQL and Python parts
+
+        :param collection: Filter collection (str, must be existing)
+
+        :param filter_query: Filter query (str, or query built by __filter_query, or None to select all the documents)
+
+        :return: Tuple (SQLAlchemy condition or None, Python function taking a Document or None)
+        """
+
+        if isinstance(filter_query, six.string_types):
+            filter_query = self.__filter_query(collection, filter_query)
+        if filter_query is None:
+            return None, None
+        elif isinstance(filter_query, types.FunctionType):
+            return None, filter_query
+        elif isinstance(filter_query, tuple):
+            return filter_query
+        else:
+            return filter_query, None
+
+    def filter_documents(self, collection, filter_query, stream=False, fetch_size=1000, fields=None,
+                         order_by=None, limit=None, offset=0, after=None):
         """
         Iterates over the collection documents selected by filter_query
 
@@ -1500,35 +2920,728 @@ class DatabaseSession:
                                 - The operator must be in ('==', '!=', '<=', '>=', '<', '>', 'IN', 'ILIKE', 'LIKE')
                                 - The filter rows can be linked with ' AND ' or ' OR '
                                 - Example: "((({BandWidth} == "50000")) AND (({FileName} LIKE "%G1%")))"
+
+        :param stream: Bool to know if the rows must be fetched chunk by chunk instead of all at once
+                       (Put True for very large results, the memory used is bounded by fetch_size) => False by default
+
+                        - With PostgreSQL, a server-side cursor is used
+                        - With SQLite, the rows are fetched from the cursor chunk by chunk
+
+        :param fetch_size: Number of rows fetched at once in stream mode (int) => 1000 by default
+
+        :param fields: List of the fields of the documents (the primary key is always included), None for all the fields => None by default
+
+                        - If the filter is entirely converted into SQL, only the columns of these fields are selected
+                        - Otherwise, all the columns are selected, only the fields used by the Python part of the
+                          filter are converted for each row and the other fields for the selected documents
+
+        :param order_by: List of the fields sorting the documents, a field is given by its name (ascending order) or by a tuple (field name, 'asc' or 'desc'), None to not sort the documents => None by default
+
+                        - The NULL values are before the other values in ascending order
+                        - The documents are also sorted by primary key, so that their order is stable
+                        - The fields of json and list types cannot be used
+
+        :param limit: Maximum number of documents given (int), None for all the documents => None by default
+
+        :param offset: Number of documents skipped (int) => 0 by default
+
+        :param after: Document (or dictionary with the values of the order_by fields and of the primary key) after which the documents are given in the order of order_by, None to start from the first document => None by default
+
+                        - It is the last document of the previous page for a keyset pagination, which is
+                          stable and does not skip rows like offset does
+                        - Without order_by, the documents are sorted by primary key
+
+        The ordering, limit, offset and after are applied by the database. If
+        a part of the filter is evaluated in Python, the sorted rows are
+        filtered as they are fetched, until limit documents are found.
+
+        :raise ValueError: - If the collection does not exist
+                           - If the fetch size is invalid
+                           - If a field does not exist
+                           - If order_by, limit, offset or after is invalid
         """
 
         collection_row = self.get_collection(collection)
         if collection_row is None:
             raise ValueError("The collection {0} does not exist".format(collection))
+        if not isinstance(fetch_size, int) or fetch_size <= 0:
+            raise ValueError("The fetch size must be a positive integer, but {0} given".format(fetch_size))
+
+        if limit is not None and (not isinstance(limit, int) or isinstance(limit, bool) or limit < 0):
+            raise ValueError("The limit must be a positive integer or None, but {0} given".format(limit))
+        if not isinstance(offset, int) or isinstance(offset, bool) or offset < 0:
+            raise ValueError("The offset must be a positive integer, but {0} given".format(offset))
+
+        schema = self.get_schema(collection)
+        decoders = schema.projection(fields)
+        sql_condition, python_filter = self.__split_filter_query(collection, filter_query)
+        if python_filter is None:
+            select = self.__select_documents(schema, sql_condition, decoders)
+        else:
+            select = self.__select_documents(schema, sql_condition)
+            filter_fields = getattr(python_filter, 'fields', None)
+            filter_decoders = schema.decoders if filter_fields is None else schema.projection(filter_fields)
+        if order_by is not None or after is not None:
+            order = self.__order_by(schema, order_by)
+            if after is not None:
+                select = select.where(self.__after_condition(schema, order, after))
+            select = select.order_by(*self.__order_by_clauses(schema, order))
+        if python_filter is None:
+            if limit is not None:
+                select = select.limit(limit)
+            if offset:
+                select = select.offset(offset)
+        elif limit == 0:
+            return
+        if stream:
+            rows = self.__stream_rows(select, fetch_size)
+        else:
+            rows = self.session.execute(select)
+        # Number of documents to skip and to give when the Python part of the
+        # filter is applied
+        skip = offset
+        count = limit
+        try:
+            for row in rows:
+                if python_filter is None:
+                    yield Document(self, collection, row, decoders)
+                else:
+                    document = Document(self, collection, row, filter_decoders)
+                    if python_filter(document):
+                        if skip:
+                            skip -= 1
+                            continue
+                        if decoders is not filter_decoders:
+                            document = Document(self, collection, row, decoders)
+                        yield document
+                        if count is not None:
+                            count -= 1
+                            if count == 0:
+                                break
+        finally:
+            rows.close()
 
-        if isinstance(filter_query, six.string_types):
-            filter_query = self.__filter_query(collection, filter_query)
-        if filter_query is None:
-            select = self.metadata.tables[self.name_to_valid_column_name(collection)].select()
-            python_filter = None
-        elif isinstance(filter_query, types.FunctionType):
-            select = self.metadata.tables[self.name_to_valid_column_name(collection)].select()
-            python_filter = filter_query
-        elif isinstance(filter_query, tuple):
-            sql_condition, python_filter = filter_query
-            select = select = self.metadata.tables[self.name_to_valid_column_name(collection)].select(
-                sql_condition)
+    def __order_by(self, schema, order_by):
+        """
+        Checks the order_by parameter of filter_documents
+
+        :param schema: CollectionSchema of the collection
+
+        :param order_by: List of fields names or of (field name, 'asc' or 'desc'), or None
+
+        :return: List of (field, column name, descending), ending with the primary key
+
+        :raise ValueError: If a field does not exist or cannot be used to sort the documents
+        """
+
+        order = []
+        for item in order_by or []:
+            if isinstance(item, str):
+                field, direction = item, 'asc'
+            elif isinstance(item, (tuple, list)) and len(item) == 2:
+                field, direction = item
+            else:
+                raise ValueError("The order_by items must be field names or tuples (field name, direction), "
+                                 "but {0} given".format(item))
+            if direction not in ('asc', 'desc'):
+                raise ValueError("The order direction must be 'asc' or 'desc', but {0} given".format(direction))
+            field_type = schema.types.get(field)
+            if field_type is None:
+                raise ValueError("The field {0} does not exist in the collection {1}".format(field, schema.collection))
+            if field_type.startswith('list_') or field_type == FIELD_TYPE_JSON:
+                raise ValueError("The documents cannot be sorted by the field {0} of type {1}".format(
+                    field, field_type))
+            order.append((field, schema.columns[field], direction == 'desc'))
+        if schema.primary_key not in [field for field, column, descending in order]:
+            order.append((schema.primary_key, schema.columns[schema.primary_key], False))
+        return order
+
+    def __order_by_clauses(self, schema, order):
+        """
+        :param schema: CollectionSchema of the collection
+
+        :param order: List of (field, column name, descending) given by __order_by
+
+        :return: List of the ORDER BY clauses, the NULL values are before the other values in ascending order
+        """
+
+        table = self.__collection_table(schema.collection)
+        # The NULL values are the smallest ones by default with SQLite, but
+        # the greatest ones with PostgreSQL
+        nulls_greatest = self.database.engine.dialect.name == 'postgresql'
+        clauses = []
+        for field, column, descending in order:
+            if descending:
+                clause = table.c[column].desc()
+                if nulls_greatest:
+                    clause = clause.nullslast()
+            else:
+                clause = table.c[column].asc()
+                if nulls_greatest:
+                    clause = clause.nullsfirst()
+            clauses.append(clause)
+        return clauses
+
+    def __after_condition(self, schema, order, after):
+        """
+        Builds the condition selecting the documents after a document in
+        the order of order_by (keyset pagination)
+
+        :param schema: CollectionSchema of the collection
+
+        :param order: List of (field, column name, descending) given by __order_by
+
+        :param after: Document or dictionary with the values of the order fields
+
+        :return: The SQLAlchemy condition
+
+        :raise ValueError: If a value of an order field is missing
+        """
+
+        table = self.__collection_table(schema.collection)
+        conditions = []
+        equalities = []
+        for field, column, descending in order:
+            try:
+                value = after[field]
+            except (KeyError, TypeError):
+                raise ValueError("The value of the field {0} is missing in the after document {1}".format(
+                    field, after))
+            column = table.c[column]
+            # NULL is smaller than all the values
+            if value is None:
+                next_values = None if descending else column.isnot(None)
+                equality = column.is_(None)
+            else:
+                next_values = (column < value) | column.is_(None) if descending else column > value
+                equality = column == value
+            if next_values is not None:
+                conditions.append(sql.and_(*(equalities + [next_values])))
+            equalities.append(equality)
+        if not conditions:
+            return sql.false()
+        return sql.or_(*conditions)
+
+    def explain_filter(self, collection, filter_query):
+        """
+        Describes how a filter is applied to select the documents, to tune
+        the filters and the indexes
+
+        :param collection: Filter collection (str, must be existing)
+
+        :param filter_query: Filter query (str, see filter_documents)
+
+        :return: Dictionary with the following items:
+
+                    - query_type: Query type of the session ('sql', 'python', 'mixed' or 'guess')
+                    - query_class: Name of the class of populse_db.filter that built the query,
+                      with the 'guess' query type it is FilterToPythonQuery if the filter could not be
+                      converted into a mixed query
+                    - sql_conditions: List of the sub-filters (str) evaluated by the database
+                    - python_conditions: List of the sub-filters (str) evaluated in Python on each
+                      document selected by the database
+                      (a sub-filter partly converted into SQL, e.g. combining SQL and Python
+                      conditions with OR, is in both lists)
+                    - sql: SQL query selecting the documents (str)
+                    - plan: List of the lines (str) of the query plan given by the database
+                      (EXPLAIN QUERY PLAN with SQLite, EXPLAIN with PostgreSQL)
+
+        :raise ValueError: If the collection does not exist
+        """
+
+        collection_row = self.get_collection(collection)
+        if collection_row is None:
+            raise ValueError("The collection {0} does not exist".format(collection))
+
+        # The query is the one applied by filter_documents
+        query, query_class = self.__compile_filter(collection, filter_query)
+        sql_condition, python_filter = self.__split_filter_query(collection, query)
+
+        # The sub-filters combined with AND are evaluated either by the
+        # database or in Python
+        tree = populse_db.filter.filter_parser().parse(filter_query)
+        sql_conditions = []
+        python_conditions = []
+        conjunctions = populse_db.filter.filter_conjunctions(tree)
+        for conjunction in conjunctions:
+            if python_filter is None:
+                in_sql, in_python = True, False
+            elif sql_condition is None:
+                in_sql, in_python = False, True
+            else:
+                query = query_class(self, collection).transform(conjunction)
+                in_sql = not isinstance(query, types.FunctionType)
+                in_python = not in_sql or isinstance(query, tuple)
+            conjunction = populse_db.filter.filter_to_string(conjunction)
+            if in_sql:
+                sql_conditions.append(conjunction)
+            if in_python:
+                python_conditions.append(conjunction)
+
+        select = self.__select_documents(self.get_schema(collection), sql_condition)
+        dialect = self.database.engine.dialect
+        try:
+            sql_query = str(select.compile(dialect=dialect, compile_kwargs={'literal_binds': True}))
+        except NotImplementedError:
+            # No literal rendering for some types of values
+            sql_query = str(select.compile(dialect=dialect))
+        # The rows are read from the DBAPI cursor, they do not have the
+        # columns of the explained query
+        result = self.session.execute(Explain(select))
+        try:
+            plan = [str(row[-1]) for row in result.cursor.fetchall()]
+        finally:
+            result.close()
+
+        return {
+            'query_type': self.query_type,
+            'query_class': query_class.__name__,
+            'sql_conditions': sql_conditions,
+            'python_conditions': python_conditions,
+            'sql': sql_query,
+            'plan': plan,
+        }
+
+    def __stream_rows(self, select, fetch_size):
+        """
+        Executes a query and iterates over its rows, fetching them chunk by chunk
+
+        :param select: SQLAlchemy select query
+
+        :param fetch_size: Number of rows fetched at once (int)
+
+        :return: Generator of the rows
+        """
+
+        # stream_results makes the drivers that buffer the whole result
+        # client side (e.g. psycopg2) use a server-side cursor
+        result = self.session.execute(select.execution_options(stream_results=True))
+        try:
+            while True:
+                rows = result.fetchmany(fetch_size)
+                if not rows:
+                    break
+                for row in rows:
+                    yield row
+        finally:
+            result.close()
+
+    def filter_to_columns(self, collection, filter_query, fields, as_dataframe=False):
+        """
+        Gives the values of some fields of the documents selected by
+        filter_query, as one NumPy array per field
+
+        When the filter is entirely converted into SQL, only the columns of
+        the requested fields are selected and no Document is built.
+
+        The arrays are typed according to the fields types:
+            - int64, float64 and bool for the integer, float and boolean fields
+            - datetime64[D] and datetime64[us] for the date and datetime fields
+            - object arrays for the other fields (string, time, json and lists), a NULL value is None
+
+        The numerical and temporal arrays are masked arrays if some values are NULL.
+
+        :param collection: Filter collection (str, must be existing)
+
+        :param filter_query: Filter query (str, see filter_documents), None to select all the documents
+
+        :param fields: List of fields names (str, must be existing)
+
+        :param as_dataframe: Bool to know if a pandas DataFrame must be returned instead of a dictionary => False by default
+
+        :return: OrderedDict giving the array of each field (in the order of fields), or pandas DataFrame with a column per field
+
+        :raise ValueError: - If the collection does not exist
+                           - If a field does not exist
+
+        :raise ImportError: If NumPy (or pandas if as_dataframe is True) is not installed
+        """
+
+        import numpy
+        if as_dataframe:
+            import pandas
+
+        collection_row = self.get_collection(collection)
+        if collection_row is None:
+            raise ValueError("The collection {0} does not exist".format(collection))
+        schema = self.get_schema(collection)
+        for field in fields:
+            if field not in schema.types:
+                raise ValueError("The field {0} does not exist in the collection {1}".format(field, collection))
+
+        sql_condition, python_filter = self.__split_filter_query(collection, filter_query)
+        if python_filter is None:
+            table = self.__collection_table(collection)
+            select = sql.select([table.c[schema.columns[field]] for field in fields])
+            if sql_condition is not None:
+                select = select.where(sql_condition)
+            rows = self.session.execute(select).fetchall()
+            values = [[row[i] for row in rows] for i in range(len(fields))]
+            for i, field in enumerate(fields):
+                converter = schema.converters[field]
+                if converter is not None:
+                    values[i] = [None if value is None else converter(value) for value in values[i]]
+        else:
+            documents = self.filter_documents(collection, filter_query, fields=fields)
+            values = [[] for field in fields]
+            for document in documents:
+                for i, field in enumerate(fields):
+                    values[i].append(document[field])
+
+        columns = collections.OrderedDict()
+        for field, field_values in zip(fields, values):
+            columns[field] = self.__values_to_array(numpy, schema.types[field], field_values)
+        if as_dataframe:
+            return pandas.DataFrame(columns, columns=fields)
+        return columns
+
+    # NumPy types of the field values, and values replacing the NULL values
+    # in the masked arrays (the other fields are stored in object arrays)
+    _field_type_to_dtype = {
+        FIELD_TYPE_INTEGER: ('int64', 0),
+        FIELD_TYPE_FLOAT: ('float64', 0.0),
+        FIELD_TYPE_BOOLEAN: ('bool', False),
+        FIELD_TYPE_DATE: ('datetime64[D]', None),
+        FIELD_TYPE_DATETIME: ('datetime64[us]', None),
+    }
+
+    @staticmethod
+    def __values_to_array(numpy, field_type, values):
+        """
+        Converts the values of a field into a NumPy array
+
+        :param numpy: The numpy module
+
+        :param field_type: Field type
+
+        :param values: List of the values
+
+        :return: The NumPy array (masked if it is typed and if values contains None)
+        """
+
+        dtype = DatabaseSession._field_type_to_dtype.get(field_type)
+        if dtype is None:
+            array = numpy.empty(len(values), dtype=object)
+            array[:] = values
+            return array
+        dtype, fill_value = dtype
+        mask = [value is None for value in values]
+        if any(mask):
+            values = [fill_value if value is None else value for value in values]
+            return numpy.ma.masked_array(numpy.array(values, dtype=dtype), mask=mask)
+        return numpy.array(values, dtype=dtype)
+
+    """ AGGREGATIONS """
+
+    # Aggregation functions of the metrics of aggregate(), with the types
+    # of the fields they can be applied to (None for all the types)
+    _aggregation_functions = {
+        'count': None,
+        'min': (FIELD_TYPE_STRING, FIELD_TYPE_INTEGER, FIELD_TYPE_FLOAT, FIELD_TYPE_DATE, FIELD_TYPE_DATETIME,
+                FIELD_TYPE_TIME),
+        'max': (FIELD_TYPE_STRING, FIELD_TYPE_INTEGER, FIELD_TYPE_FLOAT, FIELD_TYPE_DATE, FIELD_TYPE_DATETIME,
+                FIELD_TYPE_TIME),
+        'sum': (FIELD_TYPE_INTEGER, FIELD_TYPE_FLOAT),
+        'avg': (FIELD_TYPE_INTEGER, FIELD_TYPE_FLOAT),
+    }
+
+    def count_documents(self, collection, filter=None):
+        """
+        Counts the documents selected by a filter
+
+        The documents are counted by the database (SELECT COUNT), unless a
+        part of the filter must be evaluated in Python.
+
+        :param collection: Documents collection (str, must be existing)
+
+        :param filter: Filter query (str, see filter_documents), None to count all the documents => None by default
+
+        :return: The number of documents (int)
+
+        :raise ValueError: If the collection does not exist
+        """
+
+        if self.get_collection(collection) is None:
+            raise ValueError("The collection {0} does not exist".format(collection))
+        sql_condition, python_filter = self.__split_filter_query(collection, filter)
+        if python_filter is not None:
+            return sum(1 for document in self.filter_documents(collection, filter, stream=True))
+        select = sql.select([sql.func.count()]).select_from(self.__collection_table(collection))
+        if sql_condition is not None:
+            select = select.where(sql_condition)
+        return self.session.execute(select).scalar()
+
+    def distinct_values(self, collection, field, filter=None):
+        """
+        Gives the distinct values of a field in the documents selected by a filter
+
+        For a list field, the distinct items of the lists are given (they
+        are selected from the list table of the field if the database uses
+        list tables). The NULL values are ignored.
+
+        :param collection: Documents collection (str, must be existing)
+
+        :param field: Field name (str, must be existing, must not be of json or list_json type)
+
+        :param filter: Filter query (str, see filter_documents), None to select all the documents => None by default
+
+        :return: The sorted list of the distinct values
+
+        :raise ValueError: - If the collection does not exist
+                           - If the field does not exist or is of json or list_json type
+        """
+
+        schema = self.__aggregation_schema(collection, [field])
+        field_type = schema.types[field]
+        sql_condition, python_filter = self.__split_filter_query(collection, filter)
+        if python_filter is not None or (field_type.startswith('list_') and not self.list_tables):
+            values = set()
+            for document in self.filter_documents(collection, filter, stream=True, fields=[field]):
+                value = document[field]
+                if value is None:
+                    continue
+                if field_type.startswith('list_'):
+                    values.update(item for item in value if item is not None)
+                else:
+                    values.add(value)
+            return sorted(values)
+
+        table = self.__collection_table(collection)
+        if field_type.startswith('list_'):
+            list_table = self.metadata.tables[schema.list_tables[field]]
+            pk_column = table.c[schema.columns[schema.primary_key]]
+            column = list_table.c.value
+            select = sql.select([column]).select_from(list_table.join(table, list_table.c.document_id == pk_column))
+            item_type = field_type[5:]
         else:
-            select = self.metadata.tables[self.name_to_valid_column_name(collection)].select(
-                filter_query)
-            python_filter = None
+            column = table.c[schema.columns[field]]
+            select = sql.select([column])
+            item_type = field_type
+        select = select.where(column.isnot(None)).distinct().order_by(column)
+        if sql_condition is not None:
+            select = select.where(sql_condition)
+        return [self.__column_to_python(item_type, row[0]) for row in self.session.execute(select)]
+
+    def aggregate(self, collection, group_by=None, metrics=None, filter=None):
+        """
+        Computes metrics on groups of the documents selected by a filter
+
+        The metrics are computed by the database (SELECT ... GROUP BY),
+        unless a part of the filter must be evaluated in Python or a list
+        field is used to group the documents without list tables. In these
+        cases the documents are streamed and reduced in Python.
+
+        :param collection: Documents collection (str, must be existing)
+
+        :param group_by: List of the fields defining the groups (str, must be existing, must not be of json or list_json type), None to compute the metrics on all the documents => None by default
+
+                            - The documents are grouped by the distinct values of these fields
+                            - For a list field, a document belongs to the group of each item of its list
+                              (the documents whose list is NULL or empty are not in any group)
+
+        :param metrics: Dictionary of the metrics (key=metric name, value=(function, field)) => {'count': ('count', None)} by default
+
+                            - 'count': Number of documents of the group if the field is None, number of
+                              documents with a value for the field otherwise
+                            - 'min', 'max': Minimum and maximum values of a string, int, float, date, datetime
+                              or time field
+                            - 'sum', 'avg': Sum and average of an int or float field
+
+        :param filter: Filter query (str, see filter_documents), None to select all the documents => None by default
+
+        :return: List of dictionaries with the values of the group_by fields and of the metrics, sorted by group (NULL values first)
+
+        :raise ValueError: - If the collection does not exist
+                           - If a field does not exist or has a type that is not supported
+                           - If a metric is invalid
+        """
+
+        if group_by is None:
+            group_by = []
+        if metrics is None:
+            metrics = {'count': ('count', None)}
+        schema = self.__aggregation_schema(collection, group_by)
+        if not isinstance(metrics, dict):
+            raise ValueError(
+                "The metrics must be of type {0}, but metrics of type {1} given".format(dict, type(metrics)))
+        for name, metric in metrics.items():
+            if not isinstance(metric, (tuple, list)) or len(metric) != 2:
+                raise ValueError("The metric {0} must be a tuple (function, field), but {1} given".format(name, metric))
+            function, field = metric
+            if function not in self._aggregation_functions:
+                raise ValueError("The function of the metric {0} must be in {1}, but {2} given".format(
+                    name, sorted(self._aggregation_functions), function))
+            if field is None and function == 'count':
+                continue
+            if field not in schema.types:
+                raise ValueError("The field {0} does not exist in the collection {1}".format(field, collection))
+            field_types = self._aggregation_functions[function]
+            if field_types is not None and schema.types[field] not in field_types:
+                raise ValueError("The function {0} cannot be applied to the field {1} of type {2}".format(
+                    function, field, schema.types[field]))
+
+        sql_condition, python_filter = self.__split_filter_query(collection, filter)
+        list_group_by = [field for field in group_by if schema.types[field].startswith('list_')]
+        if python_filter is not None or (list_group_by and not self.list_tables):
+            results = self.__aggregate_documents(collection, schema, group_by, metrics, filter)
+        else:
+            results = self.__aggregate_rows(collection, schema, group_by, metrics, sql_condition)
+        results.sort(key=lambda result: tuple((result[field] is not None, result[field]) for field in group_by))
+        return results
+
+    def __aggregation_schema(self, collection, fields):
+        """
+        Checks the fields used to group the documents
+
+        :param collection: Documents collection (str)
+
+        :param fields: List of fields names
+
+        :return: The schema of the collection
+
+        :raise ValueError: - If the collection does not exist
+                           - If a field does not exist or is of json or list_json type
+        """
+
+        if self.get_collection(collection) is None:
+            raise ValueError("The collection {0} does not exist".format(collection))
+        schema = self.get_schema(collection)
+        for field in fields:
+            field_type = schema.types.get(field)
+            if field_type is None:
+                raise ValueError("The field {0} does not exist in the collection {1}".format(field, collection))
+            if field_type in (FIELD_TYPE_JSON, FIELD_TYPE_LIST_JSON):
+                raise ValueError("The values of the field {0} of type {1} cannot be grouped".format(field, field_type))
+        return schema
+
+    def __aggregate_rows(self, collection, schema, group_by, metrics, sql_condition):
+        """
+        Computes the metrics of aggregate() with a SELECT ... GROUP BY query,
+        the list fields of group_by are joined with the distinct items of
+        their list tables
+        """
+
+        table = self.__collection_table(collection)
+        pk_column = table.c[schema.columns[schema.primary_key]]
+        from_clause = table
+        group_columns = []
+        for field in group_by:
+            if schema.types[field].startswith('list_'):
+                list_table = self.metadata.tables[schema.list_tables[field]]
+                items = sql.select([list_table.c.document_id, list_table.c.value]).distinct().alias()
+                from_clause = from_clause.join(items, items.c.document_id == pk_column)
+                group_columns.append(items.c.value)
+            else:
+                group_columns.append(table.c[schema.columns[field]])
+
+        metric_columns = []
+        for name, (function, field) in metrics.items():
+            if field is None:
+                column = sql.func.count()
+            else:
+                value_column = table.c[schema.columns[field]]
+                if function == 'avg':
+                    column = sql.func.avg(value_column, type_=Float)
+                else:
+                    column = getattr(sql.func, function)(value_column)
+            metric_columns.append((name, column))
+
+        select = sql.select(group_columns + [column for name, column in metric_columns]).select_from(from_clause)
+        if group_columns:
+            select = select.group_by(*group_columns)
+        if sql_condition is not None:
+            select = select.where(sql_condition)
+
+        results = []
         for row in self.session.execute(select):
-            row = Document(self, collection, row)
-            if python_filter is None or python_filter(row):
-                yield row
+            result = {}
+            for i, field in enumerate(group_by):
+                field_type = schema.types[field]
+                if field_type.startswith('list_'):
+                    field_type = field_type[5:]
+                result[field] = self.__column_to_python(field_type, row[i])
+            for i, (name, column) in enumerate(metric_columns):
+                result[name] = row[len(group_by) + i]
+            results.append(result)
+        return results
+
+    def __aggregate_documents(self, collection, schema, group_by, metrics, filter):
+        """
+        Computes the metrics of aggregate() in Python, on the stream of the
+        documents selected by the filter
+        """
+
+        fields = set(group_by)
+        fields.update(field for function, field in metrics.values() if field is not None)
+        groups = collections.OrderedDict()
+        for document in self.filter_documents(collection, filter, stream=True, fields=list(fields)):
+            keys = [[]]
+            for field in group_by:
+                value = document[field]
+                if schema.types[field].startswith('list_'):
+                    items = sorted(set(value)) if value else []
+                    keys = [key + [item] for key in keys for item in items]
+                else:
+                    keys = [key + [value] for key in keys]
+            for key in keys:
+                group = groups.get(tuple(key))
+                if group is None:
+                    group = groups[tuple(key)] = dict((name, [0, None]) for name in metrics)
+                for name, (function, field) in metrics.items():
+                    state = group[name]
+                    if field is None:
+                        state[0] += 1
+                        continue
+                    value = document[field]
+                    if value is None:
+                        continue
+                    state[0] += 1
+                    if state[1] is None:
+                        state[1] = value
+                    elif function == 'min':
+                        state[1] = min(state[1], value)
+                    elif function == 'max':
+                        state[1] = max(state[1], value)
+                    elif function in ('sum', 'avg'):
+                        state[1] += value
+
+        results = []
+        if not groups and not group_by:
+            groups[()] = dict((name, [0, None]) for name in metrics)
+        for key, group in groups.items():
+            result = dict(zip(group_by, key))
+            for name, (function, field) in metrics.items():
+                count, value = group[name]
+                if function == 'count':
+                    result[name] = count
+                elif function == 'avg':
+                    result[name] = None if count == 0 else float(value) / count
+                else:
+                    result[name] = value
+            results.append(result)
+        return results
 
     """ UTILS """
 
+    # Maximum number of values given to an IN operator in one query, below
+    # the number of bound parameters allowed by SQLite and PostgreSQL
+    _max_in_parameters = 500
+
+    @staticmethod
+    def __chunks(values, size):
+        """
+        Splits a list into consecutive chunks
+
+        :param values: List to split
+
+        :param size: Maximum size of a chunk
+
+        :return: Generator of the chunks
+        """
+
+        for i in range(0, len(values), size):
+            yield values[i:i + size]
+
     _python_type_to_tag_type = {
         type(None): None,
         type(''): FIELD_TYPE_STRING,
@@ -1615,27 +3728,25 @@ class DatabaseSession:
             return True
         return False
 
-    @staticmethod
-    def __python_to_column(column_type, value):
+    def __python_to_column(self, column_type, value):
         """
         Converts a python value into a suitable value to put in a
         database column.
         """
         if isinstance(value, list):
-            return DatabaseSession.__list_to_column(column_type, value)
+            return self.__list_codec.encode(column_type, value)
         elif isinstance(value, dict):
             return json.dumps(value)
         else:
             return value
 
-    @staticmethod
-    def __column_to_python(column_type, value):
+    def __column_to_python(self, column_type, value):
         """
         Converts a value of a database column into the corresponding
         Python value.
         """
         if column_type.startswith('list_'):
-            return DatabaseSession.__column_to_list(column_type, value)
+            return self.__list_codec.decode(column_type, value)
         elif column_type == FIELD_TYPE_JSON:
             if value is None:
                 return None
@@ -1643,32 +3754,136 @@ class DatabaseSession:
         else:
             return value
 
-    @staticmethod
-    def __list_to_column(column_type, value):
+
+class Explain(Executable, ClauseElement):
+    """
+    SQL statement giving the query plan of a select query, it is
+    EXPLAIN QUERY PLAN with SQLite and EXPLAIN with the other databases
+    """
+
+    def __init__(self, statement):
         """
-        Converts a python list value into a suitable value to put in a
-        database column.
+        :param statement: SQLAlchemy select query
         """
-        converter = DatabaseSession._list_item_to_string.get(column_type)
-        if converter is None:
-            list_value = value
-        else:
-            list_value = [converter(i) for i in value]
-        return repr(list_value)
+
+        self.statement = statement
+
+
+@compiles(Explain)
+def _compile_explain(element, compiler, **kwargs):
+    if compiler.dialect.name == 'sqlite':
+        prefix = 'EXPLAIN QUERY PLAN '
+    else:
+        prefix = 'EXPLAIN '
+    return prefix + compiler.process(element.statement, **kwargs)
+
+
+class CollectionSchema(object):
+    """
+    Snapshot of the fields of a collection, built once by
+    DatabaseSession.get_schema() and shared by all the Document built
+    from the rows of the collection.
+
+    attributes:
+        - collection: Collection name
+        - primary_key: Primary key field of the collection
+        - table_name: Name of the collection table
+        - version: Schema version of the collection when the snapshot was built (see Database.collection_version)
+        - fields: Tuple of the field names
+        - columns: Dictionary giving the column name of each field
+        - types: Dictionary giving the type of each field
+        - converters: Dictionary giving the function converting a column
+          value into a Python value for each field (None if the column value
+          can be used as is)
+        - decoders: Tuple of (field, column, converter) used to build the
+          Document instances
+        - list_tables: Dictionary giving the name of the list table of each
+          list field (these tables exist only if the database uses list tables)
+
+    methods:
+        - column_converter: Gives the function converting a column value into a Python value
+        - projection: Gives the decoders of a subset of the fields
+    """
+
+    __slots__ = ('collection', 'primary_key', 'table_name', 'version', 'fields',
+                 'columns', 'types', 'converters', 'decoders', 'list_tables', '__projections')
+
+    def __init__(self, collection, primary_key, fields, name_to_column, version, list_codec):
+        """
+        Builds the schema snapshot
+
+        :param collection: Collection name (str)
+
+        :param primary_key: Primary key of the collection (str)
+
+        :param fields: List of (field name, field type)
+
+        :param name_to_column: Function giving the column name of a field name
+
+        :param version: Schema version (int)
+
+        :param list_codec: ListCodec instance decoding the list values
+        """
+
+        self.collection = collection
+        self.primary_key = primary_key
+        self.table_name = name_to_column(collection)
+        self.version = version
+        self.fields = tuple(field for field, field_type in fields)
+        self.columns = dict((field, name_to_column(field)) for field, field_type in fields)
+        self.types = dict(fields)
+        self.converters = dict((field, self.column_converter(field_type, list_codec))
+                               for field, field_type in fields)
+        self.decoders = tuple((field, self.columns[field], self.converters[field]) for field in self.fields)
+        self.list_tables = dict((field, 'list_%s_%s' % (self.table_name, self.columns[field]))
+                                for field, field_type in fields if field_type.startswith('list_'))
+        self.__projections = {}
 
     @staticmethod
-    def __column_to_list(column_type, value):
+    def column_converter(field_type, list_codec):
         """
-        Converts a value of a database column into the corresponding
-        Python list value.
+        Gives the function converting a non null column value into a Python value
+
+        :param field_type: Field type
+
+        :param list_codec: ListCodec instance decoding the list values
+
+        :return: The conversion function, or None if no conversion is needed
         """
-        if value is None:
-            return None
-        list_value = ast.literal_eval(value)
-        converter = DatabaseSession._string_to_list_item.get(column_type)
-        if converter is None:
-            return list_value
-        return [converter(i) for i in list_value]
+
+        if field_type.startswith('list_'):
+            return lambda value, decode=list_codec.decode: decode(field_type, value)
+        elif field_type == FIELD_TYPE_JSON:
+            return json.loads
+        return None
+
+    def projection(self, fields):
+        """
+        Gives the decoders of a subset of the fields, the primary key is
+        always included
+
+        :param fields: List of fields names (str, must be existing), None for all the fields
+
+        :return: Tuple of (field, column, converter), in the order of the schema fields
+
+        :raise ValueError: If a field does not exist
+        """
+
+        if fields is None:
+            return self.decoders
+        key = tuple(fields)
+        decoders = self.__projections.get(key)
+        if decoders is None:
+            for field in fields:
+                if field not in self.columns:
+                    raise ValueError("The field {0} does not exist in the collection {1}".format(field,
+                                                                                                self.collection))
+            selected = set(fields)
+            selected.add(self.primary_key)
+            decoders = tuple(decoder for decoder in self.decoders if decoder[0] in selected)
+            self.__projections[key] = decoders
+        return decoders
+
 
 class Undefined:
     pass
@@ -1678,15 +3893,17 @@ class Document(dict):
     A Document is a Python dictionary containing a document field values.
     It is build from the result of an SQL query and allow to access to the
     fields via attribute syntax (e.g. doc.toto == doc['toto']).
+    Only the fields given by decoders (see CollectionSchema.projection)
+    are converted, all the fields by default.
     '''
 
-    def __init__(self, database_session, collection, row):
-        for field in database_session.get_fields_names(collection):
-            column = database_session.name_to_valid_column_name(field)
-            db_value = getattr(row, column)
-            value = database_session._DatabaseSession__column_to_python(
-                database_session.get_field(collection,field).type,
-                db_value)
+    def __init__(self, database_session, collection, row, decoders=None):
+        if decoders is None:
+            decoders = database_session.get_schema(collection).decoders
+        for field, column, converter in decoders:
+            value = row[column]
+            if converter is not None and value is not None:
+                value = converter(value)
             self[field] = value
 
     def __getattr__(self, name):
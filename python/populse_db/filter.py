@@ -8,62 +8,57 @@
 
 import ast
 import datetime
-import operator
-import types
+import json
+import math
+import os
+import re
 
 import dateutil.parser
 import six
 import sqlalchemy
 import sqlalchemy.sql.operators as sql_operators
-from lark import Lark, Transformer
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.ext.automap import AutomapBase
 from sqlalchemy.sql.elements import BinaryExpression
 
 import populse_db
-from populse_db.database import DatabaseSession
-
-# The grammar (in Lark format) used to parse filter strings
-filter_grammar = '''
+from populse_db.filter_standalone import Lark_StandAlone, Transformer, Tree, VisitError
+
+# The grammar (in Lark format) used to parse filter strings.
+# It is LALR(1): the boolean operators are combined from left to right,
+# and the keywords are terminals with a higher priority than the field
+# names. The lexer only looks for the terminals expected by the parser,
+# so a keyword is a valid field name where it cannot be an operator or
+# a literal. A field named all or not must be quoted ({not}) to begin a
+# condition, and null, true or false must always be quoted.
+# The parser is not built from the grammar at runtime, it is loaded from
+# the module populse_db.filter_standalone that must be regenerated with
+# generate_standalone_parser() after each modification of the grammar.
+filter_grammar = r'''
 ?start : filter
 
-?filter : "ALL"i                         -> all
-        | conditions
-        | negation
-        | "(" filter ")"
-        | filter BOOLEAN_OPERATOR filter -> conditions
-
-?conditions : condition (BOOLEAN_OPERATOR condition)*
-
-                   
-negation : "NOT"i condition
-         | "NOT"i "(" filter ")"
+?filter : atom
+        | filter BOOLEAN_OPERATOR atom -> conditions
 
-BOOLEAN_OPERATOR : "AND"i
-                 | "OR"i
+?atom : _ALL                      -> all
+      | condition
+      | negation
+      | "(" filter ")"
 
-CONDITION_OPERATOR : "=="i
-                   | "!="i
-                   | "<="i
-                   | ">="i
-                   | ">"i
-                   | "<"i
-                   | "IN"i
-                   | "ILIKE"i
-                   | "LIKE"i
+negation : _NOT condition
+         | _NOT "(" filter ")"
 
 condition : operand CONDITION_OPERATOR operand
 
 ?operand : literal
          | field_name
 
-field_name.1 : FIELD_NAME
-             | quoted_field_name
+field_name : FIELD_NAME
+           | quoted_field_name
 
-quoted_field_name.1 : QUOTED_FIELD_NAME
+quoted_field_name : QUOTED_FIELD_NAME
 
-
-         
-?literal.2 : KEYWORD_LITERAL -> keyword_literal
+?literal : KEYWORD_LITERAL -> keyword_literal
          | ESCAPED_STRING   -> string
          | SIGNED_NUMBER    -> number
          | DATE             -> date
@@ -71,22 +66,24 @@ quoted_field_name.1 : QUOTED_FIELD_NAME
          | DATETIME         -> datetime
          | list
 
+list : "[" [literal ("," literal)*] "]"
+
+_ALL.2 : /all\b/i
+_NOT.2 : /not\b/i
+BOOLEAN_OPERATOR.2 : /(and|or)\b/i
+CONDITION_OPERATOR.2 : /(==|!=|<=|>=|>|<|(in|ilike|like)\b)/i
+KEYWORD_LITERAL.2 : /(null|true|false)\b/i
 
-DATE : INT "-" INT "-" INT
-TIME : INT ":" INT (":" INT ("." INT)?)?
-DATETIME : DATE "T" TIME
+DATETIME.4 : DATE "T" TIME
+DATE.3 : INT "-" INT "-" INT
+TIME.3 : INT ":" INT (":" INT ("." INT)?)?
 
-KEYWORD_LITERAL.2 : "NULL"i
-                  | "TRUE"i
-                  | "FALSE"i
-                  
-FIELD_NAME.1 : ("_"|LETTER) ("_"|LETTER|DIGIT)*
-QUOTED_FIELD_NAME.1 : "{" /[^}]/* "}"
+FIELD_NAME : ("_"|LETTER) ("_"|LETTER|DIGIT)*
+QUOTED_FIELD_NAME : "{" /[^}]/* "}"
 
-list : "[" [literal ("," literal)*] "]"
+ESCAPED_STRING : /".*?(?<!\\)(\\\\)*?"/s
 
 %import common.INT
-%import common.ESCAPED_STRING
 %import common.SIGNED_NUMBER
 %import common.LETTER
 %import common.DIGIT
@@ -95,29 +92,126 @@ list : "[" [literal ("," literal)*] "]"
 %ignore WS
 '''
 
-# The instance of the grammar parser is created only once
-# then stored in _grammar_parser for later reuse
-_grammar_parser = None
+# Version of lark-parser used to generate populse_db.filter_standalone
+standalone_lark_version = '0.12.0'
+
+# The instances of the grammar parsers are created only once
+# then stored in _grammar_parsers for later reuse
+_grammar_parsers = {}
+
+
+def generate_standalone_parser(path=None):
+    '''
+    Generates the module populse_db.filter_standalone, a stand-alone
+    LALR(1) parser of filter_grammar. The module contains the analysis of
+    the grammar and the parsing code of Lark, therefore lark-parser is
+    neither needed nor used to parse the filters.
+
+    This function requires the version standalone_lark_version of
+    lark-parser (pip install populse_db[grammar]).
+
+    :param path: Path of the generated module => populse_db/filter_standalone.py by default
+    '''
+    import lark
+    from lark.tools.standalone import gen_standalone
+
+    if lark.__version__ != standalone_lark_version:
+        raise RuntimeError('lark-parser %s is required to generate the filter parser, %s is installed'
+                           % (standalone_lark_version, lark.__version__))
+    if path is None:
+        path = os.path.join(os.path.dirname(__file__), 'filter_standalone.py')
+    parser = lark.Lark(filter_grammar, parser='lalr', lexer='contextual', start=['start', 'literal'])
+    with open(path, 'w') as f:
+        f.write('# Stand-alone parser of populse_db.filter.filter_grammar, do not edit it.\n'
+                '# It is generated by populse_db.filter.generate_standalone_parser()\n')
+        gen_standalone(parser, out=f)
+
+
+class StandaloneParser(object):
+    '''
+    Parser of the filter strings starting at a rule of the grammar,
+    using the stand-alone parser of populse_db.filter_standalone
+    '''
+
+    def __init__(self, start='start'):
+        self.parser = Lark_StandAlone()
+        self.start = start
+
+    def parse(self, text):
+        '''
+        :param text: String to parse
+
+        :return: The Lark tree of the string
+        '''
+        return self.parser.parse(text, start=self.start)
 
 
 def filter_parser():
     '''
     :return: A singleton instance of Lark grammar parser for filter expression
     '''
-    global _grammar_parser
-    if _grammar_parser is None:
-        _grammar_parser = Lark(filter_grammar)
-    return _grammar_parser
+    parser = _grammar_parsers.get('start')
+    if parser is None:
+        parser = _grammar_parsers['start'] = StandaloneParser()
+    return parser
 
 
 def literal_parser():
     '''
     This is used to test literals parsing
 
-    :return: An instance of Lark grammar parser for parsing only a literal value (int, string, list, date, etc.) from a filter expression.
+    :return: A singleton instance of Lark grammar parser for parsing only a literal value (int, string, list, date, etc.) from a filter expression.
+
+    '''
+    parser = _grammar_parsers.get('literal')
+    if parser is None:
+        parser = _grammar_parsers['literal'] = StandaloneParser('literal')
+    return parser
+
 
+def filter_to_string(tree):
     '''
-    return Lark(filter_grammar, start='literal')
+    Converts the parsing of a filter expression back into a filter string,
+    the nested boolean combinations are put in parentheses.
+
+    :param tree: Lark tree given by filter_parser().parse() (or one of its sub-trees)
+
+    :return: The filter string (str)
+    '''
+    if not isinstance(tree, Tree):
+        return str(tree)
+    if tree.data == 'all':
+        return 'ALL'
+    if tree.data == 'negation':
+        return 'NOT (%s)' % filter_to_string(tree.children[0])
+    if tree.data == 'conditions':
+        left, operator, right = tree.children
+        right = filter_to_string(right)
+        if tree.children[2].data == 'conditions':
+            right = '(%s)' % right
+        return '%s %s %s' % (filter_to_string(left), operator.upper(), right)
+    if tree.data == 'list':
+        return '[%s]' % ', '.join(filter_to_string(item) for item in tree.children)
+    return ' '.join(filter_to_string(child) for child in tree.children)
+
+
+def filter_conjunctions(tree):
+    '''
+    Splits the parsing of a filter expression into the sub-filters
+    combined with AND at its top level.
+
+    :param tree: Lark tree given by filter_parser().parse()
+
+    :return: List of Lark trees, the filter is the AND combination of these trees
+    '''
+    conjunctions = []
+    while (isinstance(tree, Tree) and tree.data == 'conditions'
+           and tree.children[1].lower() == 'and'):
+        conjunctions.append(tree.children[2])
+        tree = tree.children[0]
+    conjunctions.append(tree)
+    conjunctions.reverse()
+    return conjunctions
 
 
 class FilterImplementationLimit(NotImplementedError):
@@ -143,8 +237,9 @@ class FilterToQuery(Transformer):
       the row is selected by the filter or False otherwise.
 
     - A tuple containing an SqlAlchemy expression and a boolean Python
-      function if the filter can be expressed as a AND combination of these
-      two elements.
+      function if the filter is only partly converted into SQL. The
+      SqlAlchemy expression selects a superset of the documents, the Python
+      function must be checked on each of them.
     '''
 
     invalidCombinationMessage = ('Invalid combination of conditions on simple '
@@ -255,10 +350,6 @@ class FilterToQuery(Transformer):
 
     def field_name(self, items):
         field = items[0]
-        # Checks for literal due to a bug in Lark
-        literal = self.keyword_literals.get(field.lower(), self)
-        if literal is not self:
-            return literal
         column = self.database.get_field(self.collection, field)
         if column is None:
             raise ValueError('No field named "%s"' % field)
@@ -315,12 +406,16 @@ class FilterToSqlQuery(FilterToQuery):
         return getattr(self.database.metadata.tables[self.database.name_to_valid_column_name(self.collection)].c,
                        self.database.name_to_valid_column_name(column.field_name))
 
-    def get_column_value(self, python_value):
+    def get_column_value(self, python_value, field=None):
         '''
-        Converts a Python value to a value suitable to put in a database column
+        Converts a Python value to a value suitable to put in a database column.
+        If a field is given, a list value is encoded as a value of this field.
         '''
-        tag_type = self.database._DatabaseSession__python_value_type(python_value)
-        column_value = DatabaseSession._DatabaseSession__python_to_column(tag_type, python_value)
+        if field is not None and isinstance(python_value, list) and field.type.startswith('list_'):
+            tag_type = field.type
+        else:
+            tag_type = self.database._DatabaseSession__python_value_type(python_value)
+        column_value = self.database._DatabaseSession__python_to_column(tag_type, python_value)
         return column_value
 
     def build_condition_all(self):
@@ -330,6 +425,14 @@ class FilterToSqlQuery(FilterToQuery):
         '''
         Builds an condition checking if a constant value is in a list field
         '''
+        if self.database.json_lists:
+            if isinstance(value, (datetime.date, datetime.time)):
+                # Items of the JSON arrays
+                value = value.isoformat()
+            if self.database.database.engine.dialect.name == 'postgresql':
+                return self.build_condition_json_list_contains(
+                    list_field, sqlalchemy.cast(sqlalchemy.literal(json.dumps([value])), JSONB))
+            return self.build_condition_json_list_contains(list_field, sqlalchemy.literal(value))
         if not self.database.list_tables:
             raise FilterImplementationLimit(
                 'Cannot convert IN operator in SQL because database model does not include tables for list fields')
@@ -338,26 +441,51 @@ class FilterToSqlQuery(FilterToQuery):
         primary_key = list(collection_table.primary_key.columns.values())[0]
         list_column = self.get_column(list_field)
         list_table = self.database.metadata.tables['list_%s_%s' % (self.database.name_to_valid_column_name(self.collection), list_column.name)]
-        subquery = sqlalchemy.select([list_table.c.value], list_table.c.document_id == primary_key).correlate(
-            collection_table)
-        return list_column.isnot(None) & sqlalchemy.literal(value).in_(subquery)
+        # The documents are searched by value, with the index of the values
+        # of the list table
+        subquery = sqlalchemy.select([list_table.c.document_id], list_table.c.value == sqlalchemy.literal(value))
+        return list_column.isnot(None) & primary_key.in_(subquery)
 
     def build_condition_field_in_list_field(self, field, list_field):
         '''
         Builds a condition checking if a field value is in another
         list field value
         '''
+        if self.database.json_lists:
+            if field.type in ('time', 'datetime'):
+                raise FilterImplementationLimit(
+                    'Cannot convert IN operator in SQL because the %s values are not stored in ISO format' % field.type)
+            column = self.get_column(field)
+            if self.database.database.engine.dialect.name == 'postgresql':
+                column = sqlalchemy.func.jsonb_build_array(column)
+            return self.build_condition_json_list_contains(list_field, column)
         if not self.database.list_tables:
             raise FilterImplementationLimit(
                 'Cannot convert IN operator in SQL because database model does not include tables for list fields')
-        collection_table = self.database.metadata.tables[self.collection]
+        collection_table = self.database.metadata.tables[self.database.name_to_valid_column_name(self.collection)]
         primary_key = list(collection_table.primary_key.columns.values())[0]
         list_column = self.get_column(list_field)
-        list_table = self.database.metadata.tables['list_%s_%s' % (self.collection, list_column.name)]
+        list_table = self.database.metadata.tables['list_%s_%s' % (self.database.name_to_valid_column_name(self.collection), list_column.name)]
         subquery = sqlalchemy.select([list_table.c.value], list_table.c.document_id == primary_key).correlate(
             collection_table)
         return list_column.isnot(None) & self.get_column(field).in_(subquery)
 
+    def build_condition_json_list_contains(self, list_field, item):
+        '''
+        Builds a condition checking if a list field value, stored as a JSON
+        array, contains an item
+
+        :param list_field: List field
+
+        :param item: SqlAlchemy expression of the item (of a JSON array of the item with PostgreSQL)
+        '''
+        list_column = self.get_column(list_field)
+        if self.database.database.engine.dialect.name == 'postgresql':
+            return list_column.isnot(None) & sqlalchemy.cast(list_column, JSONB).contains(item)
+        items = sqlalchemy.select([sqlalchemy.literal_column('1')]).select_from(
+            sqlalchemy.func.json_each(list_column)).where(sqlalchemy.literal_column('value') == item)
+        return list_column.isnot(None) & sqlalchemy.exists(items)
+
     def build_condition_field_in_list(self, field, list_value):
         '''
         Builds a condition checking if a field value is a
@@ -376,11 +504,11 @@ class FilterToSqlQuery(FilterToQuery):
 
     def build_condition_field_op_value(self, field, operator_str, value):
         operator = self.sql_operators[operator_str]
-        return operator(self.get_column(field), self.get_column_value(value))
+        return operator(self.get_column(field), self.get_column_value(value, field))
 
     def build_condition_value_op_field(self, value, operator_str, field):
         operator = self.sql_operators[operator_str]
-        return operator(self.get_column_value(value), self.get_column(field))
+        return operator(self.get_column_value(value, field), self.get_column(field))
 
     def build_condition_negation(self, condition):
         # Workaround of what seems to be a bug in SqlAlchemy,
@@ -397,145 +525,469 @@ class FilterToSqlQuery(FilterToQuery):
         return operator(left_condition, right_condition)
 
 
+class PythonExpression(object):
+    '''
+    Python source code of a condition built by FilterToPythonQuery, the
+    final condition is compiled into a single Python function by
+    FilterToPythonQuery.compile_expression().
+
+    attributes:
+        - source: Python expression, a document field value is a variable of fields and a
+          value used by the expression is a variable of constants
+        - fields: Dictionary giving the field name of each variable of the expression
+        - constants: Dictionary giving the value of each constant of the expression
+    '''
+
+    __slots__ = ('source', 'fields', 'constants')
+
+    def __init__(self, source, fields=None, constants=None):
+        self.source = source
+        self.fields = fields or {}
+        self.constants = constants or {}
+
+    def combine(self, source, *expressions):
+        '''
+        :return: A new PythonExpression with the given source using the
+                 variables of this expression and of the other expressions
+        '''
+        fields = dict(self.fields)
+        constants = dict(self.constants)
+        for expression in expressions:
+            fields.update(expression.fields)
+            constants.update(expression.constants)
+        return PythonExpression(source, fields, constants)
+
+
 class FilterToPythonQuery(FilterToQuery):
+    '''
+    Builds a Python function taking a document and returning True if it
+    is selected by the filter. The filter is converted into the source
+    code of a single function, evaluating the boolean operators with
+    short-circuit, reading each field of the document once into a local
+    variable, and binding the constants (including the compiled regular
+    expressions of LIKE patterns) to local variables with the default
+    values of the function arguments.
+    '''
+
     @staticmethod
     def like_to_re(like_pattern):
         return '^%s$' % re.escape(like_pattern).replace('%', '.*').replace('_', '.')
 
     @staticmethod
     def like(value, like_pattern):
-        re_pattern = like_to_re(like_pattern)
-        return bool(re.match(pattern, value))
+        re_pattern = FilterToPythonQuery.like_to_re(like_pattern)
+        return bool(re.match(re_pattern, value, flags=re.DOTALL))
 
     @staticmethod
     def ilike(value, like_pattern):
-        re_pattern = like_to_re(like_pattern)
-        return bool(re.match(pattern, value), flags=re.IGNORECASE)
+        re_pattern = FilterToPythonQuery.like_to_re(like_pattern)
+        return bool(re.match(re_pattern, value, flags=re.DOTALL | re.IGNORECASE))
 
     python_operators = {
-        '==': operator.eq,
-        '!=': operator.ne,
-        '<': operator.lt,
-        '<=': operator.le,
-        '>': operator.gt,
-        '>=': operator.ge,
-        'and': operator.and_,
-        'or': operator.or_,
-        'like': like,
-        'ilike': ilike,
+        '==': '==',
+        '!=': '!=',
+        '<': '<',
+        '<=': '<=',
+        '>': '>',
+        '>=': '>=',
+        'and': 'and',
+        'or': 'or',
+    }
+
+    like_flags = {
+        'like': re.DOTALL,
+        'ilike': re.DOTALL | re.IGNORECASE,
     }
 
+    def __init__(self, database, collection):
+        super(FilterToPythonQuery, self).__init__(database, collection)
+        self.__field_variables = {}
+        self.__constants_count = 0
+
+    def transform(self, tree):
+        return self.compile_query(super(FilterToPythonQuery, self).transform(tree))
+
+    @classmethod
+    def compile_query(cls, query):
+        '''
+        Compiles the Python expressions of a query built by the transformer
+
+        :param query: PythonExpression, SqlAlchemy expression or tuple (SqlAlchemy expression, PythonExpression)
+
+        :return: The query with the Python functions instead of the Python expressions
+        '''
+        if isinstance(query, PythonExpression):
+            return cls.compile_expression(query)
+        if isinstance(query, tuple):
+            return tuple(cls.compile_query(item) for item in query)
+        return query
+
+    @staticmethod
+    def compile_expression(expression):
+        '''
+        Compiles a Python expression into a function taking a document
+
+        :param expression: PythonExpression
+
+        :return: The Python function, its attribute fields gives the names of the fields it reads
+        '''
+        # The constants are default values of arguments to be read as local variables
+        lines = ['def python_filter(document%s):' % ''.join(', %s=%s' % (variable, variable)
+                                                            for variable in sorted(expression.constants))]
+        for variable, field in sorted(expression.fields.items()):
+            lines.append('    %s = document[%r]' % (variable, field))
+        lines.append('    return %s' % expression.source)
+        namespace = dict(expression.constants)
+        six.exec_(compile('\n'.join(lines), '<filter>', 'exec'), namespace)
+        function = namespace['python_filter']
+        function.source = '\n'.join(lines)
+        function.fields = sorted(set(expression.fields.values()))
+        return function
+
+    def field_variable(self, field):
+        '''
+        :return: A PythonExpression reading the value of a field
+        '''
+        variable = self.__field_variables.get(field.field_name)
+        if variable is None:
+            variable = self.__field_variables[field.field_name] = 'f%d' % len(self.__field_variables)
+        return PythonExpression(variable, {variable: field.field_name})
+
+    def constant(self, value):
+        '''
+        :return: A PythonExpression using a value
+        '''
+        if (isinstance(value, six.string_types + (int, bool, type(None)))
+                or (isinstance(value, float) and not math.isinf(value) and not math.isnan(value))):
+            # Literal in the source code
+            return PythonExpression(repr(value))
+        variable = 'c%d' % self.__constants_count
+        self.__constants_count += 1
+        return PythonExpression(variable, constants={variable: value})
+
     def build_condition_all(self):
-        return lambda x: True
+        return PythonExpression('True')
 
     def build_condition_literal_in_list_field(self, value, list_field):
         '''
         Builds a condition checking if a constant value is in a list field
         '''
-        return (lambda x, lf=list_field.field_name, v=value:
-                x[lf] is not None and v in x[lf])
+        list_value = self.field_variable(list_field)
+        value = self.constant(value)
+        return list_value.combine('(%s is not None and %s in %s)' % (list_value.source, value.source,
+                                                                     list_value.source), value)
 
     def build_condition_field_in_list_field(self, field, list_field):
         '''
         Builds a condition checking if a field value is in another
         list field value
         '''
-        return (lambda x, lf=list_field.name, f=field.name:
-                x[lf] is not None and x[f] in x[lf])
+        list_value = self.field_variable(list_field)
+        value = self.field_variable(field)
+        return list_value.combine('(%s is not None and %s in %s)' % (list_value.source, value.source,
+                                                                     list_value.source), value)
 
     def build_condition_field_in_list(self, field, list_value):
         '''
         Builds a condition checking if a field value is a
         constant list value
         '''
-        return (lambda x, l=list_value, f=field.name:
-                x[f] in l)
+        value = self.field_variable(field)
+        values = list_value
+        if not self.is_list_field(field) and field.type != 'json':
+            # The values of the other fields are hashable
+            try:
+                values = frozenset(list_value)
+            except TypeError:
+                # Not hashable items
+                pass
+        values = self.constant(values)
+        return value.combine('(%s in %s)' % (value.source, values.source), values)
+
+    def build_comparison(self, left, operator_str, right, pattern=None):
+        '''
+        Builds the comparison of two values of a condition
+
+        :param left: PythonExpression of the left operand
+
+        :param operator_str: Condition operator
+
+        :param right: PythonExpression of the right operand
+
+        :param pattern: LIKE pattern if the right operand is a constant => None by default
+
+        :return: PythonExpression of the comparison
+        '''
+        if operator_str in self.like_flags:
+            if pattern is not None:
+                regex = self.constant(re.compile(self.like_to_re(pattern), self.like_flags[operator_str]))
+                return left.combine('%s.match(%s) is not None' % (regex.source, left.source), regex)
+            like = self.constant(getattr(self, operator_str))
+            return left.combine('%s(%s, %s)' % (like.source, left.source, right.source), right, like)
+        return left.combine('%s %s %s' % (left.source, self.python_operators[operator_str], right.source), right)
 
     def build_condition_field_op_field(self, left_field, operator_str, right_field):
-        operator = self.python_operators[operator_str]
-        return (lambda x, ln=left_field.name, rn=right_field.name, o=operator:
-                x[ln] is not None and x[rn] is not None and o(x[ln], x[rn]))
+        left = self.field_variable(left_field)
+        right = self.field_variable(right_field)
+        comparison = self.build_comparison(left, operator_str, right)
+        return comparison.combine('(%s is not None and %s is not None and %s)' % (left.source, right.source,
+                                                                                 comparison.source))
 
     def build_condition_field_op_value(self, field, operator_str, value):
-        operator = self.python_operators[operator_str]
+        left = self.field_variable(field)
         if value is None:
-            return lambda x, f=field.name, o=operator: o(x[f], None)
-        else:
-            return (lambda x, f=field.name, v=value, o=operator:
-                    x[f] is not None and o(x[f], v))
+            if operator_str == '==':
+                return left.combine('(%s is None)' % left.source)
+            if operator_str == '!=':
+                return left.combine('(%s is not None)' % left.source)
+            return self.build_comparison(left, operator_str, self.constant(None))
+        pattern = value if isinstance(value, six.string_types) else None
+        comparison = self.build_comparison(left, operator_str, self.constant(value), pattern)
+        return comparison.combine('(%s is not None and %s)' % (left.source, comparison.source))
 
     def build_condition_value_op_field(self, value, operator_str, field):
-        operator = self.python_operators[operator_str]
+        right = self.field_variable(field)
         if value is None:
-            return lambda x, f=field.name, o=operator: o(None, x[f])
-        else:
-            return (lambda x, f=field.name, v=value, o=operator:
-                    x[f] is not None and o(v, x[f], ))
+            if operator_str == '==':
+                return right.combine('(%s is None)' % right.source)
+            if operator_str == '!=':
+                return right.combine('(%s is not None)' % right.source)
+            return self.build_comparison(self.constant(None), operator_str, right)
+        comparison = self.build_comparison(self.constant(value), operator_str, right)
+        return comparison.combine('(%s is not None and %s)' % (right.source, comparison.source))
 
     def build_condition_negation(self, condition):
-        return lambda x, f=condition: not f(x)
+        return condition.combine('(not %s)' % condition.source)
 
     def build_condition_combine_conditions(self, left_condition, operator_str, right_condition):
         operator = self.python_operators[operator_str]
-        return lambda x, f1=left_condition, f2=right_condition, o=operator: o(f1(x), f2(x))
+        return left_condition.combine('(%s %s %s)' % (left_condition.source, operator, right_condition.source),
+                                      right_condition)
+
+
+class MixedCondition(object):
+    '''
+    Condition built by FilterToMixedQuery, it gives both the SQL and the
+    Python forms of a condition. When the condition cannot be converted
+    into SQL, a SQL condition selecting a superset of its documents is
+    used to select the documents in the database before checking them in
+    Python.
+
+    The SQL and the Python conditions differ for the NULL values under a
+    NOT (the SQL negation of an unknown value is not true), so the SQL
+    bounds of the Python condition are given by upper and lower.
+
+    attributes:
+        - sql: SqlAlchemy expression of the condition, None if it cannot be converted into SQL
+        - python: PythonExpression of the condition
+        - upper: SqlAlchemy expression selecting a superset of the documents selected by the
+          Python condition, None if all the documents can be selected
+        - lower: SqlAlchemy expression selecting a subset of the documents selected by the
+          Python condition, None if no document is known to be selected
+        - superset: SqlAlchemy expression selecting the documents that must be checked by residual
+        - residual: PythonExpression that must be checked on the documents selected by superset,
+          None if the condition is converted into SQL
+    '''
+
+    __slots__ = ('sql', 'python', 'upper', 'lower', 'superset', 'residual')
+
+    def __init__(self, sql, python, upper, lower, superset=None, residual=None):
+        self.sql = sql
+        self.python = python
+        self.upper = upper
+        self.lower = lower
+        if sql is None:
+            self.superset = superset
+            self.residual = residual
+        else:
+            self.superset = sql
+            self.residual = None
 
 
 class FilterToMixedQuery(FilterToSqlQuery, FilterToPythonQuery):
+    '''
+    Builds the SQL query of a filter, the conditions that cannot be
+    converted into SQL are checked in Python on the documents selected
+    by the database.
+
+    The Python conditions are replaced in the SQL query by the widest
+    bound of their value (TRUE, or FALSE under a NOT), so the SQL query
+    selects a superset of the documents whatever the boolean operators
+    combining the conditions. The SQL conditions combined with AND to
+    Python conditions are only checked by the database, the other ones
+    are checked again in Python. The result is either a SqlAlchemy
+    expression, a Python function if the SQL query would select all the
+    documents, or a tuple (SqlAlchemy expression, Python function).
+    '''
+
+    def transform(self, tree):
+        condition = FilterToQuery.transform(self, tree)
+        if condition.sql is not None:
+            return condition.sql
+        if condition.superset is None:
+            return self.compile_expression(condition.python)
+        return (condition.superset, self.compile_expression(condition.residual))
+
+    def build_condition(self, method, *args):
+        '''
+        Builds the SQL and the Python forms of a condition on fields
+
+        :param method: Name of the method building the condition in FilterToSqlQuery and FilterToPythonQuery
+
+        :param args: Parameters of the method
+
+        :return: MixedCondition
+        '''
+        python = getattr(FilterToPythonQuery, method)(self, *args)
+        # The SQL builders may modify the list values
+        args = [list(arg) if isinstance(arg, list) else arg for arg in args]
+        try:
+            sql = getattr(FilterToSqlQuery, method)(self, *args)
+        except FilterImplementationLimit:
+            return MixedCondition(None, python, None, None, None, python)
+        lower = sql
+        if method.endswith(('_op_field', '_op_value')) and args[1] == '!=':
+            # A NULL value differs from any value in SQL but not in Python
+            lower = sqlalchemy.and_(sql, *[self.get_column(arg).isnot(None) for arg in args if self.is_field(arg)])
+        return MixedCondition(sql, python, sql, lower)
+
+    def build_condition_all(self):
+        return self.build_condition('build_condition_all')
+
     def build_condition_literal_in_list_field(self, value, list_field):
-        if self.database.list_tables:
-            return FilterToSqlQuery.build_condition_literal_in_list_field(self, value, list_field)
-        else:
-            return FilterToPythonQuery.build_condition_literal_in_list_field(self, value, list_field)
+        return self.build_condition('build_condition_literal_in_list_field', value, list_field)
 
     def build_condition_field_in_list_field(self, field, list_field):
-        if self.database.list_tables:
-            return FilterToSqlQuery.build_condition_field_in_list_field(self, field, list_field)
-        else:
-            return FilterToPythonQuery.build_condition_field_in_list_field(self, field, list_field)
+        return self.build_condition('build_condition_field_in_list_field', field, list_field)
+
+    def build_condition_field_in_list(self, field, list_value):
+        return self.build_condition('build_condition_field_in_list', field, list_value)
+
+    def build_condition_field_op_field(self, left_field, operator_str, right_field):
+        return self.build_condition('build_condition_field_op_field', left_field, operator_str, right_field)
+
+    def build_condition_field_op_value(self, field, operator_str, value):
+        return self.build_condition('build_condition_field_op_value', field, operator_str, value)
+
+    def build_condition_value_op_field(self, value, operator_str, field):
+        return self.build_condition('build_condition_value_op_field', value, operator_str, field)
 
     def build_condition_negation(self, condition):
-        if isinstance(condition, types.FunctionType):
-            return FilterToPythonQuery.build_condition_negation(self, condition)
-        elif isinstance(condition, tuple):
-            raise FilterImplementationLimit('Cannot use NOT on a SQL+Python query')
-        else:
-            return FilterToSqlQuery.build_condition_negation(self, condition)
+        python = FilterToPythonQuery.build_condition_negation(self, condition.python)
+        # A NULL SQL value gives no information on the Python value
+        upper = lower = None
+        if condition.lower is not None:
+            upper = sqlalchemy.not_(sqlalchemy.func.coalesce(condition.lower, sqlalchemy.false()))
+        if condition.upper is not None:
+            lower = sqlalchemy.not_(sqlalchemy.func.coalesce(condition.upper, sqlalchemy.true()))
+        if condition.sql is not None:
+            return MixedCondition(FilterToSqlQuery.build_condition_negation(self, condition.sql), python,
+                                  upper, lower)
+        return MixedCondition(None, python, upper, lower, upper, python)
 
     def build_condition_combine_conditions(self, left_condition, operator_str, right_condition):
-        if isinstance(left_condition, types.FunctionType):
-            if not isinstance(right_condition, types.FunctionType):
-                raise FilterImplementationLimit('Cannot combine a Python query with a non-Python query')
-            return FilterToPythonQuery.build_condition_combine_conditions(self, left_condition, operator_str,
-                                                                          right_condition)
-        elif isinstance(left_condition, tuple):
-            raise FilterImplementationLimit('A query combining SQL + Python cannot be combined anymore')
+        python = FilterToPythonQuery.build_condition_combine_conditions(self, left_condition.python, operator_str,
+                                                                        right_condition.python)
+        # A missing upper bound is TRUE and a missing lower bound is FALSE
+        if operator_str == 'and':
+            upper = self.combine_bounds(sqlalchemy.and_, left_condition.upper, right_condition.upper, False)
+            lower = self.combine_bounds(sqlalchemy.and_, left_condition.lower, right_condition.lower, True)
         else:
-            # Current condition is a SqlAlchemy expression
-            if isinstance(right_condition, types.FunctionType):
-                # Right operand is a Python function. Such a combination
-                # is allowed once with AND operator. In that case, the
-                # result is a tuple with the SqlAlchemy expression and 
-                # the Python function condition.
-                if operator_str != 'and':
-                    raise ValueError('Combination of simple fields '
-                                     'conditions with list fields conditions is only '
-                                     'allowed with AND but not with %s' % operator_str)
-                return (left_condition, right_condition)
-            elif isinstance(right_condition, tuple):
-                raise FilterImplementationLimit('A query combining SQL + Python cannot be combined anymore')
-            else:
-                return FilterToSqlQuery.build_condition_combine_conditions(self, left_condition, operator_str,
-                                                                           right_condition)
+            upper = self.combine_bounds(sqlalchemy.or_, left_condition.upper, right_condition.upper, True)
+            lower = self.combine_bounds(sqlalchemy.or_, left_condition.lower, right_condition.lower, False)
+        if left_condition.sql is not None and right_condition.sql is not None:
+            sql = FilterToSqlQuery.build_condition_combine_conditions(self, left_condition.sql, operator_str,
+                                                                      right_condition.sql)
+            return MixedCondition(sql, python, upper, lower)
+        if operator_str != 'and':
+            return MixedCondition(None, python, upper, lower, upper, python)
+        # The documents selected by the SQL parts are only checked by the
+        # database
+        superset = self.combine_bounds(sqlalchemy.and_, left_condition.superset, right_condition.superset, False)
+        residuals = [c.residual for c in (left_condition, right_condition) if c.residual is not None]
+        residual = residuals[0]
+        if len(residuals) == 2:
+            residual = FilterToPythonQuery.build_condition_combine_conditions(self, residuals[0], operator_str,
+                                                                              residuals[1])
+        return MixedCondition(None, python, upper, lower, superset, residual)
+
+    @staticmethod
+    def combine_bounds(operator, left, right, absorbing):
+        '''
+        Combines two SQL bounds of conditions, a missing bound (None) is
+        either absorbing or neutral for the operator
+        '''
+        if left is None or right is None:
+            if absorbing:
+                return None
+            return right if left is None else left
+        return operator(left, right)
 
 
 class FilterToGuessedQuery(FilterToMixedQuery):
+    '''
+    Builds a SQL query, a (SQL query, Python function) tuple or a Python
+    function from a filter. Unlike FilterToMixedQuery, the SQL and Python
+    conditions are only split when a SQL condition is combined with AND
+    to Python conditions, otherwise the whole filter is checked in
+    Python. The IN conditions on list fields are checked in Python when
+    the database does not use list tables. The SQL conditions are
+    therefore never combined with OR or NOT to Python conditions, where
+    the NULL values would not be handled as in Python.
+    '''
+
+    # Class of the transformer used by the latest call to transform()
+    transformer_class = FilterToMixedQuery
+
     def transform(self, *args, **kwargs):
         try:
+            self.transformer_class = FilterToMixedQuery
             return FilterToMixedQuery.transform(self, *args, **kwargs)
-        except FilterImplementationLimit:
+        except VisitError as e:
+            # The transformer wraps the exceptions of the rules
+            if not isinstance(e.orig_exc, FilterImplementationLimit):
+                raise
+            self.transformer_class = FilterToPythonQuery
             transformer = FilterToPythonQuery(self.database, self.collection)
             return transformer.transform(*args, **kwargs)
 
+    def build_python_condition(self, method, *args):
+        python = getattr(FilterToPythonQuery, method)(self, *args)
+        return MixedCondition(None, python, None, None, None, python)
+
+    def build_condition_literal_in_list_field(self, value, list_field):
+        if self.database.list_tables:
+            return FilterToMixedQuery.build_condition_literal_in_list_field(self, value, list_field)
+        return self.build_python_condition('build_condition_literal_in_list_field', value, list_field)
+
+    def build_condition_field_in_list_field(self, field, list_field):
+        if self.database.list_tables:
+            return FilterToMixedQuery.build_condition_field_in_list_field(self, field, list_field)
+        return self.build_python_condition('build_condition_field_in_list_field', field, list_field)
+
+    @staticmethod
+    def is_split(condition):
+        '''
+        Checks if a condition is checked both in SQL and in Python
+        '''
+        return condition.sql is None and condition.superset is not None
+
+    def build_condition_negation(self, condition):
+        if self.is_split(condition):
+            raise FilterImplementationLimit('Cannot use NOT on a SQL+Python query')
+        return FilterToMixedQuery.build_condition_negation(self, condition)
+
+    def build_condition_combine_conditions(self, left_condition, operator_str, right_condition):
+        if self.is_split(left_condition) or self.is_split(right_condition):
+            raise FilterImplementationLimit('A query combining SQL + Python cannot be combined anymore')
+        if left_condition.sql is None and right_condition.sql is not None:
+            raise FilterImplementationLimit('Cannot combine a Python query with a non-Python query')
+        if left_condition.sql is not None and right_condition.sql is None and operator_str != 'and':
+            raise FilterImplementationLimit('Cannot combine a SQL query with a Python query with %s'
+                                            % operator_str.upper())
+        return FilterToMixedQuery.build_condition_combine_conditions(self, left_condition, operator_str,
+                                                                     right_condition)
+
 
 # Query_types
 QUERY_SQL = "sql"
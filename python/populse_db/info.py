@@ -57,16 +57,32 @@ CLASSIFIERS = CLASSIFIERS
 PLATFORMS = 'OS Independent'
 REQUIRES = [
     'python-dateutil',
-    'sqlalchemy',
-    'lark-parser'
+    'sqlalchemy'
 ]
 EXTRA_REQUIRES = {
+    # Version of lark-parser generating populse_db.filter_standalone
+    # (see populse_db.filter.generate_standalone_parser)
+    'grammar': [
+        'lark-parser==0.12.0',
+    ],
+    # The former Earley parser of the filters compared in the benchmarks
+    # is only supported by lark-parser < 0.7
+    'benchmark': [
+        'lark-parser<0.7',
+    ],
     'doc': [
         'sphinx>=1.0',
     ],
     'postgres': [
         'psycopg2-binary',
     ],
+    'numpy': [
+        'numpy',
+    ],
+    'pandas': [
+        'numpy',
+        'pandas',
+    ],
 }
 
 # tests to run
@@ -0,0 +1,226 @@
+##########################################################################
+# Populse_db - Copyright (C) IRMaGe/CEA, 2018
+# Distributed under the terms of the CeCILL-B license, as published by
+# the CEA-CNRS-INRIA. Refer to the LICENSE file or to
+# http://www.cecill.info/licences/Licence_CeCILL-B_V1-en.html
+# for details.
+##########################################################################
+
+"""
+Encodings of the list values stored in the columns of the collection tables
+
+All the codecs share the same decoding: the format of a column value is
+recognized from its content, so a database can be read whatever the codec
+used to write its lists (including the repr encoding of the former versions
+of populse_db).
+
+The following codecs are available (see list_codecs):
+    - json: JSON arrays, date/time items are stored as ISO 8601 strings
+    - repr: Python representation of the lists (former encoding)
+    - packed: Base64 of the little-endian binary representation of the
+      list_int, list_float and list_boolean values, the other list types
+      are stored as JSON
+"""
+
+import ast
+import base64
+import json
+import struct
+from datetime import date, time, datetime
+
+import dateutil.parser
+
+
+def _isoformat(value):
+    return value.isoformat()
+
+
+def _date_from_iso(value):
+    try:
+        return date.fromisoformat(value)
+    except (AttributeError, ValueError):
+        # Python < 3.7 or not produced by isoformat()
+        return dateutil.parser.parse(value).date()
+
+
+def _datetime_from_iso(value):
+    try:
+        return datetime.fromisoformat(value)
+    except (AttributeError, ValueError):
+        return dateutil.parser.parse(value)
+
+
+def _time_from_iso(value):
+    try:
+        return time.fromisoformat(value)
+    except (AttributeError, ValueError):
+        return dateutil.parser.parse(value).time()
+
+
+class ListCodec(object):
+    """
+    Base class of the list codecs, the encoding is defined by the derived
+    classes in the encode method
+
+    attributes:
+        - name: Name of the codec
+        - json_arrays: True if the lists are always encoded as JSON arrays,
+          they can then be queried with the JSON functions of the database
+
+    methods:
+        - encode: Converts a list into a column value
+        - decode: Converts a column value into a list
+    """
+
+    name = None
+    json_arrays = False
+
+    # Some types (e.g. time, date and datetime) are not supported by JSON or
+    # by ast.literal_eval. For the list types with this problem, we record
+    # in the following dictionaries the functions that must be used to
+    # serialize (in item_encoders) and deserialize (in item_decoders) the
+    # list items.
+    item_encoders = {
+        'list_date': _isoformat,
+        'list_datetime': _isoformat,
+        'list_time': _isoformat,
+    }
+
+    item_decoders = {
+        'list_date': _date_from_iso,
+        'list_datetime': _datetime_from_iso,
+        'list_time': _time_from_iso,
+    }
+
+    # Typecodes of the packed encoding (see PackedListCodec)
+    packed_typecodes = {
+        'list_int': 'q',
+        'list_float': 'd',
+        'list_boolean': '?',
+    }
+
+    def encode(self, list_type, value):
+        """
+        Converts a Python list into a column value
+
+        :param list_type: Field type (list_int, list_float, etc.)
+
+        :param value: List to convert
+
+        :return: The column value (str)
+        """
+
+        raise NotImplementedError()
+
+    def encode_items(self, list_type, value):
+        """
+        :return: The list value with its items converted into JSON compatible items
+        """
+
+        converter = self.item_encoders.get(list_type)
+        if converter is None:
+            return value
+        return [converter(i) for i in value]
+
+    def decode(self, list_type, value):
+        """
+        Converts a column value into a Python list
+
+        :param list_type: Field type (list_int, list_float, etc.)
+
+        :param value: Column value, encoded by any of the codecs
+
+        :return: The list value
+        """
+
+        if value is None:
+            return None
+        if value[:1] == '[':
+            try:
+                list_value = json.loads(value)
+            except ValueError:
+                # Python representation
+                list_value = ast.literal_eval(value)
+        else:
+            typecode, data = value.split(':', 1)
+            data = base64.b64decode(data)
+            list_value = list(struct.unpack('<%d%s' % (len(data) // struct.calcsize(typecode), typecode), data))
+        converter = self.item_decoders.get(list_type)
+        if converter is None:
+            return list_value
+        return [converter(i) for i in list_value]
+
+    def __repr__(self):
+        return '%s()' % self.__class__.__name__
+
+
+class JsonListCodec(ListCodec):
+    """
+    Stores the lists as JSON arrays
+    """
+
+    name = 'json'
+    json_arrays = True
+
+    def encode(self, list_type, value):
+        return json.dumps(self.encode_items(list_type, value))
+
+
+class ReprListCodec(ListCodec):
+    """
+    Stores the lists with their Python representation, it is the encoding
+    of the former versions of populse_db and decoding it is much slower
+    """
+
+    name = 'repr'
+
+    def encode(self, list_type, value):
+        return repr(self.encode_items(list_type, value))
+
+
+class PackedListCodec(JsonListCodec):
+    """
+    Stores the list_int, list_float and list_boolean values as the base64
+    of their binary representation, prefixed by the struct typecode of the
+    items (e.g. 'd:AAAAAAAA8D8=' for [1.0]). The lists that cannot be packed
+    (other types, None items, integers out of 64 bits range) are stored as
+    JSON.
+    """
+
+    name = 'packed'
+    json_arrays = False
+
+    def encode(self, list_type, value):
+        typecode = self.packed_typecodes.get(list_type)
+        if typecode is not None and value:
+            try:
+                data = struct.pack('<%d%s' % (len(value), typecode), *value)
+            except struct.error:
+                pass
+            else:
+                return '%s:%s' % (typecode, base64.b64encode(data).decode('ascii'))
+        return JsonListCodec.encode(self, list_type, value)
+
+
+# The codecs that can be given to Database with their name
+list_codecs = dict((codec.name, codec) for codec in (JsonListCodec, ReprListCodec, PackedListCodec))
+
+
+def get_list_codec(list_codec):
+    """
+    Gives a list codec instance
+
+    :param list_codec: Name of a codec of list_codecs, or ListCodec instance
+
+    :return: The ListCodec instance
+
+    :raise ValueError: If the codec is unknown
+    """
+
+    if isinstance(list_codec, ListCodec):
+        return list_codec
+    codec_class = list_codecs.get(list_codec)
+    if codec_class is None:
+        raise ValueError("Wrong list_codec, it must be in {0} or a ListCodec instance, but {1} given".format(
+            sorted(list_codecs), list_codec))
+    return codec_class()
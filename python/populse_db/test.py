@@ -9,19 +9,42 @@
 from __future__ import print_function
 
 import datetime
+import hashlib
+import itertools
 import os
+import re
 import shutil
 import tempfile
+import threading
 import unittest
 import sys
 
+from sqlalchemy import inspect
 from sqlalchemy.exc import OperationalError
 
 from populse_db.database import Database, FIELD_TYPE_STRING, FIELD_TYPE_FLOAT, FIELD_TYPE_TIME, FIELD_TYPE_DATETIME, \
     FIELD_TYPE_LIST_INTEGER, FIELD_TYPE_BOOLEAN, FIELD_TYPE_LIST_BOOLEAN, FIELD_TYPE_INTEGER, FIELD_TYPE_LIST_DATE, \
     FIELD_TYPE_LIST_TIME, FIELD_TYPE_LIST_DATETIME, FIELD_TYPE_LIST_STRING, FIELD_TYPE_LIST_FLOAT, DatabaseSession, \
-    FIELD_TYPE_JSON, FIELD_TYPE_LIST_JSON, Document
-from populse_db.filter import literal_parser, FilterToQuery
+    FIELD_TYPE_JSON, FIELD_TYPE_LIST_JSON, FIELD_TYPE_DATE, Document
+from populse_db.filter import literal_parser, filter_parser, filter_grammar, standalone_lark_version, FilterToQuery, \
+    FilterToPythonQuery
+from populse_db.filter_standalone import UnexpectedInput
+from populse_db.list_codec import get_list_codec
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+try:
+    import pandas
+except ImportError:
+    pandas = None
+
+try:
+    import lark
+except ImportError:
+    lark = None
 
 do_tests = True
 
@@ -93,14 +116,15 @@ def create_test_case(**database_creation_parameters):
 
             shutil.rmtree(self.temp_folder)
 
-        def create_database(self, clear=True):
+        def create_database(self, clear=True, **parameters):
             """
             Opens the database
             :param clear: Bool to know if the database must be cleared
+            :param parameters: Database creation parameters overriding those of the test case
             """
 
             try:
-                db = Database(**database_creation_parameters)
+                db = Database(**dict(database_creation_parameters, **parameters))
             except OperationalError as e:
                 if database_creation_parameters['string_engine'].startswith('postgresql'):
                     raise unittest.SkipTest(str(e))
@@ -131,9 +155,25 @@ def create_test_case(**database_creation_parameters):
             # Testing with wrong caches
             self.assertRaises(ValueError, lambda : Database(engine, caches="False"))
 
+            # Testing with wrong max_documents
+            self.assertRaises(ValueError, lambda : Database(engine, caches="lru", max_documents=0))
+            self.assertRaises(ValueError, lambda : Database(engine, caches="lru", max_documents="10"))
+
             # Testing with wrong list_tables
             self.assertRaises(ValueError, lambda : Database(engine, list_tables="False"))
 
+            # Testing with wrong filter_cache_size
+            self.assertRaises(ValueError, lambda : Database(engine, filter_cache_size=-1))
+            self.assertRaises(ValueError, lambda : Database(engine, filter_cache_size="10"))
+
+            # Testing with wrong shared_cache_size
+            self.assertRaises(ValueError, lambda : Database(engine, shared_cache_size=-1))
+            self.assertRaises(ValueError, lambda : Database(engine, shared_cache_size=None))
+
+            # Testing with wrong list_codec
+            self.assertRaises(ValueError, lambda : Database(engine, list_codec="wrong_codec"))
+            self.assertRaises(ValueError, lambda : Database(engine, list_codec=None))
+
             # Testing with wrong database schema
             if os.path.exists(os.path.join("..", "..", "docs", "databases", "sample.db")):
                 with self.assertRaises(Exception):
@@ -233,6 +273,46 @@ def create_test_case(**database_creation_parameters):
                 self.assertRaises(ValueError, lambda: session.add_fields(fields))
                 self.assertRaises(ValueError, lambda: session.add_fields(True))
 
+                # A field given twice, or an invalid field, prevents the creation of all the fields
+                fields = [["collection1", "Age", FIELD_TYPE_INTEGER, None],
+                          ["collection1", "Age", FIELD_TYPE_STRING, None]]
+                self.assertRaises(ValueError, lambda: session.add_fields(fields))
+                fields = [["collection1", "Age", FIELD_TYPE_INTEGER, None],
+                          ["collection1", "Gender", "wrong_type", None]]
+                self.assertRaises(ValueError, lambda: session.add_fields(fields))
+                self.assertEqual(len(session.get_fields_names("collection1")), 3)
+
+                # Adding fields to several collections, empty or not
+                session.add_collection("collection2")
+                session.add_document("collection2", {"index": "document1", "int": 1})
+                fields = [["collection1", "Age", FIELD_TYPE_INTEGER, None],
+                          ["collection2", "Dataset dimensions", FIELD_TYPE_LIST_INTEGER, None],
+                          ["collection1", "Dataset dimensions", FIELD_TYPE_LIST_INTEGER, None],
+                          ["collection2", "Gender", FIELD_TYPE_STRING, None]]
+                session.add_fields(fields)
+                self.assertEqual(len(session.get_fields_names("collection1")), 5)
+                self.assertEqual(len(session.get_fields_names("collection2")), 4)
+                for collection in ("collection1", "collection2"):
+                    session.add_document(collection, {"index": "document2", "Age": 42, "Gender": "male",
+                                                      "Dataset dimensions": [3, 28]})
+                    document = session.get_document(collection, "document2")
+                    self.assertEqual(document["Gender"], "male")
+                    self.assertEqual(document["Dataset dimensions"], [3, 28])
+                    documents = session.filter_documents(collection, "28 IN {Dataset dimensions}")
+                    self.assertEqual([document.index for document in documents], ["document2"])
+                self.assertEqual(session.get_document("collection2", "document1")["int"], 1)
+
+                # An invalid field of a collection prevents the creation of the fields of the other collections
+                fields = [["collection1", "Weight", FIELD_TYPE_FLOAT, None],
+                          ["collection2", "Weight", "wrong_type", None]]
+                self.assertRaises(ValueError, lambda: session.add_fields(fields))
+                self.assertIsNone(session.get_field("collection1", "Weight"))
+                fields = [["collection1", "Weight", FIELD_TYPE_FLOAT, None],
+                          ["collection2", "Weight", FIELD_TYPE_FLOAT, None]]
+                session.add_fields(fields)
+                session.set_value("collection1", "document2", "Weight", 75.5)
+                self.assertEqual(session.get_value("collection1", "document2", "Weight"), 75.5)
+
         def test_remove_field(self):
             """
             Tests the method removing a field
@@ -313,6 +393,110 @@ def create_test_case(**database_creation_parameters):
 
                 # TODO Testing column removal
 
+        def test_remove_field_rebuild(self):
+            """
+            Tests the removal of columns, with DROP COLUMN or with a copy of the collection table
+            """
+
+            for drop_column in (True, False):
+                database = self.create_database()
+                if not drop_column:
+                    database._supports_drop_column = lambda: False
+                with database as session:
+                    session.add_collection("collection1", "name")
+                    session.add_field("collection1", "PatientName", FIELD_TYPE_STRING, None, index=True)
+                    session.add_field("collection1", "SequenceName", FIELD_TYPE_STRING, None, index=True)
+                    session.add_field("collection1", "BandWidth", FIELD_TYPE_FLOAT, None, index=True)
+                    session.add_field("collection1", "Dataset dimensions", FIELD_TYPE_LIST_INTEGER, None)
+                    session.add_documents("collection1", ({"name": "document%d" % i,
+                                                           "PatientName": "patient%d" % i,
+                                                           "SequenceName": "sequence%d" % i,
+                                                           "BandWidth": i / 2.0,
+                                                           "Dataset dimensions": [i, 3]}
+                                                          for i in range(10)))
+
+                    session.remove_field("collection1", ["SequenceName", "Dataset dimensions"])
+                    self.assertEqual(session.get_document("collection1", "document3"),
+                                     {"name": "document3", "PatientName": "patient3", "BandWidth": 1.5})
+                    self.assertEqual(len(session.get_documents("collection1")), 10)
+
+                    # The indexes of the remaining fields are kept
+                    table_name = session.name_to_valid_column_name("collection1")
+                    indexed_columns = set()
+                    for index in inspect(session.session.connection()).get_indexes(table_name):
+                        indexed_columns.update(index["column_names"])
+                    self.assertEqual(indexed_columns, set([session.name_to_valid_column_name("PatientName"),
+                                                           session.name_to_valid_column_name("BandWidth")]))
+
+                    # The collection can still be modified
+                    session.add_field("collection1", "SequenceName", FIELD_TYPE_STRING, None)
+                    session.set_value("collection1", "document3", "SequenceName", "T1")
+                    session.add_document("collection1", {"name": "document10", "BandWidth": 5.0})
+                    self.assertEqual(session.get_value("collection1", "document3", "SequenceName"), "T1")
+                    documents = session.filter_documents("collection1", "{BandWidth} >= 4.5")
+                    self.assertEqual(sorted(document.name for document in documents), ["document10", "document9"])
+
+        def test_indexes(self):
+            """
+            Tests the methods creating, dropping and giving the indexes
+            """
+
+            database = self.create_database()
+            with database as session:
+                session.add_collection("collection1", "name")
+                session.add_field("collection1", "PatientName", FIELD_TYPE_STRING, None, index=True)
+                session.add_field("collection1", "BandWidth", FIELD_TYPE_FLOAT, None)
+                session.add_field("collection1", "Dataset dimensions", FIELD_TYPE_LIST_INTEGER, None)
+                session.add_documents("collection1", ({"name": "document%d" % i,
+                                                       "PatientName": "patient%d" % (i % 3),
+                                                       "BandWidth": i / 2.0,
+                                                       "Dataset dimensions": [i, 3]}
+                                                      for i in range(10)))
+                self.assertEqual(session.get_indexes("collection1"), [("PatientName",)])
+
+                # The values of the list tables are indexed
+                if database.list_tables:
+                    list_table = session.get_schema("collection1").list_tables["Dataset dimensions"]
+                    indexes = inspect(session.session.connection()).get_indexes(list_table)
+                    self.assertEqual([index["column_names"] for index in indexes], [["value"]])
+
+                # Single field and composite indexes
+                session.create_index("collection1", "BandWidth")
+                session.create_index("collection1", ["PatientName", "BandWidth"])
+                self.assertEqual(session.get_indexes("collection1"),
+                                 [("BandWidth",), ("PatientName",), ("PatientName", "BandWidth")])
+                table_name = session.name_to_valid_column_name("collection1")
+                indexes = inspect(session.session.connection()).get_indexes(table_name)
+                self.assertEqual(len(indexes), 3)
+                documents = session.filter_documents("collection1",
+                                                     '{PatientName} == "patient1" AND {BandWidth} > 1.0')
+                self.assertEqual(sorted(document.name for document in documents), ["document4", "document7"])
+
+                session.drop_index("collection1", "PatientName")
+                self.assertEqual(session.get_indexes("collection1"), [("BandWidth",), ("PatientName", "BandWidth")])
+                self.assertEqual(len(inspect(session.session.connection()).get_indexes(table_name)), 2)
+
+                # The composite index is dropped with its fields
+                session.remove_field("collection1", "BandWidth")
+                self.assertEqual(session.get_indexes("collection1"), [])
+                session.save_modifications()
+
+                # The indexes are rolled back
+                session.create_index("collection1", "PatientName")
+                self.assertEqual(session.get_indexes("collection1"), [("PatientName",)])
+                session.unsave_modifications()
+                self.assertEqual(session.get_indexes("collection1"), [])
+                session.create_index("collection1", "PatientName")
+
+                # Testing with wrong parameters
+                self.assertRaises(ValueError, lambda: session.create_index("collection1", "PatientName"))
+                self.assertRaises(ValueError, lambda: session.create_index("collection1", "field_not_existing"))
+                self.assertRaises(ValueError, lambda: session.create_index("collection1", []))
+                self.assertRaises(ValueError, lambda: session.create_index("collection_not_existing", "name"))
+                self.assertRaises(ValueError, lambda: session.drop_index("collection1", "Dataset dimensions"))
+                self.assertRaises(ValueError, lambda: session.drop_index("collection1", ["name", "PatientName"]))
+                self.assertRaises(ValueError, lambda: session.get_indexes("collection_not_existing"))
+
         def test_get_field(self):
             """
             Tests the method giving the field row given a field
@@ -371,6 +555,60 @@ def create_test_case(**database_creation_parameters):
                 # Testing with a collection not existing
                 self.assertEqual(session.get_fields("collection_not_existing"), [])
 
+        def test_get_schema(self):
+            """
+            Tests the method giving the schema snapshot of a collection
+            """
+
+            database = self.create_database()
+            with database as session:
+                # Adding a collection
+                session.add_collection("collection1", "name")
+                session.add_field("collection1", "PatientName", FIELD_TYPE_STRING, None)
+
+                schema = session.get_schema("collection1")
+                self.assertEqual(schema.primary_key, "name")
+                self.assertEqual(set(schema.fields), set(["name", "PatientName"]))
+                self.assertEqual(schema.types["PatientName"], FIELD_TYPE_STRING)
+                self.assertEqual(schema.columns["PatientName"],
+                                 session.name_to_valid_column_name("PatientName"))
+
+                # The snapshot is reused until the fields are modified
+                self.assertIs(session.get_schema("collection1"), schema)
+                session.add_field("collection1", "Dimensions", FIELD_TYPE_LIST_INTEGER, None)
+                new_schema = session.get_schema("collection1")
+                self.assertIsNot(new_schema, schema)
+                self.assertGreater(new_schema.version, schema.version)
+                self.assertEqual(new_schema.types["Dimensions"], FIELD_TYPE_LIST_INTEGER)
+
+                session.remove_field("collection1", "PatientName")
+                self.assertNotIn("PatientName", session.get_schema("collection1").fields)
+
+                # Testing with a collection not existing
+                self.assertIsNone(session.get_schema("collection_not_existing"))
+
+        def test_column_names(self):
+            """
+            Tests the maps between the names and the table/column names
+            """
+
+            database = self.create_database()
+            with database as session:
+                session.add_collection("collection1", "name")
+                session.add_field("collection1", "PatientName", FIELD_TYPE_STRING, None)
+                column = session.name_to_valid_column_name("PatientName")
+                self.assertEqual(column, hashlib.md5("PatientName".encode('utf-8')).hexdigest())
+                self.assertEqual(session.valid_column_name_to_name(column), "PatientName")
+                self.assertEqual(database.column_to_name(database.column_name("collection1")), "collection1")
+                self.assertIsNone(session.valid_column_name_to_name("not_a_column"))
+                session.save_modifications()
+
+            # The names of the existing collections and fields are loaded at the database opening
+            database = self.create_database(clear=False)
+            self.assertEqual(database.column_to_name(column), "PatientName")
+            self.assertEqual(database.column_to_name(hashlib.md5("collection1".encode('utf-8')).hexdigest()),
+                             "collection1")
+
         def test_set_value(self):
 
             database = self.create_database()
@@ -529,6 +767,96 @@ def create_test_case(**database_creation_parameters):
                 self.assertEqual(session.get_value("collection1", "document1", "list1"), ["a", "a", "a"])
                 self.assertEqual(session.get_value("collection1", "document1", "list2"), [1, 1, 1])
 
+        def test_set_values_many(self):
+            """
+            Tests the method setting values of several documents
+            """
+            database = self.create_database()
+            with database as session:
+                session.add_collection("collection1", "name")
+                session.add_field("collection1", "status", FIELD_TYPE_STRING, None)
+                session.add_field("collection1", "int", FIELD_TYPE_INTEGER, None)
+                session.add_field("collection1", "list", FIELD_TYPE_LIST_INTEGER, None)
+                session.add_documents("collection1", ({"name": "document%d" % i, "int": i, "list": [i]}
+                                                      for i in range(5)))
+
+                # Documents setting different fields
+                session.set_values_many("collection1", {"document0": {"status": "done", "list": [10, 20]},
+                                                        "document1": {"status": "done", "list": [10, 20]},
+                                                        "document2": {"int": 20},
+                                                        "document3": {"list": None},
+                                                        "document4": {}})
+                self.assertEqual(session.get_value("collection1", "document0", "status"), "done")
+                self.assertEqual(session.get_value("collection1", "document1", "list"), [10, 20])
+                self.assertEqual(session.get_value("collection1", "document2", "int"), 20)
+                self.assertIsNone(session.get_value("collection1", "document2", "status"))
+                self.assertIsNone(session.get_value("collection1", "document3", "list"))
+                self.assertEqual(session.get_value("collection1", "document4", "list"), [4])
+                self.assertEqual(sorted(document.name for document in
+                                        session.filter_documents("collection1", "20 IN {list}")),
+                                 ["document0", "document1"])
+                self.assertEqual(list(session.filter_documents("collection1", "3 IN {list}")), [])
+                self.assertTrue(session.has_unsaved_modifications())
+
+                # Nothing is modified if a value is invalid
+                self.assertRaises(ValueError, lambda: session.set_values_many(
+                    "collection1", {"document0": {"int": 1}, "document1": {"int": "wrong"}}))
+                self.assertRaises(ValueError, lambda: session.set_values_many(
+                    "collection1", {"document0": {"int": 1}, "document_not_existing": {"int": 1}}))
+                self.assertEqual(session.get_value("collection1", "document0", "int"), 0)
+                self.assertRaises(ValueError, lambda: session.set_values_many(
+                    "collection1", {"document0": {"name": "document5"}}))
+                self.assertRaises(ValueError, lambda: session.set_values_many(
+                    "collection1", {"document0": {"field_not_existing": 1}}))
+                self.assertRaises(ValueError, lambda: session.set_values_many("collection1", ["document0"]))
+                self.assertRaises(ValueError, lambda: session.set_values_many("collection_not_existing", {}))
+
+        def test_set_field_for_documents(self):
+            """
+            Tests the method setting a field of the documents selected by a filter
+            """
+            database = self.create_database()
+            with database as session:
+                session.add_collection("collection1", "name")
+                session.add_field("collection1", "status", FIELD_TYPE_STRING, None)
+                session.add_field("collection1", "int", FIELD_TYPE_INTEGER, None)
+                session.add_field("collection1", "list", FIELD_TYPE_LIST_INTEGER, None)
+                session.add_documents("collection1", ({"name": "document%d" % i, "int": i, "list": [i]}
+                                                      for i in range(10)))
+
+                # Setting a field of all the documents
+                self.assertEqual(session.set_field_for_documents("collection1", "status", "new"), 10)
+                self.assertEqual(len(list(session.filter_documents("collection1", '{status} == "new"'))), 10)
+
+                # Setting a field of the documents selected by a filter
+                self.assertEqual(session.set_field_for_documents("collection1", "status", "done", "{int} >= 6"), 4)
+                self.assertEqual(session.set_field_for_documents("collection1", "list", [100, 200],
+                                                                 '{status} == "done" AND {int} < 8'), 2)
+                self.assertEqual(session.set_field_for_documents("collection1", "int", 0, "{int} > 100"), 0)
+                self.assertEqual(session.get_value("collection1", "document5", "status"), "new")
+                self.assertEqual(session.get_value("collection1", "document6", "status"), "done")
+                self.assertEqual(session.get_value("collection1", "document7", "list"), [100, 200])
+                self.assertEqual(session.get_value("collection1", "document8", "list"), [8])
+                self.assertEqual(sorted(document.name for document in
+                                        session.filter_documents("collection1", "200 IN {list}")),
+                                 ["document6", "document7"])
+                self.assertEqual(list(session.filter_documents("collection1", "7 IN {list}")), [])
+
+                # The modifications are rolled back
+                session.save_modifications()
+                self.assertEqual(session.set_field_for_documents("collection1", "status", None), 10)
+                self.assertIsNone(session.get_value("collection1", "document6", "status"))
+                session.unsave_modifications()
+                self.assertEqual(session.get_value("collection1", "document6", "status"), "done")
+
+                # Testing with wrong parameters
+                self.assertRaises(ValueError, lambda: session.set_field_for_documents("collection1", "int", "wrong"))
+                self.assertRaises(ValueError, lambda: session.set_field_for_documents("collection1", "name", "doc"))
+                self.assertRaises(ValueError,
+                                  lambda: session.set_field_for_documents("collection1", "field_not_existing", 1))
+                self.assertRaises(ValueError,
+                                  lambda: session.set_field_for_documents("collection_not_existing", "int", 1))
+
         def test_get_field_names(self):
             """
             Tests the method removing a value
@@ -835,6 +1163,45 @@ def create_test_case(**database_creation_parameters):
                 # Trying to remove the document a second time
                 self.assertRaises(ValueError, lambda : session.remove_document("collection1", "document1"))
 
+        def test_remove_documents(self):
+            """
+            Tests the method removing several documents
+            """
+            database = self.create_database()
+            with database as session:
+
+                # Two collections with the same documents and list fields
+                for collection in ("collection1", "collection2"):
+                    session.add_collection(collection, "name")
+                    session.add_field(collection, "int", FIELD_TYPE_INTEGER, None)
+                    session.add_field(collection, "list", FIELD_TYPE_LIST_INTEGER, None)
+                    session.add_documents(collection, ({"name": "document%d" % i, "int": i, "list": [i, 100]}
+                                                       for i in range(10)))
+
+                # Removing documents by name, the documents not existing are ignored
+                self.assertEqual(session.remove_documents("collection1", ["document1", "document2", "NotExisting"]), 2)
+                self.assertIsNone(session.get_document("collection1", "document1"))
+                self.assertIsNone(session.get_document("collection1", "document2"))
+                self.assertEqual(len(session.get_documents("collection1")), 8)
+
+                # Removing documents with a filter
+                self.assertEqual(session.remove_documents("collection1", "{int} >= 7"), 3)
+                self.assertEqual(session.remove_documents("collection1", "{int} >= 7"), 0)
+                self.assertEqual(session.remove_documents("collection1", "3 IN {list}"), 1)
+                self.assertEqual(sorted(session.get_documents_names("collection1")),
+                                 ["document0", "document4", "document5", "document6"])
+                self.assertEqual(sorted(document.name for document in
+                                        session.filter_documents("collection1", "100 IN {list}")),
+                                 ["document0", "document4", "document5", "document6"])
+
+                # The other collection is not modified
+                self.assertEqual(len(session.get_documents("collection2")), 10)
+                self.assertEqual(len(list(session.filter_documents("collection2", "100 IN {list}"))), 10)
+                self.assertEqual(session.get_value("collection2", "document1", "list"), [1, 100])
+
+                # Testing with a collection not existing
+                self.assertRaises(ValueError, lambda : session.remove_documents("collection_not_existing", []))
+
         def test_add_document(self):
             """
             Tests the method adding a document
@@ -899,6 +1266,62 @@ def create_test_case(**database_creation_parameters):
                     document["field_not_existing"] = None
                     session.add_document("collection1", document)
 
+        def test_add_documents(self):
+            """
+            Tests the method adding many documents
+            """
+
+            database = self.create_database()
+            with database as session:
+
+                # Adding a collection
+                session.add_collection("collection1", "name")
+                session.add_field("collection1", "Int", FIELD_TYPE_INTEGER)
+
+                # Adding documents from a generator, with missing fields created
+                # from the first value that gives their type
+                documents = ({"name": "document%d" % i,
+                              "Int": i,
+                              "List": [i, i + 1] if i else [],
+                              "Optional": "value" if i == 3 else None}
+                             for i in range(10))
+                count = session.add_documents("collection1", documents, batch_size=4)
+                self.assertEqual(count, 10)
+                self.assertEqual(session.get_field("collection1", "List").type, FIELD_TYPE_LIST_INTEGER)
+                self.assertEqual(len(session.get_documents_names("collection1")), 10)
+                document = session.get_document("collection1", "document3")
+                self.assertEqual(document.Int, 3)
+                self.assertEqual(document.List, [3, 4])
+                self.assertEqual(document.Optional, "value")
+                self.assertEqual(session.get_document("collection1", "document0").List, [])
+                self.assertIsNone(session.get_document("collection1", "document1").Optional)
+                names = set(document.name for document in session.filter_documents("collection1", '4 IN List'))
+                self.assertEqual(names, set(["document3", "document4"]))
+
+                # Adding documents given by their primary key
+                self.assertEqual(session.add_documents("collection1", ["document10", "document11"]), 2)
+                self.assertIsNone(session.get_document("collection1", "document11").Int)
+
+                # Testing with documents already existing
+                self.assertRaises(ValueError, lambda : session.add_documents("collection1", ["document12", "document1"]))
+                self.assertRaises(ValueError, lambda : session.add_documents("collection1", ["document12", "document12"]))
+
+                # Testing with invalid parameters
+                self.assertRaises(ValueError, lambda : session.add_documents("collection_not_existing", ["document12"]))
+                self.assertRaises(ValueError, lambda : session.add_documents("collection1", ["document12"], batch_size=0))
+                self.assertRaises(ValueError, lambda : session.add_documents("collection1", ["document12"], batch_size=True))
+                self.assertRaises(ValueError, lambda : session.add_documents("collection1", ["document12"], batch_size=2.0))
+                self.assertRaises(ValueError, lambda : session.add_documents("collection1", [True]))
+                self.assertRaises(ValueError, lambda : session.add_documents("collection1", [{"Int": 1}]))
+                self.assertRaises(ValueError, lambda : session.add_documents("collection1", [{"name": "document12",
+                                                                                               "Int": "1"}]))
+                self.assertRaises(ValueError, lambda : session.add_documents("collection1", [{"name": "document12",
+                                                                                               "Unknown": 1}],
+                                                                             create_missing_fields=False))
+                self.assertRaises(ValueError, lambda : session.add_documents("collection1", [{"name": "document12",
+                                                                                               "Unknown": None}]))
+                self.assertIsNone(session.get_document("collection1", "document12"))
+
         def test_add_collection(self):
             """
             Tests the method adding a collection
@@ -1111,6 +1534,34 @@ def create_test_case(**database_creation_parameters):
                 self.assertEqual(session.get_documents("collection"), [])
                 self.assertEqual(session.get_documents(None), [])
 
+        def test_get_documents_by_ids(self):
+            """
+            Tests the method giving the documents given their names
+            """
+
+            database = self.create_database()
+            with database as session:
+                session.add_collection("collection1", "name")
+                session.add_field("collection1", "int", FIELD_TYPE_INTEGER, None)
+                session.add_field("collection1", "list", FIELD_TYPE_LIST_INTEGER, None)
+                session.add_documents("collection1", ({"name": "document%d" % i, "int": i, "list": [i]}
+                                                      for i in range(1200)))
+
+                # More documents than the number of values given at once to IN
+                ids = ["document%d" % i for i in range(1199, -1, -2)]
+                documents = session.get_documents("collection1", ids=ids)
+                self.assertEqual([document.name for document in documents], ids)
+                self.assertEqual(documents[0], {"name": "document1199", "int": 1199, "list": [1199]})
+
+                # Missing documents are None, in the order of the names
+                documents = session.get_documents("collection1", fields=["list"],
+                                                  ids=["document3", "NotExisting", "document1", "document3"])
+                self.assertEqual(documents, [{"name": "document3", "list": [3]}, None,
+                                             {"name": "document1", "list": [1]},
+                                             {"name": "document3", "list": [3]}])
+                self.assertEqual(session.get_documents("collection1", ids=[]), [])
+                self.assertEqual(session.get_documents("collection_not_existing", ids=["document1"]), [])
+
         def test_get_documents_names(self):
             """
             Tests the method returning the list of document names, given a collection
@@ -1222,6 +1673,55 @@ def create_test_case(**database_creation_parameters):
                 self.assertEqual(list_datetime, session.get_value(
                     "collection1", "document1", "list_datetime"))
 
+        def test_list_codecs(self):
+            """
+            Tests the list encodings and the migration of the list values
+            """
+
+            for codec in ("json", "repr", "packed"):
+                self.assertEqual(get_list_codec(codec).name, codec)
+                for list_type, value in ((FIELD_TYPE_LIST_INTEGER, [1, -2, 2 ** 40]),
+                                         (FIELD_TYPE_LIST_INTEGER, [1, None, 2 ** 80]),
+                                         (FIELD_TYPE_LIST_FLOAT, [1.5, -0.25, 1e-300]),
+                                         (FIELD_TYPE_LIST_BOOLEAN, [True, False]),
+                                         (FIELD_TYPE_LIST_STRING, ["it's", 'a "string"', u"\u00e9\n"]),
+                                         (FIELD_TYPE_LIST_DATE, [datetime.date(1899, 12, 31)]),
+                                         (FIELD_TYPE_LIST_TIME, [datetime.time(12, 41, 33, 540)]),
+                                         (FIELD_TYPE_LIST_DATETIME, [datetime.datetime(2018, 5, 23, 12, 41, 33)]),
+                                         (FIELD_TYPE_LIST_JSON, [{"key": [1, 2]}, {}]),
+                                         (FIELD_TYPE_LIST_FLOAT, [])):
+                    encoded = get_list_codec(codec).encode(list_type, value)
+                    # Any codec reads the values written by the other ones
+                    for decoding_codec in ("json", "repr", "packed"):
+                        self.assertEqual(get_list_codec(decoding_codec).decode(list_type, encoded), value)
+            self.assertTrue(get_list_codec("packed").encode(FIELD_TYPE_LIST_FLOAT, [1.0]).startswith("d:"))
+
+            self.create_database()
+            parameters = dict(database_creation_parameters)
+            parameters["list_codec"] = "repr"
+            database = Database(**parameters)
+            with database as session:
+                session.add_collection("collection1", "name")
+                session.add_document("collection1", {"name": "document1",
+                                                     "list_string": ["a", "b"],
+                                                     "list_date": [datetime.date(2018, 5, 23)]})
+                session.add_document("collection1", {"name": "document2"})
+
+            parameters["list_codec"] = "json"
+            database = Database(**parameters)
+            with database as session:
+                self.assertEqual(session.get_value("collection1", "document1", "list_string"), ["a", "b"])
+                self.assertEqual(session.get_value("collection1", "document1", "list_date"),
+                                 [datetime.date(2018, 5, 23)])
+                self.assertEqual(session.encode_list_fields(), 2)
+                self.assertEqual(session.encode_list_fields("collection1"), 0)
+                self.assertRaises(ValueError, lambda : session.encode_list_fields("collection_not_existing"))
+                self.assertEqual(session.get_value("collection1", "document1", "list_string"), ["a", "b"])
+                self.assertEqual(session.get_value("collection1", "document1", "list_date"),
+                                 [datetime.date(2018, 5, 23)])
+                documents = session.filter_documents("collection1", '{list_string} == ["a", "b"]')
+                self.assertEqual([document.name for document in documents], ["document1"])
+
         def test_json_field(self):
             """
             Tests the storage and retrieval of fields of type JSON
@@ -1270,6 +1770,619 @@ def create_test_case(**database_creation_parameters):
                 documents = set(document.index for document in session.filter_documents("collection_test", True))
                 self.assertEqual(documents, set(['document_test']))
 
+        def test_python_filters(self):
+            """
+            Tests the filters evaluated in Python
+            """
+
+            database = self.create_database(query_type="python")
+            with database as session:
+                session.add_collection("collection1", "name")
+                session.add_field("collection1", "PatientName", FIELD_TYPE_STRING, None)
+                session.add_field("collection1", "BandWidth", FIELD_TYPE_FLOAT, None)
+                session.add_field("collection1", "Number", FIELD_TYPE_INTEGER, None)
+                session.add_field("collection1", "Dataset dimensions", FIELD_TYPE_LIST_INTEGER, None)
+                session.add_field("collection1", "Json", FIELD_TYPE_JSON, None)
+                session.add_document("collection1", {"name": "document1", "PatientName": "Guerbet",
+                                                     "BandWidth": 50000.0, "Number": 28,
+                                                     "Dataset dimensions": [3, 28], "Json": {"key": 1}})
+                session.add_document("collection1", {"name": "document2", "PatientName": "Guer\nbet",
+                                                     "BandWidth": 10.0, "Number": 4,
+                                                     "Dataset dimensions": [3, 5]})
+                session.add_document("collection1", {"name": "document3"})
+
+                for filter, expected in (
+                        ('{PatientName} == "Guerbet"', ["document1"]),
+                        ('{BandWidth} > 100', ["document1"]),
+                        ('100 > {BandWidth}', ["document2"]),
+                        ('{PatientName} == null', ["document3"]),
+                        ('null != {PatientName}', ["document1", "document2"]),
+                        ('{BandWidth} > {Number}', ["document1", "document2"]),
+                        ('{Number} IN [4, 5]', ["document2"]),
+                        ('{Number} IN {Dataset dimensions}', ["document1"]),
+                        ('{Dataset dimensions} IN [3, 28]', []),
+                        ('{Json} IN [1, 2]', []),
+                        ('{PatientName} LIKE "Guer%"', ["document1", "document2"]),
+                        ('{PatientName} LIKE "guer%"', []),
+                        ('{PatientName} LIKE "Guerbe_"', ["document1"]),
+                        ('{PatientName} ILIKE "GUER%BET"', ["document1", "document2"])):
+                    documents = sorted(document.name for document in session.filter_documents("collection1", filter))
+                    self.assertEqual(documents, expected, filter)
+
+                # Only the fields of the filter and of the projection are converted
+                documents = list(session.filter_documents("collection1", '{PatientName} LIKE "Guer%"',
+                                                          fields=["BandWidth"]))
+                self.assertEqual([dict(document) for document in documents],
+                                 [{"name": "document1", "BandWidth": 50000.0},
+                                  {"name": "document2", "BandWidth": 10.0}])
+
+        def test_python_filter_compilation(self):
+            """
+            Tests the Python functions generated for the filters
+            """
+
+            class Incomparable(object):
+                def __gt__(self, other):
+                    raise AssertionError("The value must not be compared")
+
+            database = self.create_database()
+            with database as session:
+                session.add_collection("collection1", "name")
+                session.add_field("collection1", "a", FIELD_TYPE_STRING, None)
+                session.add_field("collection1", "b", FIELD_TYPE_INTEGER, None)
+                session.add_field("collection1", "d", FIELD_TYPE_DATE, None)
+
+                def compile(filter):
+                    return FilterToPythonQuery(session, "collection1").transform(filter_parser().parse(filter))
+
+                # The right operand of AND and OR is not evaluated when the left one decides
+                document = {"a": "x", "b": Incomparable()}
+                self.assertTrue(compile('{a} == "x" or {b} > 2')(document))
+                self.assertFalse(compile('{a} == "y" and {b} > 2')(document))
+                self.assertRaises(AssertionError, lambda: compile('{a} == "y" or {b} > 2')(document))
+                self.assertRaises(AssertionError, lambda: compile('{a} == "x" and {b} > 2')(document))
+
+                # The fields values and the constants are local variables
+                function = compile('{a} LIKE "x%" and {a} IN ["x1", "y"] and not {d} > 2018-01-01 and {b} == 2')
+                self.assertIn("document['a']", function.source)
+                self.assertEqual(function.source.count("document["), 3)
+                self.assertEqual(function.__code__.co_names, ("match",))
+                self.assertEqual(function.fields, ["a", "b", "d"])
+
+                # The regular expression of LIKE is compiled once, with the function
+                patterns = [value for value in function.__defaults__ if hasattr(value, "match")]
+                self.assertEqual(len(patterns), 1)
+                document = {"a": "x1", "b": 2, "d": datetime.date(2017, 1, 1)}
+                re_functions = (re.compile, re.match)
+
+                def fail(*args, **kwargs):
+                    raise AssertionError("A regular expression is compiled")
+                re.compile = re.match = fail
+                try:
+                    self.assertEqual([function(dict(document, b=b)) for b in range(4)], [False, False, True, False])
+                    self.assertFalse(function(dict(document, a="y")))
+                finally:
+                    re.compile, re.match = re_functions
+
+        def test_filter_cache(self):
+            """
+            Tests the cache of compiled filters
+            """
+
+            database = self.create_database()
+            with database as session:
+
+                session.add_collection("collection_test")
+                session.add_field("collection_test", "int", FIELD_TYPE_INTEGER, None)
+                session.add_documents("collection_test", ({"index": "document%d" % i, "int": i}
+                                                          for i in range(5)))
+                # The filters compiled before the schema modifications are
+                # committed are not shared
+                session.save_modifications()
+                info = session.filter_cache_info()
+
+                # The filter is compiled only the first time
+                for i in range(3):
+                    documents = [document.index for document in session.filter_documents("collection_test",
+                                                                                         "{int} >= 3")]
+                    self.assertEqual(sorted(documents), ["document3", "document4"])
+                new_info = session.filter_cache_info()
+                self.assertEqual(new_info["misses"], info["misses"] + 1)
+                self.assertEqual(new_info["hits"], info["hits"] + 2)
+
+            # The cache is shared by the sessions, and invalidated by a field modification
+            with database as session:
+                list(session.filter_documents("collection_test", "{int} >= 3"))
+                self.assertEqual(session.filter_cache_info()["hits"], new_info["hits"] + 1)
+                session.add_field("collection_test", "other", FIELD_TYPE_STRING, None)
+                list(session.filter_documents("collection_test", "{int} >= 3"))
+                self.assertEqual(session.filter_cache_info()["misses"], new_info["misses"] + 1)
+
+        def test_explain_filter(self):
+            """
+            Tests the method describing how a filter is applied
+            """
+
+            database = self.create_database()
+            with database as session:
+                session.add_collection("collection1", "name")
+                session.add_field("collection1", "PatientName", FIELD_TYPE_STRING, None, index=True)
+                session.add_field("collection1", "BandWidth", FIELD_TYPE_FLOAT, None)
+                session.add_field("collection1", "Dataset dimensions", FIELD_TYPE_LIST_INTEGER, None)
+                session.add_document("collection1", {"name": "document1", "PatientName": "Guerbet",
+                                                     "BandWidth": 50000.0, "Dataset dimensions": [3, 28]})
+
+                if database.query_type == "python":
+                    # All the filters are evaluated in Python
+                    explanation = session.explain_filter("collection1",
+                                                         '{PatientName} == "Guerbet" and {BandWidth} > 100')
+                    self.assertEqual(explanation["query_class"], "FilterToPythonQuery")
+                    self.assertEqual(explanation["sql_conditions"], [])
+                    self.assertEqual(explanation["python_conditions"],
+                                     ['{PatientName} == "Guerbet"', '{BandWidth} > 100'])
+                    self.assertNotIn("WHERE", explanation["sql"])
+                    self.assertTrue(explanation["plan"])
+                    return
+
+                # Filter entirely converted into SQL
+                explanation = session.explain_filter("collection1",
+                                                     '{PatientName} == "Guerbet" and {BandWidth} > 100')
+                self.assertEqual(explanation["query_type"], database.query_type)
+                self.assertEqual(explanation["query_class"], "FilterToMixedQuery")
+                self.assertEqual(explanation["sql_conditions"], ['{PatientName} == "Guerbet"', '{BandWidth} > 100'])
+                self.assertEqual(explanation["python_conditions"], [])
+                self.assertIn("WHERE", explanation["sql"])
+                self.assertTrue(explanation["plan"])
+                if database.engine.dialect.name == "sqlite":
+                    self.assertIn("USING INDEX", " ".join(explanation["plan"]))
+
+                # Filter mixing SQL and Python without list tables nor JSON lists
+                explanation = session.explain_filter(
+                    "collection1", '({PatientName} == "Guerbet" OR {BandWidth} > 100) AND 28 IN {Dataset dimensions}')
+                self.assertEqual(explanation["query_class"], "FilterToMixedQuery")
+                if database.list_tables or database.json_lists:
+                    self.assertEqual(explanation["sql_conditions"],
+                                     ['{PatientName} == "Guerbet" OR {BandWidth} > 100',
+                                      '28 IN {Dataset dimensions}'])
+                    self.assertEqual(explanation["python_conditions"], [])
+                else:
+                    self.assertEqual(explanation["sql_conditions"],
+                                     ['{PatientName} == "Guerbet" OR {BandWidth} > 100'])
+                    self.assertEqual(explanation["python_conditions"], ['28 IN {Dataset dimensions}'])
+
+                # Filter combining SQL and Python conditions with OR
+                condition = '{BandWidth} > 100 OR ({PatientName} == "Guerbet" AND NOT (3 IN {Dataset dimensions}))'
+                filter = '28 IN {Dataset dimensions} AND (%s)' % condition
+                explanation = session.explain_filter("collection1", filter)
+                if database.query_type == "guess" and not database.list_tables:
+                    # The guess query type checks the whole filter in Python
+                    self.assertEqual(explanation["query_class"], "FilterToPythonQuery")
+                    self.assertEqual(explanation["sql_conditions"], [])
+                    self.assertEqual(explanation["python_conditions"],
+                                     ['28 IN {Dataset dimensions}', condition])
+                    self.assertNotIn("WHERE", explanation["sql"])
+                else:
+                    self.assertEqual(explanation["query_class"], "FilterToMixedQuery")
+                    if database.list_tables or database.json_lists:
+                        self.assertEqual(explanation["sql_conditions"],
+                                         ['28 IN {Dataset dimensions}', condition])
+                        self.assertEqual(explanation["python_conditions"], [])
+                    else:
+                        self.assertEqual(explanation["sql_conditions"],
+                                         [condition])
+                        self.assertEqual(explanation["python_conditions"],
+                                         ['28 IN {Dataset dimensions}', condition])
+                    self.assertIn("WHERE", explanation["sql"])
+                self.assertEqual([document.name for document in session.filter_documents("collection1", filter)],
+                                 ["document1"])
+
+                # The query explained is the compiled query applied by filter_documents
+                filter = '{BandWidth} > 100 AND 28 IN {Dataset dimensions}'
+                list(session.filter_documents("collection1", filter))
+                info = session.filter_cache_info()
+                explanation = session.explain_filter("collection1", filter)
+                self.assertEqual(session.filter_cache_info()["hits"], info["hits"] + 1)
+                self.assertEqual(session.filter_cache_info()["misses"], info["misses"])
+                self.assertEqual(session.explain_filter("collection1", filter), explanation)
+
+                self.assertRaises(ValueError, lambda: session.explain_filter("collection_not_existing", "ALL"))
+
+        def test_mixed_filters(self):
+            """
+            Tests the filters combining SQL and Python conditions with OR and NOT
+            """
+
+            database = self.create_database()
+            with database as session:
+                session.add_collection("collection1", "name")
+                session.add_field("collection1", "PatientName", FIELD_TYPE_STRING, None)
+                session.add_field("collection1", "BandWidth", FIELD_TYPE_FLOAT, None)
+                session.add_field("collection1", "Dataset dimensions", FIELD_TYPE_LIST_INTEGER, None)
+                documents = {}
+                # The NULL values are not used under a NOT, the SQL negation of an
+                # unknown value is not true
+                values = itertools.product(["Guerbet", "Bob", "Jack"], [50.0, 50000.0, None], [[3, 28], [2], None])
+                for i, (patient_name, band_width, dimensions) in enumerate(values):
+                    documents["document%d" % i] = {"PatientName": patient_name, "BandWidth": band_width,
+                                                   "Dataset dimensions": dimensions}
+                    session.add_document("collection1", dict(documents["document%d" % i], name="document%d" % i))
+
+                # Filters with the Python function giving the selected documents
+                # and whether the database can select the documents when list
+                # tables are not used
+                filters = [
+                    ('28 IN {Dataset dimensions} OR {BandWidth} > 100',
+                        lambda d: (d["Dataset dimensions"] is not None and 28 in d["Dataset dimensions"]) or (
+                            d["BandWidth"] is not None and d["BandWidth"] > 100), False),
+                    ('({PatientName} == "Guerbet" AND 28 IN {Dataset dimensions}) OR '
+                     '({PatientName} == "Bob" AND NOT 2 IN {Dataset dimensions})',
+                        lambda d: (d["PatientName"] == "Guerbet" and d["Dataset dimensions"] is not None and
+                                   28 in d["Dataset dimensions"]) or (d["PatientName"] == "Bob" and not (
+                                    d["Dataset dimensions"] is not None and 2 in d["Dataset dimensions"])), True),
+                    ('NOT ({PatientName} == "Guerbet" OR 3 IN {Dataset dimensions}) AND {BandWidth} > 100',
+                        lambda d: not (d["PatientName"] == "Guerbet" or (
+                                d["Dataset dimensions"] is not None and 3 in d["Dataset dimensions"])) and (
+                                d["BandWidth"] is not None and d["BandWidth"] > 100), True),
+                    ('NOT (NOT ({BandWidth} < 100 AND 2 IN {Dataset dimensions}) OR {PatientName} != "Bob")',
+                        lambda d: d["BandWidth"] is not None and d["BandWidth"] < 100 and (
+                                d["Dataset dimensions"] is not None and 2 in d["Dataset dimensions"]) and (
+                                d["PatientName"] == "Bob"), True),
+                ]
+                for filter, python_filter, selects_in_sql in filters:
+                    expected = sorted(name for name, document in documents.items() if python_filter(document))
+                    self.assertEqual(sorted(document.name for document in
+                                            session.filter_documents("collection1", filter)), expected)
+                    # The guess query type only splits a SQL condition
+                    # combined with AND to Python conditions
+                    in_sql = ((database.query_type == "mixed" and
+                               (selects_in_sql or database.list_tables or database.json_lists)) or
+                              (database.query_type == "guess" and database.list_tables))
+                    if in_sql:
+                        # The database selects the documents before the
+                        # Python conditions are checked
+                        self.assertIn("WHERE", session.explain_filter("collection1", filter)["sql"])
+
+        def test_guess_filters(self):
+            """
+            Tests that the guess query type selects the same documents as the python one with NULL values
+            """
+
+            filters = [
+                '(1 IN {Dataset dimensions}) AND (({BandWidth} == 3) OR NOT ({BandWidth} IN [1, 5]))',
+                'NOT {BandWidth} == 3 OR 2 IN {Dataset dimensions}',
+                'NOT ({BandWidth} > 2 AND 1 IN {Dataset dimensions})',
+                '1 IN {Dataset dimensions} AND NOT {PatientName} == "!="',
+                '{PatientName} == "!=" OR NOT 2 IN {Dataset dimensions}',
+            ]
+            selected = {}
+            for query_type in ("python", "guess"):
+                database = self.create_database(list_tables=False, query_type=query_type)
+                with database as session:
+                    session.add_collection("collection1", "name")
+                    session.add_field("collection1", "PatientName", FIELD_TYPE_STRING, None)
+                    session.add_field("collection1", "BandWidth", FIELD_TYPE_INTEGER, None)
+                    session.add_field("collection1", "Dataset dimensions", FIELD_TYPE_LIST_INTEGER, None)
+                    values = itertools.product(["Bob", "!=", None], [3, 5, None], [[1], [2], None])
+                    for i, (patient_name, band_width, dimensions) in enumerate(values):
+                        session.add_document("collection1", {"name": "document%d" % i, "PatientName": patient_name,
+                                                             "BandWidth": band_width,
+                                                             "Dataset dimensions": dimensions})
+                    for filter in filters:
+                        selected.setdefault(filter, []).append(
+                            sorted(document.name for document in session.filter_documents("collection1", filter)))
+            for filter, (python_selected, guess_selected) in selected.items():
+                self.assertEqual(guess_selected, python_selected, filter)
+
+        def test_json_lists(self):
+            """
+            Tests the IN filters on list fields converted into SQL with the JSON functions
+            """
+
+            database = self.create_database()
+            self.assertEqual(database.json_lists, not database.list_tables and
+                             database.list_codec.json_arrays and database._supports_json_lists())
+            with database as session:
+                self.assertEqual(session.json_lists, database.json_lists)
+                session.add_collection("collection1", "name")
+                session.add_field("collection1", "PatientName", FIELD_TYPE_STRING, None)
+                session.add_field("collection1", "AcquisitionDate", FIELD_TYPE_DATE, None)
+                session.add_field("collection1", "AcquisitionTime", FIELD_TYPE_TIME, None)
+                session.add_field("collection1", "Patients", FIELD_TYPE_LIST_STRING, None)
+                session.add_field("collection1", "Dataset dimensions", FIELD_TYPE_LIST_INTEGER, None)
+                session.add_field("collection1", "Dates", FIELD_TYPE_LIST_DATE, None)
+                session.add_field("collection1", "Times", FIELD_TYPE_LIST_TIME, None)
+                session.add_documents("collection1", [
+                    {"name": "document1", "PatientName": "Guerbet", "AcquisitionDate": datetime.date(2018, 5, 23),
+                     "AcquisitionTime": datetime.time(12, 41, 33), "Patients": ["Guerbet", "Bob"],
+                     "Dataset dimensions": [3, 28, 28], "Dates": [datetime.date(2018, 5, 23)],
+                     "Times": [datetime.time(12, 41, 33)]},
+                    {"name": "document2", "PatientName": "Bob", "AcquisitionDate": datetime.date(2018, 5, 24),
+                     "AcquisitionTime": datetime.time(9, 0), "Patients": ["Guerbet"],
+                     "Dataset dimensions": [2], "Dates": [datetime.date(2018, 5, 23)], "Times": []},
+                    {"name": "document3", "PatientName": None, "AcquisitionDate": None, "AcquisitionTime": None,
+                     "Patients": None, "Dataset dimensions": None, "Dates": None, "Times": None}])
+
+                filters = {
+                    '28 IN {Dataset dimensions}': ["document1"],
+                    '28.0 IN {Dataset dimensions} OR 2 IN {Dataset dimensions}': ["document1", "document2"],
+                    'NOT 28 IN {Dataset dimensions}': ["document2", "document3"],
+                    '"Bob" IN {Patients}': ["document1"],
+                    '{PatientName} IN {Patients}': ["document1"],
+                    '2018-05-23 IN {Dates}': ["document1", "document2"],
+                    '{AcquisitionDate} IN {Dates}': ["document1"],
+                    '12:41:33 IN {Times}': ["document1"],
+                    '{AcquisitionTime} IN {Times}': ["document1"],
+                }
+                for filter, expected in filters.items():
+                    self.assertEqual(sorted(document.name for document in
+                                            session.filter_documents("collection1", filter)), expected)
+                    if database.json_lists and database.query_type == "mixed" and "AcquisitionTime" not in filter:
+                        explanation = session.explain_filter("collection1", filter)
+                        self.assertEqual(explanation["python_conditions"], [])
+                        if database.engine.dialect.name == "sqlite":
+                            self.assertIn("json_each", explanation["sql"])
+
+        def test_aggregations(self):
+            """
+            Tests the methods counting the documents, giving the distinct values and aggregating the documents
+            """
+
+            database = self.create_database()
+            with database as session:
+                session.add_collection("collection1", "name")
+                session.add_field("collection1", "PatientName", FIELD_TYPE_STRING, None)
+                session.add_field("collection1", "BandWidth", FIELD_TYPE_INTEGER, None)
+                session.add_field("collection1", "AcquisitionDate", FIELD_TYPE_DATE, None)
+                session.add_field("collection1", "Tags", FIELD_TYPE_LIST_STRING, None)
+                session.add_field("collection1", "Meta", FIELD_TYPE_JSON, None)
+                for i in range(10):
+                    session.add_document("collection1", {
+                        "name": "document%d" % i,
+                        "PatientName": None if i == 9 else "patient%d" % (i % 3),
+                        "BandWidth": i,
+                        "AcquisitionDate": datetime.date(2018, 1, i + 1),
+                        "Tags": ["T1", "MRI", "T1"] if i % 2 else ["CT"]})
+
+                # Counting the documents
+                self.assertEqual(session.count_documents("collection1"), 10)
+                self.assertEqual(session.count_documents("collection1", "{BandWidth} >= 4"), 6)
+                self.assertEqual(session.count_documents("collection1", '"CT" IN {Tags}'), 5)
+                self.assertEqual(session.count_documents("collection1", '{BandWidth} > 5 AND "CT" IN {Tags}'), 2)
+
+                # Distinct values
+                self.assertEqual(session.distinct_values("collection1", "PatientName"),
+                                 ["patient0", "patient1", "patient2"])
+                self.assertEqual(session.distinct_values("collection1", "Tags"), ["CT", "MRI", "T1"])
+                self.assertEqual(session.distinct_values("collection1", "Tags", "{BandWidth} < 1"), ["CT"])
+                self.assertEqual(session.distinct_values("collection1", "AcquisitionDate", "{BandWidth} < 2"),
+                                 [datetime.date(2018, 1, 1), datetime.date(2018, 1, 2)])
+                self.assertEqual(session.distinct_values("collection1", "PatientName", '"MRI" IN {Tags}'),
+                                 ["patient0", "patient1", "patient2"])
+
+                # Aggregations
+                self.assertEqual(session.aggregate("collection1"), [{"count": 10}])
+                self.assertEqual(session.aggregate("collection1", filter="{BandWidth} > 100"), [{"count": 0}])
+                metrics = {"count": ("count", None), "max": ("max", "BandWidth"), "avg": ("avg", "BandWidth"),
+                           "first": ("min", "AcquisitionDate")}
+                self.assertEqual(session.aggregate("collection1", ["PatientName"], metrics),
+                                 [{"PatientName": None, "count": 1, "max": 9, "avg": 9.0,
+                                   "first": datetime.date(2018, 1, 10)},
+                                  {"PatientName": "patient0", "count": 3, "max": 6, "avg": 3.0,
+                                   "first": datetime.date(2018, 1, 1)},
+                                  {"PatientName": "patient1", "count": 3, "max": 7, "avg": 4.0,
+                                   "first": datetime.date(2018, 1, 2)},
+                                  {"PatientName": "patient2", "count": 3, "max": 8, "avg": 5.0,
+                                   "first": datetime.date(2018, 1, 3)}])
+                metrics = {"documents": ("count", None), "sum": ("sum", "BandWidth")}
+                self.assertEqual(session.aggregate("collection1", ["Tags"], metrics),
+                                 [{"Tags": "CT", "documents": 5, "sum": 20},
+                                  {"Tags": "MRI", "documents": 5, "sum": 25},
+                                  {"Tags": "T1", "documents": 5, "sum": 25}])
+                self.assertEqual(session.aggregate("collection1", ["PatientName", "Tags"], metrics,
+                                                   '{BandWidth} < 5 AND "T1" IN {Tags}'),
+                                 [{"PatientName": "patient0", "Tags": "MRI", "documents": 1, "sum": 3},
+                                  {"PatientName": "patient0", "Tags": "T1", "documents": 1, "sum": 3},
+                                  {"PatientName": "patient1", "Tags": "MRI", "documents": 1, "sum": 1},
+                                  {"PatientName": "patient1", "Tags": "T1", "documents": 1, "sum": 1}])
+
+                # Testing with wrong parameters
+                self.assertRaises(ValueError, lambda: session.count_documents("collection_not_existing"))
+                self.assertRaises(ValueError, lambda: session.distinct_values("collection1", "field_not_existing"))
+                self.assertRaises(ValueError, lambda: session.distinct_values("collection1", "Meta"))
+                self.assertRaises(ValueError, lambda: session.aggregate("collection1", ["Meta"]))
+                self.assertRaises(ValueError, lambda: session.aggregate("collection1", metrics={"m": ("median", None)}))
+                self.assertRaises(ValueError, lambda: session.aggregate("collection1", metrics={"m": ("avg", "Tags")}))
+                self.assertRaises(ValueError, lambda: session.aggregate("collection1", metrics={"m": ("min", None)}))
+                self.assertRaises(ValueError, lambda: session.aggregate("collection1", metrics={"m": "count"}))
+
+        def test_filter_documents_order(self):
+            """
+            Tests the ordering, limit, offset and keyset pagination of filter_documents
+            """
+
+            database = self.create_database()
+            with database as session:
+                session.add_collection("collection1", "name")
+                session.add_field("collection1", "AcquisitionDate", FIELD_TYPE_DATE, None, index=True)
+                session.add_field("collection1", "BandWidth", FIELD_TYPE_INTEGER, None)
+                session.add_field("collection1", "Tags", FIELD_TYPE_LIST_STRING, None)
+                for i in range(10):
+                    session.add_document("collection1", {
+                        "name": "document%d" % i,
+                        "AcquisitionDate": None if i in (3, 7) else datetime.date(2018, 1, 10 - i // 2),
+                        "BandWidth": i % 3,
+                        "Tags": ["T1"] if i % 2 else ["CT"]})
+
+                def names(filter=None, **kwargs):
+                    return [document.name for document in session.filter_documents("collection1", filter, **kwargs)]
+
+                # The NULL values are first in ascending order, the primary key breaks the ties
+                self.assertEqual(names(order_by=["AcquisitionDate"]),
+                                 ["document3", "document7", "document8", "document9", "document6",
+                                  "document4", "document5", "document2", "document0", "document1"])
+                self.assertEqual(names(order_by=[("AcquisitionDate", "desc")]),
+                                 ["document0", "document1", "document2", "document4", "document5",
+                                  "document6", "document8", "document9", "document3", "document7"])
+                self.assertEqual(names(order_by=[("BandWidth", "asc"), ("AcquisitionDate", "desc")],
+                                       limit=4, offset=2),
+                                 ["document9", "document3", "document1", "document4"])
+                self.assertEqual(names("{BandWidth} == 0", limit=2, offset=1, order_by=["name"]),
+                                 ["document3", "document6"])
+                self.assertEqual(names(limit=0), [])
+
+                # Filter with a Python part if the database has no list tables
+                self.assertEqual(names('{BandWidth} >= 0 AND "T1" IN {Tags}', order_by=["AcquisitionDate"]),
+                                 ["document3", "document7", "document9", "document5", "document1"])
+                self.assertEqual(names('{BandWidth} >= 0 AND "T1" IN {Tags}', order_by=["AcquisitionDate"],
+                                       limit=2, offset=1),
+                                 ["document7", "document9"])
+
+                # Keyset pagination
+                order_by = [("BandWidth", "asc"), ("AcquisitionDate", "desc")]
+                for filter in (None, '{BandWidth} >= 0 AND "T1" IN {Tags}'):
+                    pages = []
+                    after = None
+                    while True:
+                        page = list(session.filter_documents("collection1", filter, order_by=order_by,
+                                                             limit=3, after=after))
+                        if not page:
+                            break
+                        pages.extend(document.name for document in page)
+                        after = page[-1]
+                    self.assertEqual(pages, names(filter, order_by=order_by))
+                self.assertEqual(names(after={"name": "document7"}), ["document8", "document9"])
+
+                # Testing with wrong parameters
+                self.assertRaises(ValueError, lambda: names(order_by=["Tags"]))
+                self.assertRaises(ValueError, lambda: names(order_by=["field_not_existing"]))
+                self.assertRaises(ValueError, lambda: names(order_by=[("BandWidth", "up")]))
+                self.assertRaises(ValueError, lambda: names(limit=-1))
+                self.assertRaises(ValueError, lambda: names(offset=None))
+                self.assertRaises(ValueError, lambda: names(order_by=["BandWidth"], after={"name": "document1"}))
+
+        def test_filter_documents_stream(self):
+            """
+            Tests the stream mode of the method applying the filter
+            """
+
+            database = self.create_database()
+            with database as session:
+
+                session.add_collection("collection_test")
+                session.add_field("collection_test", "int", FIELD_TYPE_INTEGER, None)
+                session.add_field("collection_test", "list", FIELD_TYPE_LIST_INTEGER, None)
+                session.add_documents("collection_test", ({"index": "document%d" % i, "int": i, "list": [i]}
+                                                          for i in range(10)))
+
+                for filter in (None, "{int} >= 3", "3 IN {list}", "{int} >= 3 AND 3 IN {list}"):
+                    expected = [document.index for document in session.filter_documents("collection_test", filter)]
+                    documents = [document.index for document in session.filter_documents("collection_test", filter,
+                                                                                          stream=True, fetch_size=3)]
+                    self.assertEqual(documents, expected)
+
+                # Checking with invalid fetch size
+                self.assertRaises(ValueError, lambda : list(session.filter_documents("collection_test", None,
+                                                                                     stream=True, fetch_size=0)))
+
+        def test_fields_projection(self):
+            """
+            Tests the fields argument of get_document, get_documents and filter_documents
+            """
+
+            database = self.create_database()
+            with database as session:
+
+                session.add_collection("collection_test")
+                session.add_field("collection_test", "int", FIELD_TYPE_INTEGER, None)
+                session.add_field("collection_test", "string", FIELD_TYPE_STRING, None)
+                session.add_field("collection_test", "list", FIELD_TYPE_LIST_INTEGER, None)
+                session.add_documents("collection_test", ({"index": "document%d" % i, "int": i,
+                                                           "string": str(i), "list": [i]}
+                                                          for i in range(5)))
+
+                document = session.get_document("collection_test", "document1", fields=["list"])
+                self.assertEqual(document, {"index": "document1", "list": [1]})
+                self.assertIsNone(session.get_document("collection_test", "document_not_existing", fields=["list"]))
+                self.assertEqual(session.get_document("collection_test", "document1", fields=[]),
+                                 {"index": "document1"})
+
+                documents = session.get_documents("collection_test", fields=["int", "string"])
+                self.assertEqual(documents, [{"index": "document%d" % i, "int": i, "string": str(i)}
+                                             for i in range(5)])
+
+                for filter in ("{int} >= 3", "3 IN {list}", "{int} >= 3 AND 3 IN {list}", None):
+                    expected = [dict(index=document.index, string=document.string)
+                                for document in session.filter_documents("collection_test", filter)]
+                    documents = list(session.filter_documents("collection_test", filter, fields=["string"]))
+                    self.assertEqual(documents, expected)
+
+                # Checking with a field not existing
+                self.assertRaises(ValueError, lambda : session.get_document("collection_test", "document1",
+                                                                            fields=["field_not_existing"]))
+                self.assertRaises(ValueError, lambda : session.get_documents("collection_test",
+                                                                             fields=["field_not_existing"]))
+                self.assertRaises(ValueError, lambda : list(session.filter_documents("collection_test", None,
+                                                                                     fields=["field_not_existing"])))
+
+        def test_filter_to_columns(self):
+            """
+            Tests the export of the filter results to NumPy arrays
+            """
+
+            if numpy is None:
+                self.skipTest("numpy is not installed")
+
+            database = self.create_database()
+            with database as session:
+
+                session.add_collection("collection_test")
+                session.add_field("collection_test", "int", FIELD_TYPE_INTEGER, None)
+                session.add_field("collection_test", "float", FIELD_TYPE_FLOAT, None)
+                session.add_field("collection_test", "date", FIELD_TYPE_DATE, None)
+                session.add_field("collection_test", "string", FIELD_TYPE_STRING, None)
+                session.add_field("collection_test", "list", FIELD_TYPE_LIST_INTEGER, None)
+                session.add_documents("collection_test", ({"index": "document%d" % i,
+                                                           "int": i,
+                                                           "float": None if i == 5 else i / 2.0,
+                                                           "date": datetime.date(2018, 5, i + 1),
+                                                           "string": None if i == 5 else str(i),
+                                                           "list": [i, i + 1]}
+                                                          for i in range(10)))
+
+                fields = ["index", "int", "float", "date", "string", "list"]
+                for filter in ("{int} >= 3", "3 IN {list}", "{int} >= 3 AND 4 IN {list}", None):
+                    documents = list(session.filter_documents("collection_test", filter))
+                    columns = session.filter_to_columns("collection_test", filter, fields)
+                    self.assertEqual(list(columns), fields)
+                    for field in fields:
+                        self.assertEqual(len(columns[field]), len(documents))
+                    self.assertEqual(list(columns["index"]), [document.index for document in documents])
+                    self.assertEqual(columns["int"].dtype, numpy.int64)
+                    self.assertEqual(columns["int"].tolist(), [document.int for document in documents])
+                    self.assertEqual(columns["float"].dtype, numpy.float64)
+                    self.assertEqual(columns["date"].dtype, numpy.dtype("datetime64[D]"))
+                    self.assertEqual(columns["date"].tolist(), [document.date for document in documents])
+                    self.assertEqual(columns["string"].dtype, object)
+                    self.assertEqual(list(columns["list"]), [document.list for document in documents])
+
+                # NULL values are masked
+                columns = session.filter_to_columns("collection_test", "{int} IN [4, 5]", ["float", "string"])
+                self.assertEqual(columns["float"].mask.tolist(), [False, True])
+                self.assertEqual(columns["float"].tolist(), [2.0, None])
+                self.assertEqual(list(columns["string"]), ["4", None])
+
+                # Checking with wrong parameters
+                self.assertRaises(ValueError, lambda : session.filter_to_columns("collection_not_existing", None,
+                                                                                 ["int"]))
+                self.assertRaises(ValueError, lambda : session.filter_to_columns("collection_test", None,
+                                                                                 ["field_not_existing"]))
+
+                if pandas is not None:
+                    dataframe = session.filter_to_columns("collection_test", "{int} < 3", ["index", "int"],
+                                                          as_dataframe=True)
+                    self.assertEqual(list(dataframe.columns), ["index", "int"])
+                    self.assertEqual(dataframe["int"].tolist(), [0, 1, 2])
+
         def test_filters(self):
             list_datetime = [datetime.datetime(2018, 5, 23, 12, 41, 33, 540),
                              datetime.datetime(1981, 5, 8, 20, 0),
@@ -1916,6 +3029,50 @@ def create_test_case(**database_creation_parameters):
                 value = FilterToQuery(None, None).transform(tree)
                 self.assertEqual(value, expected_value)
 
+        def test_filter_keywords(self):
+            """
+            Tests the fields whose names are keywords of the filters
+            """
+
+            database = self.create_database()
+            with database as session:
+                session.add_collection("collection1", "name")
+                for field in ("and", "or", "not", "in", "like", "all", "null"):
+                    session.add_field("collection1", field, FIELD_TYPE_INTEGER, None)
+                session.add_document("collection1", {"name": "document1", "and": 1, "or": 2, "not": 3,
+                                                     "in": 4, "like": 5, "all": 6, "null": 7})
+
+                # The operators are only keywords where an operator is expected
+                filter = 'and == 1 and or == 2 and in in [4] and like == 5 and 1 < not and 1 < all'
+                self.assertEqual([document.name for document in session.filter_documents("collection1", filter)],
+                                 ["document1"])
+
+                # ALL and NOT are keywords at the beginning of a condition
+                for filter in ("not > 0", "{and} == 1 and all == 6"):
+                    self.assertRaises(UnexpectedInput, lambda: list(session.filter_documents("collection1", filter)))
+
+                # The fields are quoted to be used anywhere
+                filter = "{and} == 1 and {or} == 2 and not {not} == 0 and {in} in [4] and {like} == 5 " \
+                         "and {all} == 6 and {null} == 7"
+                self.assertEqual([document.name for document in session.filter_documents("collection1", filter)],
+                                 ["document1"])
+
+        def test_standalone_parser(self):
+            """
+            Tests that the stand-alone parser is up to date with the grammar
+            of the filters
+            """
+
+            if lark is None or lark.__version__ != standalone_lark_version:
+                self.skipTest("lark-parser %s is not installed" % standalone_lark_version)
+
+            parser = lark.Lark(filter_grammar, parser='lalr', lexer='contextual')
+            for filter in ('ALL',
+                           '{PatientName} == "Guerbet" and not ({BandWidth} > 100 or "a\nb" ilike {Name})',
+                           '{and} in [1, 2.5, -3e-2, null, true, "x"] OR 2018-05-25T12:34:56 <= Date',
+                           'NOT 12:54 in {Times} and [] != {List}'):
+                self.assertEqual(str(filter_parser().parse(filter)), str(parser.parse(filter)))
+
         def test_with(self):
             """
             Tests the database session
@@ -1951,7 +3108,300 @@ def create_test_case(**database_creation_parameters):
             # a new one is created.
             with database as session4:
                 self.assertIsNot(session, session4)
-        
+
+        def test_shared_schema(self):
+            """
+            Tests that the schema is shared by the sessions and kept
+            coherent with the database
+            """
+
+            database = self.create_database()
+            with database as session:
+                session.add_collection("collection1", "name")
+                session.add_collection("collection2", "name")
+            metadata = database.metadata
+            version1 = database.collection_version("collection1")
+            version2 = database.collection_version("collection2")
+            with database as session:
+                session.add_field("collection1", "field1", FIELD_TYPE_STRING, None)
+                # The schema modifications are shared when they are committed
+                self.assertIsNot(session.metadata, metadata)
+                self.assertEqual(database.collection_version("collection1"), version1)
+            self.assertGreater(database.collection_version("collection1"), version1)
+            self.assertEqual(database.collection_version("collection2"), version2)
+
+            # A new session reuses the schema, without reflecting it again
+            with database as session:
+                self.assertIs(session.metadata, metadata)
+                self.assertIn("field1", session.get_schema("collection1").fields)
+
+            # Rolled back schema modifications are removed from the shared schema
+            try:
+                with database as session:
+                    session.add_field("collection1", "field2", FIELD_TYPE_LIST_INTEGER, None)
+                    session.add_collection("collection3", "name")
+                    boom  # Raises an exception, modifications are rolled back
+            except NameError:
+                pass
+            with database as session:
+                self.assertNotIn("field2", session.get_schema("collection1").fields)
+                self.assertIsNone(session.get_collection("collection3"))
+                session.add_field("collection1", "field2", FIELD_TYPE_LIST_INTEGER, None)
+                session.add_collection("collection3", "name")
+                session.add_document("collection1", {"name": "document1", "field2": [1, 2]})
+                self.assertEqual(session.get_value("collection1", "document1", "field2"), [1, 2])
+                session.unsave_modifications()
+                self.assertNotIn("field2", session.get_schema("collection1").fields)
+                session.add_field("collection1", "field2", FIELD_TYPE_STRING, None)
+                session.add_document("collection1", {"name": "document1", "field2": "value"})
+                self.assertEqual(session.get_value("collection1", "document1", "field2"), "value")
+
+            # Modifications done with another Database instance are visible
+            other_database = self.create_database(clear=False)
+            with other_database as session:
+                session.add_field("collection1", "field3", FIELD_TYPE_INTEGER, None)
+                session.set_value("collection1", "document1", "field3", 3)
+            with database as session:
+                self.assertEqual(session.get_value("collection1", "document1", "field3"), 3)
+
+        def test_concurrent_schema(self):
+            """
+            Tests that the schema modifications of a session are shared with
+            the other sessions when they are committed
+            """
+
+            database = self.create_database()
+            with database as session:
+                session.add_collection("collection1", "name")
+                session.add_field("collection1", "field1", FIELD_TYPE_STRING, None)
+                session.add_field("collection1", "field2", FIELD_TYPE_INTEGER, None)
+                session.add_document("collection1", {"name": "document1", "field1": "value", "field2": 2})
+
+            # A session reads the document while another one removes a field
+            removed = threading.Event()
+            read = threading.Event()
+            values = []
+
+            def read_document():
+                removed.wait()
+                try:
+                    with database as session:
+                        values.append(session.get_value("collection1", "document1", "field1"))
+                finally:
+                    read.set()
+            thread = threading.Thread(target=read_document)
+            thread.start()
+            with database as session:
+                session.remove_field("collection1", "field1")
+                removed.set()
+                read.wait()
+                self.assertIn(database.column_name("field1"),
+                              database.metadata.tables[database.column_name("collection1")].c)
+            thread.join()
+            self.assertEqual(values, ["value"])
+            self.assertNotIn(database.column_name("field1"),
+                             database.metadata.tables[database.column_name("collection1")].c)
+
+            with database as session:
+                self.assertEqual(session.get_document("collection1", "document1"),
+                                 {"name": "document1", "field2": 2})
+                session.add_field("collection1", "field1", FIELD_TYPE_INTEGER, None)
+                session.set_value("collection1", "document1", "field1", 1)
+            with database as session:
+                self.assertEqual(session.get_value("collection1", "document1", "field1"), 1)
+
+            # Fields added to an empty collection, whose table is created again
+            with database as session:
+                session.add_collection("collection2", "name")
+            table_name = database.column_name("collection2")
+            fields = [["collection2", "field1", FIELD_TYPE_STRING, None],
+                      ["collection2", "field2", FIELD_TYPE_LIST_INTEGER, None]]
+            try:
+                with database as session:
+                    session.add_fields(fields)
+                    self.assertIn(database.column_name("field1"), session.metadata.tables[table_name].c)
+                    self.assertNotIn(database.column_name("field1"), database.metadata.tables[table_name].c)
+                    boom  # Raises an exception, modifications are rolled back
+            except NameError:
+                pass
+            self.assertNotIn(database.column_name("field1"), database.metadata.tables[table_name].c)
+            with database as session:
+                session.add_fields(fields)
+                session.add_document("collection2", {"name": "document1", "field1": "value", "field2": [1]})
+            self.assertIn(database.column_name("field1"), database.metadata.tables[table_name].c)
+            with database as session:
+                self.assertEqual(session.get_document("collection2", "document1"),
+                                 {"name": "document1", "field1": "value", "field2": [1]})
+
+        def test_unsave_modifications(self):
+            """
+            Tests the rollback of the modifications of documents and fields
+            """
+
+            database = self.create_database()
+            with database as session:
+                session.add_collection("collection1", "name")
+                session.add_field("collection1", "int", FIELD_TYPE_INTEGER, None)
+                session.add_field("collection1", "list", FIELD_TYPE_LIST_INTEGER, None)
+                session.add_documents("collection1", ({"name": "document%d" % i, "int": i, "list": [i]}
+                                                      for i in range(10)))
+                session.add_collection("collection2", "name")
+                session.add_document("collection2", {"name": "document1"})
+                session.save_modifications()
+                expected = session.get_documents("collection1")
+
+                # Documents modifications
+                session.set_value("collection1", "document1", "int", 100)
+                session.set_values("collection1", "document2", {"int": 200, "list": [200]})
+                session.remove_value("collection1", "document3", "int")
+                session.remove_document("collection1", "document4")
+                session.remove_documents("collection1", "{int} >= 8")
+                session.add_document("collection1", {"name": "document10", "int": 10})
+                session.add_documents("collection1", [{"name": "document11", "int": 11}])
+                session.add_field("collection2", "string", FIELD_TYPE_STRING, None)
+                session.set_value("collection2", "document1", "string", "value")
+                session.unsave_modifications()
+                self.assertFalse(session.has_unsaved_modifications())
+                self.assertEqual(session.get_documents("collection1"), expected)
+                self.assertEqual(session.get_document("collection2", "document1"), {"name": "document1"})
+                self.assertEqual(sorted(document.name for document in
+                                        session.filter_documents("collection1", "{int} > 5")),
+                                 ["document6", "document7", "document8", "document9"])
+
+                # Fields modifications
+                session.add_fields([["collection1", "string", FIELD_TYPE_STRING, None],
+                                    ["collection1", "float", FIELD_TYPE_FLOAT, None]])
+                self.assertEqual(session.get_document("collection1", "document1")["string"], None)
+                session.set_value("collection1", "document1", "string", "value")
+                session.remove_field("collection1", "int")
+                self.assertNotIn("int", session.get_document("collection1", "document1"))
+                session.remove_collection("collection2")
+                session.unsave_modifications()
+                self.assertEqual(session.get_documents("collection1"), expected)
+                self.assertEqual(session.get_document("collection2", "document1"), {"name": "document1"})
+
+        def test_lru_caches(self):
+            """
+            Tests the documents caches loading the documents on demand
+            """
+
+            parameters = dict(database_creation_parameters)
+            parameters.update(caches="lru", max_documents=5)
+            self.create_database()
+            database = Database(**parameters)
+            with database as session:
+                session.add_collection("collection1", "name")
+                session.add_documents("collection1", ({"name": "document%d" % i, "int": i}
+                                                      for i in range(20)))
+                session.save_modifications()
+
+            with database as session:
+                # No document is loaded when the session is created
+                documents_cache = session._DatabaseSession__documents["collection1"]
+                self.assertEqual(len(documents_cache), 0)
+
+                for i in range(20):
+                    self.assertEqual(session.get_value("collection1", "document%d" % i, "int"), i)
+                self.assertEqual(len(documents_cache), 5)
+                self.assertIn("document19", documents_cache)
+                self.assertNotIn("document0", documents_cache)
+                self.assertIsNone(session.get_document("collection1", "document_not_existing"))
+
+                # The modifications are applied to the cached and to the discarded documents
+                session.set_value("collection1", "document19", "int", 100)
+                session.set_value("collection1", "document0", "int", 200)
+                self.assertEqual(session.get_value("collection1", "document19", "int"), 100)
+                self.assertEqual(session.get_value("collection1", "document0", "int"), 200)
+                session.add_field("collection1", "string", FIELD_TYPE_STRING, None)
+                self.assertIsNone(session.get_value("collection1", "document19", "string"))
+                self.assertRaises(ValueError, lambda : session.add_document("collection1", {"name": "document1"}))
+                session.unsave_modifications()
+                self.assertEqual(session.get_value("collection1", "document19", "int"), 19)
+                self.assertEqual(session.get_value("collection1", "document0", "int"), 0)
+                self.assertIsNone(session.get_field("collection1", "string"))
+
+        def test_shared_cache(self):
+            """
+            Tests the cache of documents rows shared by the sessions
+            """
+
+            parameters = dict(database_creation_parameters)
+            parameters.update(shared_cache_size=100)
+            if parameters.get("caches") is True:
+                # The sessions load all the documents, the shared cache is not used
+                parameters["caches"] = "lru"
+            self.create_database()
+            database = Database(**parameters)
+            with database as session:
+                session.add_collection("collection1", "name")
+                session.add_documents("collection1", ({"name": "document%d" % i, "int": i}
+                                                      for i in range(10)))
+                # Uncommitted documents are not shared
+                self.assertEqual(session.get_value("collection1", "document1", "int"), 1)
+                self.assertEqual(session.shared_cache_info()["size"], 0)
+
+            with database as session:
+                self.assertEqual(session.get_value("collection1", "document1", "int"), 1)
+                info = session.shared_cache_info()
+                self.assertEqual(info["size"], 1)
+
+            # The cache is used by the next sessions, including in other threads
+            results = []
+
+            def read():
+                with database as session:
+                    results.append(session.get_value("collection1", "document1", "int"))
+            thread = threading.Thread(target=read)
+            thread.start()
+            thread.join()
+            self.assertEqual(results, [1])
+            with database as session:
+                self.assertEqual(session.shared_cache_info()["hits"], info["hits"] + 1)
+
+            # Rolled back modifications are never shared
+            try:
+                with database as session:
+                    session.set_value("collection1", "document1", "int", 100)
+                    self.assertEqual(session.get_value("collection1", "document1", "int"), 100)
+                    boom  # Raises an exception, modifications are rolled back
+            except NameError:
+                pass
+            with database as session:
+                self.assertEqual(session.get_value("collection1", "document1", "int"), 1)
+                session.set_value("collection1", "document1", "int", 100)
+                session.remove_document("collection1", "document2")
+                session.unsave_modifications()
+                self.assertEqual(session.get_value("collection1", "document1", "int"), 1)
+                self.assertEqual(session.get_value("collection1", "document2", "int"), 2)
+
+            # Committed modifications invalidate the shared rows
+            with database as session:
+                session.set_value("collection1", "document1", "int", 100)
+                session.remove_document("collection1", "document2")
+            with database as session:
+                self.assertEqual(session.get_value("collection1", "document1", "int"), 100)
+                self.assertIsNone(session.get_document("collection1", "document2"))
+                session.add_field("collection1", "string", FIELD_TYPE_STRING, None)
+                session.save_modifications()
+                self.assertEqual(session.get_document("collection1", "document1"),
+                                 {"name": "document1", "int": 100, "string": None})
+                session.set_value("collection1", "document1", "string", "value")
+                session.save_modifications()
+            with database as session:
+                self.assertEqual(session.get_value("collection1", "document1", "string"), "value")
+
+            # Equivalent documents identifiers share the same row
+            with database as session:
+                session.add_document("collection1", {"name": "1", "int": 1})
+            with database as session:
+                size = session.shared_cache_info()["size"]
+                self.assertEqual(session.get_value("collection1", "1", "int"), 1)
+                self.assertEqual(session.get_value("collection1", 1, "int"), 1)
+                self.assertEqual(session.shared_cache_info()["size"], size + 1)
+                session.set_value("collection1", 1, "int", 2)
+            with database as session:
+                self.assertEqual(session.get_value("collection1", "1", "int"), 2)
+
         def test_automatic_fields_creation(self):
             """
             Test automatic creation of fields with add_document
@@ -2000,14 +3450,21 @@ def load_tests(loader, standard_tests, pattern):
     """
     suite = unittest.TestSuite()
     suite.addTests(loader.loadTestsFromTestCase(TestsSQLiteInMemory))
-    for params in (dict(caches=False, list_tables=True, query_type='mixed'),
+    for params in (dict(caches=False, list_tables=True, query_type='python'),
+                   dict(caches=False, list_tables=True, query_type='mixed'),
                    dict(caches=True, list_tables=True, query_type='mixed'),
                    dict(caches=False, list_tables=False, query_type='mixed'),
                    dict(caches=True, list_tables=False, query_type='mixed'),
                    dict(caches=False, list_tables=True, query_type='guess'),
                    dict(caches=True, list_tables=True, query_type='guess'),
                    dict(caches=False, list_tables=False, query_type='guess'),
-                   dict(caches=True, list_tables=False, query_type='guess')):
+                   dict(caches=True, list_tables=False, query_type='guess'),
+                   dict(caches=True, list_tables=True, query_type='mixed', list_codec='packed'),
+                   dict(caches=False, list_tables=False, query_type='mixed', list_codec='packed'),
+                   dict(caches='lru', list_tables=True, query_type='mixed', max_documents=3),
+                   dict(caches='lru', list_tables=False, query_type='guess', max_documents=3),
+                   dict(caches=False, list_tables=True, query_type='mixed', shared_cache_size=100),
+                   dict(caches='lru', list_tables=True, query_type='mixed', max_documents=3, shared_cache_size=5)):
         tests = loader.loadTestsFromTestCase(create_test_case(**params))
         suite.addTests(tests)
 